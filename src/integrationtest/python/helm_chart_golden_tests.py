@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+from test_support import IntegrationTestSupport, unittest
+
+unittest  # noqa
+# Above import must be first
+
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tarfile  # noqa: E402
+import tempfile  # noqa: E402
+from pathlib import Path  # noqa: E402
+from shutil import which  # noqa: E402
+
+import requests  # noqa: E402
+import yaml  # noqa: E402
+
+from kubernator.api import get_golang_os, get_golang_machine  # noqa: E402
+
+HELM_VERSION = "3.16.0"
+
+# The charts and golden outputs the native renderer is checked against in the unit tests
+CHARTS = Path(__file__).parent.parent.parent / "unittest" / "python" / "helm_chart"
+API_VERSIONS = ["v1", "apps/v1"]
+GOLDEN = [("simple.golden.yaml", "simple", "demo", "apps",
+           {"replicaCount": 3, "image": {"tag": "1.0"}, "env": {"WORKERS": None}}, True),
+          ("simple-defaults.golden.yaml", "simple", "simple", "default", None, False)]
+
+
+class HelmChartGoldenTest(IntegrationTestSupport):
+    def test_golden_matches_helm(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            helm_file = which("helm") or self.download_helm(Path(tmp))
+            for golden, chart, release, namespace, values, include_crds in GOLDEN:
+                with self.subTest(golden):
+                    args = [helm_file, "template", release, str(CHARTS / chart), "-n", namespace,
+                            "-a", ",".join(API_VERSIONS), "-f", "-"]
+                    if include_crds:
+                        args.append("--include-crds")
+                    output = subprocess.run(args, input=yaml.safe_dump(values or {}), capture_output=True, text=True,
+                                            check=True).stdout
+                    self.assertEqual(list(yaml.safe_load_all(output)),
+                                     list(yaml.safe_load_all((CHARTS / golden).read_text())))
+
+    @staticmethod
+    def download_helm(tmp: Path) -> str:
+        platform = f"{get_golang_os()}-{get_golang_machine()}"
+        helm_url = f"https://get.helm.sh/helm-v{HELM_VERSION}-{platform}.tar.gz"
+        helm_file_dl = tmp / "helm.tar.gz"
+        with requests.get(helm_url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(helm_file_dl, "wb") as f:
+                for chunk in response.iter_content(1 << 16):
+                    f.write(chunk)
+        with tarfile.open(helm_file_dl) as helm_tar:
+            helm_tar.extractall(tmp, filter='data' if sys.version_info >= (3, 12) else None)
+        return str(tmp / platform / "helm")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,1378 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import base64
+import copy
+import json
+import math
+import re
+from collections.abc import Callable
+from decimal import Decimal
+from hashlib import sha1, sha256
+from typing import Optional
+
+import yaml
+
+__all__ = ["GoTemplateError", "UnsupportedTemplateError", "GoTemplates", "SPRIG_FUNCS", "go_format", "go_numbers",
+           "strval", "truth", "to_yaml", "NO_VALUE"]
+
+NO_VALUE = "<no value>"
+
+_TRIM_SPACE = " \t\r\n"
+_MISSING = object()
+
+_TOKEN = re.compile(r"""
+    (?P<space>[ \t\r\n]+)
+  | (?P<declare>:=)
+  | (?P<punct>[|(),=])
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<raw>`[^`]*`)
+  | (?P<char>'(?:[^'\\\n]|\\.)*')
+  | (?P<number>[-+]?(?:0[xX][0-9a-fA-F]+|\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?))
+  | (?P<variable>\$[A-Za-z0-9_]*)
+  | (?P<field>(?:\.[A-Za-z_][A-Za-z0-9_]*)+)
+  | (?P<dot>\.)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+""", re.X)
+
+_ESCAPES = {"a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\", "\"": "\"",
+            "'": "'"}
+_ESCAPE = re.compile(r"\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|[0-7]{3}|.)")
+
+_KEYWORDS = {"if", "else", "end", "range", "with", "define", "template", "block", "break", "continue"}
+
+
+class GoTemplateError(RuntimeError):
+    pass
+
+
+class UnsupportedTemplateError(GoTemplateError):
+    """Raised for a construct that Go templates support but this implementation does not"""
+    pass
+
+
+def _unescape(s: str) -> str:
+    def replace(m):
+        e = m.group(1)
+        if e[0] in "xuU":
+            return chr(int(e[1:], 16))
+        if e[0] in "01234567":
+            return chr(int(e, 8))
+        try:
+            return _ESCAPES[e]
+        except KeyError:
+            raise GoTemplateError(f"unknown escape sequence \\{e}") from None
+
+    return _ESCAPE.sub(replace, s)
+
+
+def go_numbers(value):
+    """Converts the integers in values to floats, as Helm unmarshals numbers in values into `float64`"""
+    if isinstance(value, dict):
+        return {k: go_numbers(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [go_numbers(v) for v in value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _format_float(f: float) -> str:
+    """Formats the float as Go's `%v` does, i.e. the shortest representation with an exponent if it is below -4 or
+    at least 6"""
+    if math.isnan(f):
+        return "NaN"
+    if math.isinf(f):
+        return "+Inf" if f > 0 else "-Inf"
+    if f == 0:
+        return "-0" if math.copysign(1, f) < 0 else "0"
+    t = Decimal(repr(f)).as_tuple()
+    all_digits = "".join(map(str, t.digits))
+    digits = all_digits.rstrip("0")
+    dp = len(all_digits) + t.exponent
+    sign = "-" if t.sign else ""
+    exp = dp - 1
+    if exp < -4 or exp >= 6:
+        mantissa = digits[0] + ("." + digits[1:] if len(digits) > 1 else "")
+        return "%s%se%s%02d" % (sign, mantissa, "-" if exp < 0 else "+", abs(exp))
+    if dp <= 0:
+        return "%s0.%s%s" % (sign, "0" * -dp, digits)
+    if dp >= len(digits):
+        return sign + digits + "0" * (dp - len(digits))
+    return "%s%s.%s" % (sign, digits[:dp], digits[dp:])
+
+
+def go_format(value, nested=False) -> str:
+    """Formats the value as Go's `%v` does"""
+    if value is None:
+        return "<nil>" if nested else NO_VALUE
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return _format_float(value)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return "[" + " ".join(str(b) for b in value) + "]"
+    if isinstance(value, (list, tuple)):
+        return "[" + " ".join(go_format(v, True) for v in value) + "]"
+    if isinstance(value, dict):
+        return "map[" + " ".join("%s:%s" % (k, go_format(value[k], True)) for k in sorted(value)) + "]"
+    return str(value)
+
+
+def _go_quote(s: str) -> str:
+    out = ['"']
+    for ch in s:
+        if ch == "\"":
+            out.append("\\\"")
+        elif ch == "\\":
+            out.append("\\\\")
+        elif ch in "\a\b\f\n\r\t\v":
+            out.append({"\a": "\\a", "\b": "\\b", "\f": "\\f", "\n": "\\n", "\r": "\\r", "\t": "\\t",
+                        "\v": "\\v"}[ch])
+        elif ch.isprintable():
+            out.append(ch)
+        elif ord(ch) < 0x80:
+            out.append("\\x%02x" % ord(ch))
+        elif ord(ch) < 0x10000:
+            out.append("\\u%04x" % ord(ch))
+        else:
+            out.append("\\U%08x" % ord(ch))
+    out.append("\"")
+    return "".join(out)
+
+
+def _go_type(value) -> str:
+    if value is None:
+        return "<nil>"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float64"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "[]interface {}"
+    if isinstance(value, dict):
+        return "map[string]interface {}"
+    return type(value).__name__
+
+
+def truth(value) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, (str, bytes, list, tuple, dict)):
+        return len(value) > 0
+    return True
+
+
+# Lexer and parser
+
+class _Token:
+    __slots__ = ("kind", "value", "spaced")
+
+    def __init__(self, kind, value, spaced):
+        self.kind = kind
+        self.value = value
+        self.spaced = spaced
+
+    def __repr__(self):
+        return "%s %r" % (self.kind, self.value)
+
+
+def _scan(name: str, source: str):
+    """Splits the source into text and the tokens of actions, applying the trim markers and dropping comments"""
+    items = []
+    pos = 0
+    trim_next = False
+    while True:
+        start = source.find("{{", pos)
+        text = source[pos:] if start < 0 else source[pos:start]
+        if trim_next:
+            text = text.lstrip(_TRIM_SPACE)
+        if start < 0:
+            if text:
+                items.append(text)
+            return items
+
+        p = start + 2
+        if source.startswith("-", p) and p + 1 < len(source) and source[p + 1] in _TRIM_SPACE:
+            text = text.rstrip(_TRIM_SPACE)
+            p += 2
+        if text:
+            items.append(text)
+
+        if source.startswith("/*", p):
+            end = source.find("*/", p + 2)
+            if end < 0:
+                raise GoTemplateError(f"{name}: unclosed comment")
+            p = end + 2
+            m = re.compile(r"(?:[ \t\r\n]+-)?}}").match(source, p)
+            if not m:
+                raise GoTemplateError(f"{name}: comment ends before closing delimiter")
+            trim_next = m.group(0) != "}}"
+            pos = m.end()
+            continue
+
+        tokens = []
+        spaced = True
+        while True:
+            if p >= len(source):
+                raise GoTemplateError(f"{name}: unclosed action")
+            if source.startswith("}}", p):
+                trim_next = False
+                pos = p + 2
+                break
+            if source.startswith("-}}", p) and source[p - 1] in _TRIM_SPACE:
+                trim_next = True
+                pos = p + 3
+                break
+            m = _TOKEN.match(source, p)
+            if not m:
+                raise GoTemplateError(f"{name}: unexpected {source[p]!r} in action")
+            kind = m.lastgroup
+            if kind == "space":
+                spaced = True
+            else:
+                tokens.append(_Token(kind, m.group(kind), spaced))
+                spaced = False
+            p = m.end()
+        items.append(tokens)
+
+
+class _Dot:
+    __slots__ = ()
+
+
+class _Nil:
+    __slots__ = ()
+
+
+class _Const:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _Field:
+    """A chain of fields of `node` or of the dot if `node` is None"""
+    __slots__ = ("node", "names")
+
+    def __init__(self, node, names):
+        self.node = node
+        self.names = names
+
+
+class _Variable:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _Function:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _Pipeline:
+    __slots__ = ("decl", "assign", "cmds")
+
+    def __init__(self, decl, assign, cmds):
+        self.decl = decl
+        self.assign = assign
+        self.cmds = cmds
+
+
+class _Action:
+    __slots__ = ("pipe",)
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+
+class _Branch:
+    """An `if`, `with` or `range` action"""
+    __slots__ = ("kind", "pipe", "body", "else_body")
+
+    def __init__(self, kind, pipe, body, else_body):
+        self.kind = kind
+        self.pipe = pipe
+        self.body = body
+        self.else_body = else_body
+
+
+class _TemplateCall:
+    __slots__ = ("name", "pipe")
+
+    def __init__(self, name, pipe):
+        self.name = name
+        self.pipe = pipe
+
+
+class _Break:
+    __slots__ = ()
+
+
+class _Continue:
+    __slots__ = ()
+
+
+class _Parser:
+    def __init__(self, name: str, source: str, funcs: dict, templates: dict):
+        self.name = name
+        self.items = _scan(name, source)
+        self.pos = 0
+        self.funcs = funcs
+        self.templates = templates
+        self.range_depth = 0
+
+    def parse(self):
+        body, end = self._list()
+        if end is not None:
+            raise GoTemplateError(f"{self.name}: unexpected {end[0].value}")
+        return body
+
+    def _error(self, message):
+        return GoTemplateError(f"{self.name}: {message}")
+
+    def _list(self):
+        """Parses the nodes up to an `else` or `end` action, returned as the terminator, or to the end of the source"""
+        nodes = []
+        while self.pos < len(self.items):
+            item = self.items[self.pos]
+            self.pos += 1
+            if isinstance(item, str):
+                nodes.append(item)
+                continue
+            if not item:
+                raise self._error("missing value for command")
+            first = item[0]
+            keyword = first.value if first.kind == "ident" and first.value in _KEYWORDS else None
+            if keyword in ("else", "end"):
+                return nodes, item
+            if keyword in ("if", "with", "range"):
+                nodes.append(self._branch(keyword, item[1:]))
+            elif keyword == "define":
+                self._define(item[1:])
+            elif keyword in ("template", "block"):
+                nodes.append(self._template(keyword, item[1:]))
+            elif keyword in ("break", "continue"):
+                if not self.range_depth:
+                    raise self._error(f"{{{{{keyword}}}}} outside {{{{range}}}}")
+                if len(item) > 1:
+                    raise self._error(f"unexpected {item[1].value} in {keyword}")
+                nodes.append(_Break() if keyword == "break" else _Continue())
+            else:
+                nodes.append(_Action(self._pipeline(item, True)))
+        return nodes, None
+
+    def _branch(self, kind, tokens):
+        pipe = self._pipeline(tokens, True, kind == "range")
+        if kind == "range":
+            self.range_depth += 1
+        try:
+            body, end = self._list()
+        finally:
+            if kind == "range":
+                self.range_depth -= 1
+        if end is None:
+            raise self._error(f"unexpected EOF in {kind}")
+        else_body = None
+        if end[0].value == "else":
+            if len(end) > 1:
+                # `else if` and `else with` chains nest in the else branch and share its `end`
+                if end[1].value != kind or kind == "range":
+                    raise self._error(f"unexpected {end[1].value} in else")
+                else_body = [self._branch(kind, end[2:])]
+                return _Branch(kind, pipe, body, else_body)
+            else_body, end = self._list()
+            if end is None or end[0].value != "end":
+                raise self._error(f"expected end in {kind}")
+        if len(end) > 1:
+            raise self._error("unexpected arguments to end")
+        return _Branch(kind, pipe, body, else_body)
+
+    def _template_name(self, tokens, keyword):
+        if not tokens or tokens[0].kind not in ("string", "raw"):
+            raise self._error(f"{keyword} requires a quoted name")
+        token = tokens[0]
+        return _unescape(token.value[1:-1]) if token.kind == "string" else token.value[1:-1]
+
+    def _define(self, tokens):
+        name = self._template_name(tokens, "define")
+        if len(tokens) > 1:
+            raise self._error("unexpected arguments to define")
+        body, end = self._list()
+        if end is None or end[0].value != "end" or len(end) > 1:
+            raise self._error(f"unexpected EOF in define {name}")
+        self.templates[name] = body
+
+    def _template(self, keyword, tokens):
+        name = self._template_name(tokens, keyword)
+        pipe = self._pipeline(tokens[1:], False) if len(tokens) > 1 else None
+        if keyword == "block":
+            body, end = self._list()
+            if end is None or end[0].value != "end" or len(end) > 1:
+                raise self._error(f"unexpected EOF in block {name}")
+            self.templates[name] = body
+        return _TemplateCall(name, pipe)
+
+    def _pipeline(self, tokens, allow_decl, allow_two_vars=False):
+        decl = []
+        assign = False
+        i = 0
+        if tokens and tokens[0].kind == "variable":
+            j = 0
+            names = []
+            while j < len(tokens) and tokens[j].kind == "variable":
+                names.append(tokens[j].value)
+                j += 1
+                if j < len(tokens) and tokens[j].kind == "punct" and tokens[j].value == "," and allow_two_vars:
+                    j += 1
+                    continue
+                break
+            if j < len(tokens) and (tokens[j].kind == "declare" or
+                                    tokens[j].kind == "punct" and tokens[j].value == "="):
+                if not allow_decl:
+                    raise self._error("variable declaration not allowed here")
+                if len(names) > (2 if allow_two_vars else 1):
+                    raise self._error("too many declarations")
+                decl = names
+                assign = tokens[j].kind == "punct"
+                i = j + 1
+
+        cmds = []
+        cmd = []
+        end = len(tokens)
+        while i < end:
+            token = tokens[i]
+            if token.kind == "punct" and token.value == "|":
+                if not cmd:
+                    raise self._error("missing command before |")
+                cmds.append(cmd)
+                cmd = []
+                i += 1
+                continue
+            node, i = self._operand(tokens, i)
+            cmd.append(node)
+        if not cmd:
+            raise self._error("missing value for command")
+        cmds.append(cmd)
+        for c in cmds[1:]:
+            if isinstance(c[0], (_Const, _Nil, _Dot)):
+                raise self._error("non executable command in pipeline stage")
+        return _Pipeline(decl, assign, cmds)
+
+    def _operand(self, tokens, i):
+        token = tokens[i]
+        kind = token.kind
+        i += 1
+        if kind == "punct" and token.value == "(":
+            depth = 1
+            j = i
+            while j < len(tokens):
+                t = tokens[j]
+                if t.kind == "punct" and t.value == "(":
+                    depth += 1
+                elif t.kind == "punct" and t.value == ")":
+                    depth -= 1
+                    if not depth:
+                        break
+                j += 1
+            else:
+                raise self._error("unclosed left paren")
+            node = self._pipeline(tokens[i:j], True)
+            i = j + 1
+        elif kind == "string":
+            node = _Const(_unescape(token.value[1:-1]))
+        elif kind == "raw":
+            node = _Const(token.value[1:-1])
+        elif kind == "char":
+            raise UnsupportedTemplateError(f"{self.name}: character constants are not supported")
+        elif kind == "number":
+            text = token.value
+            try:
+                if re.fullmatch(r"[-+]?0[xX][0-9a-fA-F]+", text):
+                    node = _Const(int(text, 16))
+                elif re.fullmatch(r"[-+]?\d+", text):
+                    node = _Const(int(text))
+                else:
+                    node = _Const(float(text))
+            except ValueError:
+                raise self._error(f"bad number syntax: {text}") from None
+        elif kind == "variable":
+            node = _Variable(token.value)
+        elif kind == "field":
+            return _Field(None, token.value[1:].split(".")), i
+        elif kind == "dot":
+            node = _Dot()
+        elif kind == "ident":
+            if token.value in ("true", "false"):
+                node = _Const(token.value == "true")
+            elif token.value == "nil":
+                node = _Nil()
+            elif token.value in _KEYWORDS:
+                raise self._error(f"unexpected {token.value} in operand")
+            elif token.value in ("and", "or") or token.value in self.funcs:
+                node = _Function(token.value)
+            else:
+                raise UnsupportedTemplateError(f"{self.name}: function {token.value!r} is not supported")
+        else:
+            raise self._error(f"unexpected {token.value!r} in operand")
+
+        # A field chain immediately following a variable or a parenthesized pipeline
+        if i < len(tokens) and tokens[i].kind == "field" and not tokens[i].spaced:
+            if isinstance(node, (_Variable, _Pipeline)):
+                node = _Field(node, tokens[i].value[1:].split("."))
+                i += 1
+            else:
+                raise self._error(f"unexpected {tokens[i].value} after {token.value}")
+        return node, i
+
+
+# Execution
+
+class _BreakLoop(Exception):
+    pass
+
+
+class _ContinueLoop(Exception):
+    pass
+
+
+class _State:
+    __slots__ = ("vars", "out")
+
+    def __init__(self, data, out):
+        self.vars = [["$", data]]
+        self.out = out
+
+    def lookup(self, name):
+        for var in reversed(self.vars):
+            if var[0] == name:
+                return var[1]
+        raise GoTemplateError(f"undefined variable: {name}")
+
+    def assign(self, name, value):
+        for var in reversed(self.vars):
+            if var[0] == name:
+                var[1] = value
+                return
+        raise GoTemplateError(f"undefined variable: {name}")
+
+
+class GoTemplates:
+    """A set of named Go templates sharing the functions and the templates they `define`"""
+
+    MAX_DEPTH = 1000
+
+    def __init__(self, funcs: Optional[dict[str, Callable]] = None):
+        self.funcs = dict(BUILTIN_FUNCS)
+        if funcs:
+            self.funcs.update(funcs)
+        self.templates: dict[str, list] = {}
+        self._depth = 0
+
+    def parse(self, name: str, source: str):
+        self.templates[name] = _Parser(name, source, self.funcs, self.templates).parse()
+
+    def copy(self) -> "GoTemplates":
+        templates = GoTemplates()
+        templates.funcs = self.funcs
+        templates.templates = dict(self.templates)
+        return templates
+
+    def execute(self, name: str, data) -> str:
+        try:
+            body = self.templates[name]
+        except KeyError:
+            raise GoTemplateError(f"no template {name!r} associated with template") from None
+        out = []
+        self._depth += 1
+        try:
+            if self._depth > self.MAX_DEPTH:
+                raise GoTemplateError(f"rendering template {name!r} has a nested reference depth of more than "
+                                      f"{self.MAX_DEPTH}")
+            self._list(_State(data, out), body, data)
+        finally:
+            self._depth -= 1
+        return "".join(out)
+
+    def _list(self, state: _State, nodes, dot):
+        mark = len(state.vars)
+        try:
+            for node in nodes:
+                if isinstance(node, str):
+                    state.out.append(node)
+                elif isinstance(node, _Action):
+                    value = self._pipeline(state, dot, node.pipe)
+                    if not node.pipe.decl:
+                        state.out.append(go_format(value))
+                elif isinstance(node, _Branch):
+                    self._branch(state, node, dot)
+                elif isinstance(node, _TemplateCall):
+                    data = self._pipeline(state, dot, node.pipe) if node.pipe else None
+                    state.out.append(self.execute(node.name, data))
+                elif isinstance(node, _Break):
+                    raise _BreakLoop()
+                else:
+                    raise _ContinueLoop()
+        finally:
+            del state.vars[mark:]
+
+    def _branch(self, state: _State, node: _Branch, dot):
+        mark = len(state.vars)
+        try:
+            if node.kind == "range":
+                self._range(state, node, dot)
+                return
+            value = self._pipeline(state, dot, node.pipe)
+            if truth(value):
+                self._list(state, node.body, value if node.kind == "with" else dot)
+            elif node.else_body is not None:
+                self._list(state, node.else_body, dot)
+        finally:
+            del state.vars[mark:]
+
+    def _range(self, state: _State, node: _Branch, dot):
+        decl = node.pipe.decl
+        pipe = _Pipeline([], False, node.pipe.cmds)
+        value = self._pipeline(state, dot, pipe)
+        if value is None:
+            items = ()
+        elif isinstance(value, dict):
+            items = ((k, value[k]) for k in sorted(value))
+        elif isinstance(value, (list, tuple)):
+            items = enumerate(value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            if len(decl) > 1:
+                raise GoTemplateError("can't use two variables ranging over an integer")
+            items = ((i, i) for i in range(value))
+        else:
+            raise GoTemplateError(f"range can't iterate over {go_format(value)}")
+
+        iterated = False
+        for key, elem in items:
+            iterated = True
+            mark = len(state.vars)
+            if len(decl) == 1:
+                state.vars.append([decl[0], elem])
+            elif len(decl) == 2:
+                state.vars.append([decl[0], key])
+                state.vars.append([decl[1], elem])
+            try:
+                self._list(state, node.body, elem)
+            except _BreakLoop:
+                break
+            except _ContinueLoop:
+                pass
+            finally:
+                del state.vars[mark:]
+        if not iterated and node.else_body is not None:
+            self._list(state, node.else_body, dot)
+
+    def _pipeline(self, state: _State, dot, pipe: _Pipeline):
+        value = _MISSING
+        for cmd in pipe.cmds:
+            value = self._command(state, dot, cmd, value)
+        if pipe.decl:
+            if pipe.assign:
+                state.assign(pipe.decl[0], value)
+            else:
+                state.vars.append([pipe.decl[0], value])
+        return value
+
+    def _command(self, state: _State, dot, cmd, final):
+        first = cmd[0]
+        args = cmd[1:]
+        if isinstance(first, _Function):
+            return self._call(state, dot, first.name, args, final)
+        if isinstance(first, _Field):
+            return self._field_chain(state, dot, first, args, final)
+        if args or final is not _MISSING:
+            raise GoTemplateError("can't give argument to non-function")
+        if isinstance(first, _Nil):
+            raise GoTemplateError("nil is not a command")
+        return self._operand(state, dot, first)
+
+    def _operand(self, state: _State, dot, node):
+        if isinstance(node, _Const):
+            return node.value
+        if isinstance(node, _Dot):
+            return dot
+        if isinstance(node, _Variable):
+            return state.lookup(node.name)
+        if isinstance(node, _Field):
+            return self._field_chain(state, dot, node, (), _MISSING)
+        if isinstance(node, _Pipeline):
+            mark = len(state.vars)
+            try:
+                return self._pipeline(state, dot, node)
+            finally:
+                del state.vars[mark:]
+        if isinstance(node, _Function):
+            return self._call(state, dot, node.name, (), _MISSING)
+        return None
+
+    def _field_chain(self, state: _State, dot, node: _Field, args, final):
+        receiver = dot if node.node is None else self._operand(state, dot, node.node)
+        names = node.names
+        for name in names[:-1]:
+            receiver = _field(receiver, name, None)
+        call_args = [self._operand(state, dot, a) for a in args]
+        if final is not _MISSING:
+            call_args.append(final)
+        return _field(receiver, names[-1], call_args if args or final is not _MISSING else None)
+
+    def _call(self, state: _State, dot, name, args, final):
+        if name in ("and", "or"):
+            # Short-circuits returning the first falsy (`and`) or truthy (`or`) argument or the last one
+            operands = list(args)
+            if final is not _MISSING:
+                operands.append(_Const(final))
+            if not operands:
+                raise GoTemplateError(f"wrong number of args for {name}: want at least 1 got 0")
+            value = None
+            for operand in operands:
+                value = self._operand(state, dot, operand)
+                if truth(value) != (name == "and"):
+                    break
+            return value
+
+        call_args = [self._operand(state, dot, a) for a in args]
+        if final is not _MISSING:
+            call_args.append(final)
+        try:
+            return self.funcs[name](*call_args)
+        except GoTemplateError:
+            raise
+        except TypeError as e:
+            raise GoTemplateError(f"error calling {name}: {e}") from e
+
+
+def _field(receiver, name: str, args: Optional[list]):
+    if isinstance(receiver, dict):
+        if args is not None:
+            raise GoTemplateError(f"{name} is not a method but has arguments")
+        return receiver.get(name)
+    if receiver is None:
+        raise GoTemplateError(f"nil pointer evaluating interface {{}}.{name}")
+    attr = getattr(receiver, name, _MISSING) if name[:1].isupper() and not isinstance(
+        receiver, (str, bytes, int, float, list, tuple)) else _MISSING
+    if attr is _MISSING:
+        raise GoTemplateError(f"can't evaluate field {name} in type {_go_type(receiver)}")
+    if callable(attr):
+        return attr(*(args or ()))
+    if args is not None:
+        raise GoTemplateError(f"{name} is not a method but has arguments")
+    return attr
+
+
+# Functions of Go templates
+
+def _basic_kind(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "string"
+    raise GoTemplateError(f"invalid type for comparison: {_go_type(value)}")
+
+
+def _eq(arg1, *args):
+    if not args:
+        raise GoTemplateError("missing argument for comparison")
+    kind = _basic_kind(arg1)
+    for arg in args:
+        if _basic_kind(arg) != kind:
+            raise GoTemplateError("incompatible types for comparison")
+        if arg1 == arg:
+            return True
+    return False
+
+
+def _ne(arg1, arg2):
+    return not _eq(arg1, arg2)
+
+
+def _lt(arg1, arg2):
+    kind = _basic_kind(arg1)
+    if kind == "bool" or _basic_kind(arg2) != kind:
+        raise GoTemplateError("incompatible types for comparison")
+    return arg1 < arg2
+
+
+def _le(arg1, arg2):
+    return _lt(arg1, arg2) or _eq(arg1, arg2)
+
+
+def _gt(arg1, arg2):
+    return not _le(arg1, arg2)
+
+
+def _ge(arg1, arg2):
+    return not _lt(arg1, arg2)
+
+
+def _len(value):
+    if isinstance(value, str):
+        return len(value.encode("UTF-8"))
+    if isinstance(value, (bytes, list, tuple, dict)):
+        return len(value)
+    raise GoTemplateError(f"len of type {_go_type(value)}")
+
+
+def _index(item, *indices):
+    for index in indices:
+        if isinstance(item, dict):
+            item = item.get(index)
+        elif isinstance(item, (list, tuple)):
+            if not isinstance(index, int) or isinstance(index, bool):
+                raise GoTemplateError(f"cannot index slice/array with type {_go_type(index)}")
+            if not 0 <= index < len(item):
+                raise GoTemplateError(f"index out of range: {index}")
+            item = item[index]
+        elif item is None:
+            raise GoTemplateError("index of untyped nil")
+        else:
+            raise GoTemplateError(f"can't index item of type {_go_type(item)}")
+    return item
+
+
+def _print(*args):
+    out = []
+    for i, arg in enumerate(args):
+        if i and not isinstance(arg, str) and not isinstance(args[i - 1], str):
+            out.append(" ")
+        out.append(go_format(arg, True))
+    return "".join(out)
+
+
+def _println(*args):
+    return " ".join(go_format(arg, True) for arg in args) + "\n"
+
+
+_VERB = re.compile(r"%([-+# 0]*)(\d+)?(?:\.(\d+))?(.)", re.S)
+
+
+def _printf(fmt, *args):
+    fmt = _string(fmt)
+    next_arg = 0
+
+    def replace(m):
+        nonlocal next_arg
+        flags, width, precision, verb = m.groups()
+        if verb == "%":
+            return "%"
+        if next_arg >= len(args):
+            return f"%!{verb}(MISSING)"
+        arg = args[next_arg]
+        next_arg += 1
+        numeric = False
+        if verb == "v":
+            s = go_format(arg, True)
+        elif verb == "s" and isinstance(arg, str):
+            s = arg if precision is None else arg[:int(precision)]
+        elif verb == "q" and isinstance(arg, str):
+            s = _go_quote(arg)
+        elif verb == "t" and isinstance(arg, bool):
+            s = go_format(arg)
+        elif verb == "d" and isinstance(arg, int) and not isinstance(arg, bool):
+            s = "%+d" % arg if "+" in flags else str(arg)
+            numeric = True
+        elif verb in "fFe" and isinstance(arg, float):
+            s = ("%" + ("+" if "+" in flags else "") + "." + (precision or "6") + verb.lower()) % arg
+            numeric = True
+        elif verb in "xX" and isinstance(arg, int) and not isinstance(arg, bool):
+            s = format(arg, verb)
+            numeric = True
+        elif verb in "xX" and isinstance(arg, str):
+            s = arg.encode("UTF-8").hex()
+            if verb == "X":
+                s = s.upper()
+        else:
+            raise UnsupportedTemplateError(f"printf verb %{verb} of {_go_type(arg)} is not supported")
+
+        if width is not None:
+            width = int(width)
+            if "-" in flags:
+                s = s.ljust(width)
+            elif "0" in flags and numeric:
+                sign = s[0] if s[:1] in "+-" else ""
+                s = sign + s[len(sign):].rjust(width - len(sign), "0")
+            else:
+                s = s.rjust(width)
+        return s
+
+    result = _VERB.sub(replace, fmt)
+    if next_arg < len(args):
+        raise UnsupportedTemplateError("printf with extra arguments is not supported")
+    return result
+
+
+def _not(value):
+    return not truth(value)
+
+
+BUILTIN_FUNCS = {
+    "not": _not,
+    "len": _len,
+    "index": _index,
+    "print": _print,
+    "printf": _printf,
+    "println": _println,
+    "eq": _eq,
+    "ne": _ne,
+    "lt": _lt,
+    "le": _le,
+    "gt": _gt,
+    "ge": _ge,
+}
+
+
+# Functions of Sprig and Helm
+
+def _string(value) -> str:
+    if isinstance(value, str):
+        return value
+    raise GoTemplateError(f"wrong type for value; expected string; got {_go_type(value)}")
+
+
+def _int(value) -> int:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise GoTemplateError(f"wrong type for value; expected int; got {_go_type(value)}")
+
+
+def _bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    raise GoTemplateError(f"wrong type for value; expected bool; got {_go_type(value)}")
+
+
+def _list(value) -> list:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    raise GoTemplateError(f"cannot use {_go_type(value)} as a list")
+
+
+def _map(value) -> dict:
+    if isinstance(value, dict):
+        return value
+    raise GoTemplateError(f"wrong type for value; expected map[string]interface {{}}; got {_go_type(value)}")
+
+
+def strval(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode("UTF-8", "replace")
+    return go_format(value, True)
+
+
+def to_int64(value) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if math.isfinite(value) else 0
+    if isinstance(value, str):
+        s = value
+        if "." in s:
+            s = s.rstrip("0").rstrip(".") if re.fullmatch(r"[-+]?\d+\.0*", s) else s
+        try:
+            return int(s, 0)
+        except ValueError:
+            return 0
+    return 0
+
+
+def to_float64(value) -> float:
+    if isinstance(value, (bool, int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def _json_plain(value):
+    """Mirrors the JSON round trip of Helm's YAML marshalling, which turns integral floats into integers"""
+    if isinstance(value, dict):
+        return {strval(k): _json_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_plain(v) for v in value]
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e21:
+        return int(value)
+    return value
+
+
+def to_yaml(value) -> str:
+    if value is None:
+        return "null"
+    data = yaml.safe_dump(_json_plain(value), default_flow_style=False, sort_keys=True, allow_unicode=True,
+                          width=float("inf"))
+    if data.endswith("\n...\n"):
+        data = data[:-4]
+    return data[:-1] if data.endswith("\n") else data
+
+
+def to_json(value) -> str:
+    return json.dumps(_json_plain(value), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def to_pretty_json(value) -> str:
+    return json.dumps(_json_plain(value), sort_keys=True, indent=2, ensure_ascii=False)
+
+
+def from_yaml(s):
+    try:
+        value = yaml.safe_load(_string(s))
+    except yaml.YAMLError as e:
+        raise UnsupportedTemplateError(f"fromYaml of invalid YAML: {e}") from e
+    return go_numbers(value) if value is not None else {}
+
+
+def from_json(s):
+    try:
+        return go_numbers(json.loads(_string(s)))
+    except ValueError as e:
+        raise UnsupportedTemplateError(f"fromJson of invalid JSON: {e}") from e
+
+
+def _empty(value) -> bool:
+    return not truth(value)
+
+
+def _default(default, *given):
+    if not given or _empty(given[0]):
+        return default
+    return given[0]
+
+
+def _coalesce(*values):
+    for value in values:
+        if not _empty(value):
+            return value
+    return None
+
+
+def _ternary(true_value, false_value, condition):
+    return true_value if _bool(condition) else false_value
+
+
+def _required(message, value):
+    if value is None or value == "":
+        raise GoTemplateError(_string(message))
+    return value
+
+
+def _fail(message):
+    raise GoTemplateError(_string(message))
+
+
+def _quote(*values):
+    return " ".join(_go_quote(strval(v)) for v in values if v is not None)
+
+
+def _squote(*values):
+    return " ".join("'%s'" % strval(v) for v in values if v is not None)
+
+
+def _title(s):
+    return re.sub(r"(?<!\w)\w", lambda m: m.group(0).upper(), _string(s))
+
+
+def _untitle(s):
+    return re.sub(r"(?<!\w)\w", lambda m: m.group(0).lower(), _string(s))
+
+
+def _trunc(count, s):
+    count = _int(count)
+    s = _string(s)
+    if count < 0 and len(s) + count > 0:
+        return s[len(s) + count:]
+    if 0 <= count < len(s):
+        return s[:count]
+    return s
+
+
+def _substr(start, end, s):
+    start = _int(start)
+    end = _int(end)
+    s = _string(s)
+    if start < 0:
+        return s[:end]
+    if end < 0 or end > len(s):
+        return s[start:]
+    return s[start:end]
+
+
+def _indent(spaces, s):
+    pad = " " * _int(spaces)
+    return pad + _string(s).replace("\n", "\n" + pad)
+
+
+def _nindent(spaces, s):
+    return "\n" + _indent(spaces, s)
+
+
+def _strslice(value) -> list[str]:
+    if isinstance(value, (list, tuple)):
+        return [strval(v) for v in value if v is not None]
+    if value is None:
+        return []
+    return [strval(value)]
+
+
+def _split_list(sep, s):
+    sep = _string(sep)
+    s = _string(s)
+    return list(s) if not sep else s.split(sep)
+
+
+def _split(sep, s):
+    return {"_%d" % i: part for i, part in enumerate(_split_list(sep, s))}
+
+
+def _b64dec(s):
+    try:
+        return base64.b64decode(_string(s), validate=True).decode("UTF-8")
+    except ValueError as e:
+        raise UnsupportedTemplateError(f"b64dec of invalid input: {e}") from e
+
+
+def _dict(*pairs):
+    result = {}
+    for i in range(0, len(pairs), 2):
+        result[strval(pairs[i])] = pairs[i + 1] if i + 1 < len(pairs) else ""
+    return result
+
+
+def _get(d, key):
+    return _map(d).get(_string(key), "")
+
+
+def _set(d, key, value):
+    _map(d)[_string(key)] = value
+    return d
+
+
+def _unset(d, key):
+    _map(d).pop(_string(key), None)
+    return d
+
+
+def _keys(*dicts):
+    # Sprig returns the keys in Go's random map order, sorted keys are one of the possible outcomes
+    return [k for d in dicts for k in sorted(_map(d))]
+
+
+def _merge(dst, *sources, overwrite=False):
+    dst = _map(dst)
+    for src in sources:
+        for key, value in _map(src).items():
+            current = dst.get(key)
+            if isinstance(current, dict) and isinstance(value, dict):
+                _merge(current, value, overwrite=overwrite)
+            elif key not in dst or _empty(current) or overwrite and not _empty(value):
+                dst[key] = copy.deepcopy(value)
+    return dst
+
+
+def _dig(*args):
+    if len(args) < 3:
+        raise GoTemplateError("dig requires at least three arguments")
+    d = _map(args[-1])
+    default = args[-2]
+    for key in args[:-2]:
+        if not isinstance(d, dict) or _string(key) not in d:
+            return default
+        d = d[key]
+    return d
+
+
+def _kind_of(value):
+    if value is None:
+        return "invalid"
+    if isinstance(value, int) and not isinstance(value, bool):
+        raise UnsupportedTemplateError("kind of integers is not supported")
+    kinds = {bool: "bool", float: "float64", str: "string", list: "slice", dict: "map"}
+    return kinds.get(type(value), "struct")
+
+
+def _go_replacement(repl: str):
+    """Translates the `$1`, `${1}` and `${name}` references of Go's regexp replacements"""
+    return re.sub(r"\$(?:\{(\w+)\}|(\w+))|(\\)",
+                  lambda m: "\\\\" if m.group(3) else "\\g<%s>" % (m.group(1) or m.group(2)), repl)
+
+
+def _regex(pattern):
+    try:
+        return re.compile(_string(pattern))
+    except re.error as e:
+        raise UnsupportedTemplateError(f"regular expression {pattern!r} is not supported: {e}") from e
+
+
+def _regex_find_all(pattern, s, n):
+    matches = [m.group(0) for m in _regex(pattern).finditer(_string(s))]
+    n = _int(n)
+    return matches if n < 0 else matches[:n]
+
+
+def _math(func):
+    def wrapper(*args):
+        return func(*(to_int64(a) for a in args))
+
+    return wrapper
+
+
+def _go_div(a, b):
+    if b == 0:
+        raise GoTemplateError("integer divide by zero")
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def _go_mod(a, b):
+    return a - b * _go_div(a, b)
+
+
+def _until(count):
+    count = _int(count)
+    return list(range(count)) if count >= 0 else list(range(0, count, -1))
+
+
+def _uniq(values):
+    result = []
+    for v in _list(values):
+        if v not in result:
+            result.append(v)
+    return result
+
+
+SPRIG_FUNCS = {
+    "default": _default,
+    "empty": _empty,
+    "coalesce": _coalesce,
+    "ternary": _ternary,
+    "required": _required,
+    "fail": _fail,
+    "quote": _quote,
+    "squote": _squote,
+    "upper": lambda s: _string(s).upper(),
+    "lower": lambda s: _string(s).lower(),
+    "title": _title,
+    "untitle": _untitle,
+    "trim": lambda s: _string(s).strip(),
+    "trimAll": lambda cutset, s: _string(s).strip(_string(cutset)),
+    "trimPrefix": lambda prefix, s: _string(s).removeprefix(_string(prefix)),
+    "trimSuffix": lambda suffix, s: _string(s).removesuffix(_string(suffix)),
+    "trunc": _trunc,
+    "substr": _substr,
+    "replace": lambda old, new, s: _string(s).replace(_string(old), _string(new)),
+    "contains": lambda substr, s: _string(substr) in _string(s),
+    "hasPrefix": lambda prefix, s: _string(s).startswith(_string(prefix)),
+    "hasSuffix": lambda suffix, s: _string(s).endswith(_string(suffix)),
+    "repeat": lambda count, s: _string(s) * max(_int(count), 0),
+    "nospace": lambda s: "".join(_string(s).split()),
+    "cat": lambda *values: " ".join(strval(v) for v in values if v is not None),
+    "indent": _indent,
+    "nindent": _nindent,
+    "toString": strval,
+    "toStrings": lambda values: [strval(v) for v in _list(values)],
+    "b64enc": lambda s: base64.b64encode(_string(s).encode("UTF-8")).decode("ascii"),
+    "b64dec": _b64dec,
+    "sha256sum": lambda s: sha256(_string(s).encode("UTF-8")).hexdigest(),
+    "sha1sum": lambda s: sha1(_string(s).encode("UTF-8")).hexdigest(),
+    "join": lambda sep, values: _string(sep).join(_strslice(values)),
+    "splitList": _split_list,
+    "split": _split,
+    "list": lambda *values: list(values),
+    "append": lambda values, v: _list(values) + [v],
+    "push": lambda values, v: _list(values) + [v],
+    "prepend": lambda values, v: [v] + _list(values),
+    "first": lambda values: _list(values)[0] if values else None,
+    "last": lambda values: _list(values)[-1] if values else None,
+    "rest": lambda values: _list(values)[1:],
+    "initial": lambda values: _list(values)[:-1],
+    "uniq": _uniq,
+    "compact": lambda values: [v for v in _list(values) if not _empty(v)],
+    "without": lambda values, *omit: [v for v in _list(values) if v not in omit],
+    "has": lambda needle, haystack: haystack is not None and needle in _list(haystack),
+    "concat": lambda *lists: [v for values in lists for v in _list(values)],
+    "reverse": lambda values: _list(values)[::-1],
+    "sortAlpha": lambda values: sorted(_strslice(values)),
+    "until": _until,
+    "dict": _dict,
+    "get": _get,
+    "set": _set,
+    "unset": _unset,
+    "hasKey": lambda d, key: _string(key) in _map(d),
+    "keys": _keys,
+    "pluck": lambda key, *dicts: [_map(d)[key] for d in dicts if key in _map(d)],
+    "merge": lambda dst, *sources: _merge(dst, *sources),
+    "mergeOverwrite": lambda dst, *sources: _merge(dst, *sources, overwrite=True),
+    "pick": lambda d, *keys: {k: v for k, v in _map(d).items() if k in keys},
+    "omit": lambda d, *keys: {k: v for k, v in _map(d).items() if k not in keys},
+    "deepCopy": copy.deepcopy,
+    "dig": _dig,
+    "kindOf": _kind_of,
+    "kindIs": lambda kind, value: _string(kind) == _kind_of(value),
+    "int": to_int64,
+    "int64": to_int64,
+    "float64": to_float64,
+    "atoi": lambda s: to_int64(_string(s)) if re.fullmatch(r"[-+]?\d+", _string(s).strip()) else 0,
+    "add": _math(lambda *values: sum(values)),
+    "add1": _math(lambda a: a + 1),
+    "sub": _math(lambda a, b: a - b),
+    "mul": _math(lambda a, *values: math.prod(values, start=a)),
+    "div": _math(_go_div),
+    "mod": _math(_go_mod),
+    "max": _math(lambda a, *values: max(a, *values)),
+    "min": _math(lambda a, *values: min(a, *values)),
+    "regexMatch": lambda pattern, s: _regex(pattern).search(_string(s)) is not None,
+    "regexFind": lambda pattern, s: (lambda m: m.group(0) if m else "")(_regex(pattern).search(_string(s))),
+    "regexFindAll": _regex_find_all,
+    "regexReplaceAll": lambda pattern, s, repl: _regex(pattern).sub(_go_replacement(_string(repl)), _string(s)),
+    "regexReplaceAllLiteral": lambda pattern, s, repl: _regex(pattern).sub(lambda m: _string(repl), _string(s)),
+    "toYaml": to_yaml,
+    "toJson": to_json,
+    "toPrettyJson": to_pretty_json,
+    "fromYaml": from_yaml,
+    "fromJson": from_json,
+}
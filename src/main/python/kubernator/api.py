@@ -24,13 +24,17 @@ import platform
 import re
 import sys
 import textwrap
+import time
 import traceback
 import urllib.parse
 from collections.abc import Callable
 from collections.abc import Iterable, MutableSet, Reversible
+from collections import OrderedDict, defaultdict
 from enum import Enum
+from functools import lru_cache
 from hashlib import sha256
 from io import StringIO as io_StringIO
+from operator import itemgetter
 from pathlib import Path
 from shutil import rmtree
 from subprocess import CalledProcessError
@@ -41,6 +45,7 @@ import requests
 import yaml
 from diff_match_patch import diff_match_patch
 from gevent import sleep
+from gevent.lock import Semaphore
 from jinja2 import (Environment,
                     ChainableUndefined,
                     make_logging_undefined,
@@ -53,6 +58,7 @@ from yaml import MarkedYAMLError
 from kubernator._json_path import jp  # noqa: F401
 from kubernator._k8s_client_patches import (URLLIB_HEADERS_PATCH,
                                             CUSTOM_OBJECT_PATCH_25)
+from kubernator.timing import timings, YAML
 
 _CACHE_HEADER_TRANSLATION = {"etag": "if-none-match",
                              "last-modified": "if-modified-since"}
@@ -100,9 +106,11 @@ class TemplateEngine:
     VARIABLE_START_STRING = "{${"
     VARIABLE_END_STRING = "}$}"
 
-    def __init__(self, logger):
+    # Values of these exact types can never contain a nested template and are stringified by Jinja itself
+    _PLAIN_SCALAR_TYPES = frozenset((int, float, bool, type(None)))
+
+    def __init__(self, logger, nested_template_cache_size=1024):
         self.template_failures = 0
-        self.templates = {}
 
         class CollectingUndefined(ChainableUndefined):
             __slots__ = ()
@@ -116,17 +124,22 @@ class TemplateEngine:
             base=CollectingUndefined
         )
 
+        def compile_nested_template(value_template_content):
+            return self.env.from_string(value_template_content, self.env.globals)
+
+        self._nested_template = lru_cache(maxsize=nested_template_cache_size)(compile_nested_template)
+
+        plain_scalar_types = self._PLAIN_SCALAR_TYPES
+
         @pass_context
         def variable_finalizer(ctx, value):
-            normalized_value = str(value)
+            value_type = value.__class__
+            if value_type in plain_scalar_types:
+                return value
+
+            normalized_value = value if value_type is str else str(value)
             if self.VARIABLE_START_STRING in normalized_value and self.VARIABLE_END_STRING in normalized_value:
-                value_template_content = sys.intern(normalized_value)
-                env: Environment = ctx.environment
-                value_template = self.templates.get(value_template_content)
-                if not value_template:
-                    value_template = env.from_string(value_template_content, env.globals)
-                    self.templates[value_template_content] = value_template
-                return value_template.render(ctx.parent)
+                return self._nested_template(normalized_value).render(ctx.parent)
 
             return normalized_value
 
@@ -150,6 +163,10 @@ class TemplateEngine:
     def failures(self):
         return self.template_failures
 
+    def cache_info(self):
+        """Returns the hit/miss/size counters of the nested template cache."""
+        return self._nested_template.cache_info()
+
 
 def calling_frame_source(depth=2):
     f = traceback.extract_stack(limit=depth + 1)[0]
@@ -166,21 +183,90 @@ def to_patterns(*patterns):
     return [re.compile(fnmatch.translate(p)) for p in patterns]
 
 
-def scan_dir(logger, path: Path, path_filter: Callable[[os.DirEntry], bool], excludes, includes):
+class DirectoryListing:
+    """
+    Snapshot of the entries of a single directory sorted by name, with the entry types resolved at scan time.
+
+    A snapshot remains current for as long as the modification time of the directory is unchanged and is old
+    enough not to be racy, i.e. an entry could not have been added or removed within the same timestamp tick
+    as the scan itself.
+    """
+    RACY_WINDOW_NS = 2_000_000_000
+    RECENT_SIZE = 16
+
+    __slots__ = ("path", "entries", "mtime_ns", "scanned_ns")
+
+    _recent: "OrderedDict[Path, DirectoryListing]" = OrderedDict()
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.scanned_ns = time.time_ns()
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        with os.scandir(path) as it:  # type: Iterable[os.DirEntry]
+            entries = sorted(it, key=lambda d: d.name)
+        for d in entries:
+            # DirEntry caches these, so the filters never touch the filesystem again
+            d.is_dir()
+            d.is_file()
+        self.entries: dict[str, os.DirEntry] = {d.name: d for d in entries}
+
+    def is_current(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        return mtime_ns == self.mtime_ns and mtime_ns < self.scanned_ns - self.RACY_WINDOW_NS
+
+    @classmethod
+    def of(cls, path: Path) -> "DirectoryListing":
+        """Returns a current listing of `path`, sharing the recently taken snapshots between all callers"""
+        listing = cls._recent.get(path)
+        if listing is not None and listing.is_current():
+            cls._recent.move_to_end(path)
+            return listing
+
+        listing = cls(path)
+        cls.remember(listing)
+        return listing
+
+    @classmethod
+    def remember(cls, listing: "DirectoryListing"):
+        recent = cls._recent
+        recent[listing.path] = listing
+        recent.move_to_end(listing.path)
+        while len(recent) > cls.RECENT_SIZE:
+            recent.popitem(last=False)
+
+    def __repr__(self):
+        return "DirectoryListing[%s]" % self.path
+
+
+def scan_dir(logger, path: Path, path_filter: Callable[[os.DirEntry], bool], excludes, includes,
+             listing: Optional[DirectoryListing] = None):
     logger.debug("Scanning %s, excluding %s, including %s", path, excludes, includes)
-    with os.scandir(path) as it:  # type: Iterable[os.DirEntry]
-        files = {f: f for f in
-                 sorted(d.name for d in it if path_filter(d) and not re_filter(d.name, excludes))}
+    if listing is None or not listing.is_current():
+        listing = DirectoryListing.of(path)
+
+    if not isinstance(excludes, Globs):
+        excludes = Globs(excludes)
+    if not isinstance(includes, Globs):
+        includes = Globs(includes)
+
+    selected = []
+    for name, d in listing.entries.items():
+        if path_filter(d) and excludes.match_index(name) is None:
+            include_idx = includes.match_index(name)
+            if include_idx is not None:
+                selected.append((include_idx, name))
 
-    for include in includes:
-        logger.trace("Considering include %s in %s", include, path)
-        for f in list(files.keys()):
-            if include.match(f):
-                del files[f]
-                logger.debug("Selecting %s in %s as it matches %s", f, path, include)
-                yield path / f
+    # Entries are sorted by name, the stable sort orders them by the first include they match
+    selected.sort(key=itemgetter(0))
+    for include_idx, name in selected:
+        logger.debug("Selecting %s in %s as it matches %s", name, path, includes[include_idx])
+        yield path / name
 
 
+@timings.timed(YAML, "parse")
 def parse_yaml_docs(document: str, source=None):
     try:
         return list(d for d in yaml.safe_load_all(document) if d)
@@ -188,6 +274,49 @@ def parse_yaml_docs(document: str, source=None):
         raise
 
 
+class YAMLDocumentSplitter:
+    """Splits a YAML stream fed line by line into documents and parses each document as soon as it is complete.
+
+    Documents are delimited by the `---` and `...` markers at the start of a line, the only place they may appear
+    outside a document body. Directives and comments preceding a `---` stay with the document that follows. Empty
+    documents are skipped.
+    """
+
+    def __init__(self, document_sink: Callable[[dict], None]):
+        self._document_sink = document_sink
+        self._lines: list[str] = []
+        self._has_content = False
+
+    def feed(self, line: str):
+        if line.startswith("---") and (len(line) == 3 or line[3] in " \t\r\n"):
+            if self._has_content:
+                self._flush()
+            self._lines.append(line)
+            self._has_content = True
+        elif line.startswith("...") and (len(line) == 3 or line[3] in " \t\r\n"):
+            self._lines.append(line)
+            self._flush()
+        else:
+            self._lines.append(line)
+            if not self._has_content:
+                stripped = line.lstrip()
+                self._has_content = bool(stripped) and stripped[0] not in "#%"
+
+    def close(self):
+        if self._has_content:
+            self._flush()
+        self._lines.clear()
+
+    @timings.timed(YAML, "parse")
+    def _flush(self):
+        document = "".join(self._lines)
+        self._lines.clear()
+        self._has_content = False
+        d = yaml.safe_load(document)
+        if d:
+            self._document_sink(d)
+
+
 class FileType(Enum):
     TEXT = (lambda x: x,)
     BINARY = (lambda x: x,)
@@ -340,7 +469,11 @@ class _PropertyList(MutableSequence):
         return self.__read_seq.__rmul__(__n)
 
     def __imul__(self, __n):
-        return self.__read_seq.__imul__(__n)
+        while True:
+            try:
+                return self.__write_seq.__imul__(__n)
+            except AttributeError:
+                self.__clone()
 
     def __contains__(self, __o):
         return self.__read_seq.__contains__(__o)
@@ -367,11 +500,7 @@ class _PropertyList(MutableSequence):
         return self.__read_seq.count(__value)
 
     def copy(self):
-        while True:
-            try:
-                return self.__write_seq.copy()
-            except AttributeError:
-                self.__clone()
+        return self.__read_seq.copy()
 
     def __getitem__(self, __i):
         return self.__read_seq.__getitem__(__i)
@@ -433,11 +562,7 @@ class _PropertyList(MutableSequence):
                 self.__clone()
 
     def __add__(self, __x):
-        while True:
-            try:
-                return self.__write_seq.__add__(__x)
-            except AttributeError:
-                self.__clone()
+        return self.__read_seq.__add__(__x)
 
     def __iadd__(self, __x):
         while True:
@@ -491,30 +616,74 @@ class PropertyDict:
     # majority of attribute accesses in practice.
     _descriptor_names: set = set()
 
+    # Bumped on every mutation of any PropertyDict. Each PropertyDict caches the ancestor layers it resolved names
+    # to, and the names visible through it, only for as long as the generation stays the same.
+    _generation: int = 0
+
     def __init__(self, _dict=None, _parent=None):
         self.__dict__["_PropertyDict__dict"] = _dict or {}
         self.__dict__["_PropertyDict__parent"] = _parent
+        self.__dict__["_PropertyDict__layers"] = {}
+        self.__dict__["_PropertyDict__names"] = None
+        self.__dict__["_PropertyDict__cache_generation"] = -1
+        self.__dict__["_PropertyDict__list_views"] = {}
 
     def __getattr__(self, item):
         if item in PropertyDict._descriptor_names:
             v = self.__descriptor_getattr(item, self)
-        else:
-            v = self.__plain_getattr(item)
-        if isinstance(v, _PropertyList):
-            v._PropertyList__write_parent = self
-        return v
+            if isinstance(v, _PropertyList):
+                v._PropertyList__write_parent = self
+            return v
+        return self.__plain_getattr(item)
 
     def __plain_getattr(self, item):
+        layer = self
         try:
             v = self.__dict[item]
-            if isinstance(v, list):
-                v = _PropertyList(v, self, item)
-            return v
         except KeyError:
-            parent = self.__parent
-            if parent is not None:
-                return parent._PropertyDict__plain_getattr(item)
-            raise AttributeError("no attribute %r" % item) from None
+            layer = self.__ancestor_layer(item)
+            if layer is None:
+                raise AttributeError("no attribute %r" % item) from None
+            v = layer._PropertyDict__dict[item]
+        if isinstance(v, list):
+            return self.__list_view(item, layer, v)
+        return v
+
+    def __list_view(self, item, layer, seq):
+        """
+        Returns the `_PropertyList` writing into this PropertyDict for the list `seq` found in `layer`.
+        The view is reused for as long as the same list is found under the name, which is also the case after the
+        view copied it into this PropertyDict on the first write.
+        """
+        list_views = self.__list_views
+        view = list_views.get(item)
+        if view is None or view._PropertyList__read_seq is not seq:
+            view = _PropertyList(seq, layer, item)
+            view._PropertyList__write_parent = self
+            list_views[item] = view
+        return view
+
+    def __check_cache_generation(self):
+        generation = PropertyDict._generation
+        if self.__cache_generation != generation:
+            self.__layers.clear()
+            self.__dict__["_PropertyDict__names"] = None
+            self.__dict__["_PropertyDict__cache_generation"] = generation
+
+    def __ancestor_layer(self, item):
+        """Returns the nearest ancestor holding `item` or `None`"""
+        self.__check_cache_generation()
+        layers = self.__layers
+        try:
+            return layers[item]
+        except KeyError:
+            pass
+
+        layer = self.__parent
+        while layer is not None and item not in layer._PropertyDict__dict:
+            layer = layer._PropertyDict__parent
+        layers[item] = layer
+        return layer
 
     def __descriptor_getattr(self, item, origin):
         first_layer = None
@@ -565,38 +734,42 @@ class PropertyDict:
                     pass
             value = PropertyDict(value, _parent=parent_dict)
         self.__dict[key] = value
+        PropertyDict._generation += 1
 
     def __delattr__(self, item):
         del self.__dict[item]
+        PropertyDict._generation += 1
 
     def __len__(self):
-        return len(self.__dir__())
+        return len(self.__visible_names())
 
     def __getitem__(self, item):
         return self.__dict.__getitem__(item)
 
     def __setitem__(self, key, value):
         self.__dict.__setitem__(key, value)
+        PropertyDict._generation += 1
 
     def __delitem__(self, key):
         self.__dict.__delitem__(key)
+        PropertyDict._generation += 1
 
     def __contains__(self, item):
-        try:
-            self.__dict[item]
-            return True
-        except KeyError:
-            parent = self.__parent
-            if parent is not None:
-                return parent.__contains__(item)
-            return False
+        return item in self.__dict or self.__ancestor_layer(item) is not None
+
+    def __visible_names(self) -> frozenset[str]:
+        self.__check_cache_generation()
+        names = self.__names
+        if names is None:
+            names = set(self.__dict.keys())
+            if self.__parent is not None:
+                names.update(self.__parent._PropertyDict__visible_names())
+            names = frozenset(names)
+            self.__dict__["_PropertyDict__names"] = names
+        return names
 
     def __dir__(self) -> Iterable[str]:
-        result: set[str] = set()
-        result.update(self.__dict.keys())
-        if self.__parent is not None:
-            result.update(self.__parent.__dir__())
-        return result
+        return set(self.__visible_names())
 
     def __repr__(self):
         return "PropertyDict[%r]" % self.__dict
@@ -617,6 +790,51 @@ def config_get(config: PropertyDict, key: str, default=None):
         return default
 
 
+class _GlobMatcher:
+    """
+    Patterns of `Globs` combined into a single regular expression, with every pattern wrapped into a group to
+    find out which one matched. Patterns that can't be combined are matched one at a time instead.
+    """
+    __slots__ = ("_patterns", "_regex", "_group_index")
+
+    _UNCOMBINABLE_RE = re.compile(r"\\[1-9]|\(\?\(")  # Numbered backreferences and conditionals
+
+    def __init__(self, patterns: Iterable[re.Pattern]):
+        self._patterns = patterns = tuple(patterns)
+        self._regex = None
+        self._group_index = None
+
+        if not patterns:
+            return
+        flags = patterns[0].flags
+        parts = []
+        group_index = {}
+        group = 1
+        for idx, p in enumerate(patterns):
+            if p.flags != flags or not isinstance(p.pattern, str) or self._UNCOMBINABLE_RE.search(p.pattern):
+                return
+            group_index[group] = idx
+            parts.append(f"({p.pattern})")
+            group += p.groups + 1
+
+        try:
+            self._regex = re.compile("|".join(parts), flags)
+        except re.error:
+            return
+        self._group_index = group_index
+
+    def match_index(self, name: str) -> Optional[int]:
+        regex = self._regex
+        if regex is not None:
+            m = regex.match(name)
+            return self._group_index[m.lastindex] if m else None
+
+        for idx, p in enumerate(self._patterns):
+            if p.match(name):
+                return idx
+        return None
+
+
 class Globs(MutableSet[Union[str, re.Pattern]]):
     def __init__(self, source: Optional[list[Union[str, re.Pattern]]] = None,
                  immutable=False):
@@ -625,6 +843,7 @@ class Globs(MutableSet[Union[str, re.Pattern]]):
             self._list = [self.__wrap__(v) for v in source]
         else:
             self._list = []
+        self._matcher = source._matcher if isinstance(source, Globs) else None
 
     def __wrap__(self, item: Union[str, re.Pattern]):
         if isinstance(item, re.Pattern):
@@ -640,6 +859,19 @@ class Globs(MutableSet[Union[str, re.Pattern]]):
     def __len__(self):
         return self._list.__len__()
 
+    def __getitem__(self, idx: int) -> re.Pattern:
+        return self._list[idx]
+
+    def match_index(self, name: str) -> Optional[int]:
+        """Returns the index of the first pattern matching `name` or `None` if none match"""
+        matcher = self._matcher
+        if matcher is None:
+            matcher = self._matcher = _GlobMatcher(self._list)
+        return matcher.match_index(name)
+
+    def matches(self, name: str) -> bool:
+        return self.match_index(name) is not None
+
     def add(self, value: Union[str, re.Pattern]):
         if self._immutable:
             raise RuntimeError("immutable")
@@ -648,6 +880,7 @@ class Globs(MutableSet[Union[str, re.Pattern]]):
         value = self.__wrap__(value)
         if value not in _list:
             _list.append(value)
+            self._matcher = None
 
     def extend(self, values: Iterable[Union[str, re.Pattern]]):
         for v in values:
@@ -661,6 +894,7 @@ class Globs(MutableSet[Union[str, re.Pattern]]):
         value = self.__wrap__(value)
         if value in _list:
             _list.remove(value)
+            self._matcher = None
 
     def add_first(self, value: Union[str, re.Pattern]):
         if self._immutable:
@@ -670,6 +904,7 @@ class Globs(MutableSet[Union[str, re.Pattern]]):
         value = self.__wrap__(value)
         if value not in _list:
             _list.insert(0, value)
+            self._matcher = None
 
     def extend_first(self, values: Reversible[Union[str, re.Pattern]]):
         for v in reversed(values):
@@ -759,6 +994,36 @@ def sha256_file_digest(path):
     return h.hexdigest()
 
 
+_GIT_SHA = re.compile(r"[0-9a-f]{40}|[0-9a-f]{64}")
+
+# Serializes the git commands changing an object store shared by the repositories of several refs
+_STORE_LOCKS: dict[Path, Semaphore] = defaultdict(Semaphore)
+
+
+def _sparse_paths(path_prefixes: Optional[Iterable[str]]) -> Optional[list[str]]:
+    """Normalizes the path prefixes to check out of a repository, `None` meaning all of it"""
+    if path_prefixes is None:
+        return None
+    paths = set()
+    for path_prefix in path_prefixes:
+        parts = [part for part in str(path_prefix).replace("\\", "/").split("/") if part not in ("", ".")]
+        if not parts or ".." in parts:
+            return None
+        paths.add("/".join(parts))
+    return sorted(p for p in paths if not _is_sparse_path_covered(p, paths - {p})) or None
+
+
+def _is_sparse_path_covered(path: str, paths: Iterable[str]) -> bool:
+    return any(path == p or path.startswith(f"{p}/") for p in paths)
+
+
+def _short_ref_name(ref_name: str) -> str:
+    for prefix in ("refs/heads/", "refs/tags/"):
+        if ref_name.startswith(prefix):
+            return ref_name[len(prefix):]
+    return ref_name
+
+
 class Repository:
     logger = logging.getLogger("kubernator.repository")
     git_logger = logger.getChild("git")
@@ -782,6 +1047,13 @@ class Repository:
         self.ref = None
         self.local_dir = None
 
+        self._run = None
+        self._run_capturing_out = None
+        self._remote_dir = None
+        self._store_dir = None
+        self._worktree_ref = None
+        self._sparse_paths_file = None
+
     def __eq__(self, o: object) -> bool:
         if isinstance(o, Repository):
             return self._hash_obj == o._hash_obj
@@ -789,9 +1061,15 @@ class Repository:
     def __hash__(self) -> int:
         return hash(self._hash_obj)
 
-    def init(self, logger, context):
-        run = context.app.run
-        run_capturing_out = context.app.run_capturing_out
+    def init(self, logger, context, path_prefixes: Optional[Iterable[str]] = None):
+        """Checks out the repository into the cache, only the `path_prefixes` of it if specified"""
+        self.prepare(context)
+        self.sync(logger, path_prefixes)
+
+    def prepare(self, context):
+        """Resolves the URL, the ref and the local directory of the repository, without running git"""
+        self._run = context.app.run
+        self._run_capturing_out = context.app.run_capturing_out
 
         url = self.url
         if self._cred_aug:
@@ -807,42 +1085,181 @@ class Repository:
 
         config_dir = get_cache_dir("git")
 
-        git_cache = config_dir / sha256(self.clone_url_str.encode("UTF-8")).hexdigest()
+        # All refs of a remote share one bare object store, and each ref is checked out into a worktree of its own
+        self._remote_dir = config_dir / sha256(self.clone_url_str.encode("UTF-8")).hexdigest()
+        self._store_dir = self._remote_dir / "repo.git"
+        worktree_name = sha256((self.ref or "").encode("UTF-8")).hexdigest()
+        self._worktree_ref = f"refs/kubernator/{worktree_name}"
+        self.local_dir = self._remote_dir / worktree_name
+        self._sparse_paths_file = self._remote_dir / f"{worktree_name}.sparse-paths"
+
+    def sync(self, logger, path_prefixes: Optional[Iterable[str]] = None):
+        """Brings the cache of the prepared repository up to date, only the `path_prefixes` checked out if specified.
 
-        if git_cache.exists() and git_cache.is_dir() and (git_cache / ".git").exists():
+        The object store is a shallow partial clone, that only has the blobs of the files checked out. When the remote
+        ref still points to the commit checked out, nothing is fetched.
+        """
+        sparse_paths = _sparse_paths(path_prefixes)
+
+        if self._local_sha() is not None:
             try:
-                run(["git", "status"], None, None, cwd=git_cache).wait()
+                if self._update():
+                    self._checkout(self._worktree_ref)
+                if sparse_paths != self.sparse_paths:
+                    self._set_sparse_paths(sparse_paths)
+                return
             except CalledProcessError:
-                rmtree(git_cache)
+                self.logger.warning("Checkout of %s in %s is unusable and will be recreated", self.url_str,
+                                    self.local_dir)
+
+        if self.local_dir.exists():
+            rmtree(self.local_dir)
+        self._sparse_paths_file.unlink(missing_ok=True)
+        self._add_worktree(logger, sparse_paths)
 
-        self.local_dir = git_cache
+    @property
+    def sparse_paths(self) -> Optional[list[str]]:
+        """The paths checked out, all of them if `None`"""
+        try:
+            return self._sparse_paths_file.read_text().splitlines()
+        except FileNotFoundError:
+            return None
+
+    def checkout_paths(self, path_prefixes: Optional[Iterable[str]] = None):
+        """Makes sure that the `path_prefixes`, or the whole repository, are checked out"""
+        sparse_paths = _sparse_paths(path_prefixes)
+        current_paths = self.sparse_paths
+        if current_paths is None:
+            return
+        if sparse_paths is not None:
+            missing_paths = [p for p in sparse_paths if not _is_sparse_path_covered(p, current_paths)]
+            if not missing_paths:
+                return
+            sparse_paths = _sparse_paths(current_paths + missing_paths)
+        self._set_sparse_paths(sparse_paths)
+
+    def _add_worktree(self, logger, sparse_paths: Optional[list[str]]):
+        stdout_logger = StripNL(self.git_logger.debug)
+        stderr_logger = StripNL(self.git_logger.info)
+
+        with _STORE_LOCKS[self._store_dir]:
+            if (self._remote_dir / ".git").exists():
+                # A checkout cached before the object store was shared
+                rmtree(self._remote_dir)
+
+            if not self._store_dir.exists():
+                self.logger.info("Initializing %s -> %s", self.url_str, self._store_dir)
+                args = (["git", "clone", "--bare", "--depth", "1", "--filter=blob:none", "--no-tags",
+                         "-" + ("v" * log_level_to_verbosity_count(logger.getEffectiveLevel()))] +
+                        (["-b", self.ref] if self.ref and not self._ref_is_sha() else []) +
+                        ["--", self.clone_url_str, str(self._store_dir)])
+                safe_args = [c if c != self.clone_url_str else self.url_str for c in args]
+                self._run(args, stdout_logger, stderr_logger, safe_args=safe_args).wait()
+                cloned = True
+            else:
+                cloned = False
+
+            if cloned and not self._ref_is_sha():
+                # The ref is what has just been cloned
+                self._run(["git", "update-ref", self._worktree_ref, "HEAD"],
+                          stdout_logger, stderr_logger, cwd=self._store_dir).wait()
+            else:
+                self._fetch(self.ref if self._ref_is_sha() else self._remote_ref(stderr_logger)[0])
 
+            self.logger.info("Checking out %s -> %s", self.url_str, self.local_dir)
+            self._run(["git", "worktree", "add", "--force", "--detach", "--no-checkout", str(self.local_dir),
+                       self._worktree_ref], stdout_logger, stderr_logger, cwd=self._store_dir).wait()
+
+        if sparse_paths is not None:
+            self._set_sparse_paths(sparse_paths)
+        self._checkout(self._worktree_ref)
+
+    def _update(self) -> bool:
+        """Fetches the ref into the object store if the remote has moved it, returns whether it did"""
+        stderr_logger = StripNL(self.git_logger.info)
+
+        ref_name, sha = self._remote_ref(stderr_logger)
+        self.logger.info("Using %s%s cached in %s", self.url_str,
+                         f"?ref={_short_ref_name(ref_name)}" if not self.ref else "",
+                         self.local_dir)
+        if sha == self._local_sha():
+            self.logger.debug("Cache of %s is at %s of %s already", self.url_str, sha, ref_name)
+            return False
+
+        with _STORE_LOCKS[self._store_dir]:
+            self._fetch(ref_name)
+        return True
+
+    def _fetch(self, ref_name: str):
         stdout_logger = StripNL(self.git_logger.debug)
         stderr_logger = StripNL(self.git_logger.info)
-        if git_cache.exists():
-            if not self.ref:
-                ref = run_capturing_out(["git", "symbolic-ref", "refs/remotes/origin/HEAD", "--short"],
-                                        stderr_logger, cwd=git_cache).strip()[7:]  # Remove prefix "origin/"
+
+        self.logger.debug("Fetching %s of %s", ref_name, self.url_str)
+        self._run(["git", "fetch", "--depth", "1", "--filter=blob:none", "--no-tags", "origin",
+                   f"+{ref_name}:{self._worktree_ref}"], stdout_logger, stderr_logger, cwd=self._store_dir).wait()
+
+    def _checkout(self, commit: str):
+        stdout_logger = StripNL(self.git_logger.debug)
+        stderr_logger = StripNL(self.git_logger.info)
+        # HEAD is detached so that the commit checked out can be read without running git
+        self._run(["git", "checkout", "--force", "--detach", commit],
+                  stdout_logger, stderr_logger, cwd=self.local_dir).wait()
+
+    def _ref_is_sha(self) -> bool:
+        return bool(self.ref and _GIT_SHA.fullmatch(self.ref))
+
+    def _remote_ref(self, stderr_logger) -> tuple[str, str]:
+        """Returns the name of the ref to check out and the SHA of its commit, as the remote has them now"""
+        if self._ref_is_sha():
+            return self.ref, self.ref
+
+        patterns = [self.ref, f"{self.ref}^{{}}"] if self.ref else ["HEAD"]
+        out = self._run_capturing_out(["git", "ls-remote", "--symref", "origin"] + patterns,
+                                      stderr_logger, cwd=self._store_dir)
+        refs = {}
+        head_ref_name = None
+        for line in out.splitlines():
+            sha, _, ref_name = line.partition("\t")
+            if sha.startswith("ref: "):
+                if ref_name == "HEAD":
+                    head_ref_name = sha[5:]
             else:
-                ref = self.ref
-            self.logger.info("Using %s%s cached in %s", self.url_str,
-                             f"?ref={ref}" if not self.ref else "",
-                             self.local_dir)
-            run(["git", "config", "remote.origin.fetch", f"+refs/heads/{ref}:refs/remotes/origin/{ref}"],
-                stdout_logger, stderr_logger, cwd=git_cache).wait()
-            run(["git", "fetch", "-pPt", "--force"], stdout_logger, stderr_logger, cwd=git_cache).wait()
-            run(["git", "checkout", ref], stdout_logger, stderr_logger, cwd=git_cache).wait()
-            run(["git", "clean", "-f"], stdout_logger, stderr_logger, cwd=git_cache).wait()
-            run(["git", "reset", "--hard", ref, "--"], stdout_logger, stderr_logger, cwd=git_cache).wait()
-            run(["git", "pull"], stdout_logger, stderr_logger, cwd=git_cache).wait()
+                refs[ref_name] = sha
+
+        if not self.ref:
+            if "HEAD" not in refs:
+                raise RuntimeError(f"Repository {self.url_str} has no HEAD")
+            return head_ref_name or "HEAD", refs["HEAD"]
+
+        # An annotated tag is resolved to the commit it tags
+        for ref_name in (f"refs/heads/{self.ref}", f"refs/tags/{self.ref}^{{}}", f"refs/tags/{self.ref}"):
+            if ref_name in refs:
+                return ref_name.removesuffix("^{}"), refs[ref_name]
+        raise RuntimeError(f"Repository {self.url_str} has no branch or tag {self.ref}")
+
+    def _local_sha(self) -> Optional[str]:
+        """The commit checked out in the worktree, `None` if there is no usable worktree"""
+        try:
+            git_dir = (self.local_dir / ".git").read_text().strip()
+            if not git_dir.startswith("gitdir: "):
+                return None
+            head = (self.local_dir / git_dir[8:] / "HEAD").read_text().strip()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+        return head if _GIT_SHA.fullmatch(head) else None
+
+    def _set_sparse_paths(self, sparse_paths: Optional[list[str]]):
+        stdout_logger = StripNL(self.git_logger.debug)
+        stderr_logger = StripNL(self.git_logger.info)
+        if sparse_paths is None:
+            self.logger.info("Checking out all of %s", self.url_str)
+            self._run(["git", "sparse-checkout", "disable"], stdout_logger, stderr_logger, cwd=self.local_dir).wait()
+            self._sparse_paths_file.unlink(missing_ok=True)
         else:
-            self.logger.info("Initializing %s -> %s", self.url_str, self.local_dir)
-            args = (["git", "clone", "--depth", "1",
-                     "-" + ("v" * log_level_to_verbosity_count(logger.getEffectiveLevel()))] +
-                    (["-b", self.ref] if self.ref else []) +
-                    ["--", self.clone_url_str, str(self.local_dir)])
-            safe_args = [c if c != self.clone_url_str else self.url_str for c in args]
-            run(args, stdout_logger, stderr_logger, safe_args=safe_args).wait()
+            self.logger.info("Checking out %s of %s", ", ".join(sparse_paths), self.url_str)
+            self._run(["git", "sparse-checkout", "set", "--cone", "--"] + sparse_paths,
+                      stdout_logger, stderr_logger, cwd=self.local_dir).wait()
+            self._sparse_paths_file.write_text("".join(f"{p}\n" for p in sparse_paths))
 
     def cleanup(self):
         if False and self.local_dir:
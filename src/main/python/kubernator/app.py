@@ -19,26 +19,38 @@
 import argparse
 import datetime
 import importlib
+import importlib.util
 import logging
+import marshal
+import os
 import pkgutil
 import re
 import sys
+import time
 import urllib.parse
 from collections import deque
-from collections.abc import MutableMapping, Callable
-from contextlib import closing
+from collections.abc import MutableMapping, Callable, Iterable
+from contextlib import closing, contextmanager
+from hashlib import sha256
+from itertools import islice, chain
 from pathlib import Path
 from shutil import rmtree
+from tempfile import mkstemp
 from typing import Optional, Union
 
+import gevent
 import yaml
+from gevent.event import AsyncResult
+from gevent.lock import BoundedSemaphore
 
 import kubernator
 from kubernator.api import (KubernatorPlugin, Globs, scan_dir, PropertyDict, config_as_dict, config_parent,
-                            ContextProperty,
+                            ContextProperty, DirectoryListing,
                             download_remote_file, load_remote_file, Repository, StripNL, jp, get_app_cache_dir,
                             get_cache_dir, install_python_k8s_client)
 from kubernator.proc import run, run_capturing_out, run_pass_through_capturing
+from kubernator.timing import timings, PHASE, HANDLER, SCRIPT
+from kubernator.tracing import tracer
 
 TRACE = 5
 
@@ -90,6 +102,12 @@ def define_arg_parse():
                         help="where to log, defaults to `stderr`")
     parser.add_argument("-v", "--verbose", choices=["CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG", "TRACE"],
                         default="INFO", help="how verbose do you want Kubernator to be")
+    parser.add_argument("--timing-report", type=str, default=None, metavar="PATH",
+                        help="where to write a JSON report of the time spent in the run phases, plugin handlers "
+                             "and K8S API calls")
+    parser.add_argument("--trace-file", type=str, default=None, metavar="PATH",
+                        help="where to write an OTLP-JSON trace of the run phases, directories, plugin handlers, "
+                             "resource applies and K8S API calls")
     parser.add_argument("-f", "--file", type=str, default=None,
                         help="where to generate results, if necessary, defaults to `stdout`")
     parser.add_argument("-o", "--output-format", choices=["json", "json-pretty", "yaml"], default="yaml",
@@ -156,9 +174,177 @@ def init_logging(verbose, output_format, output_file):
     logger.setLevel(logging._nameToLevel[verbose])
 
 
+class _ScriptCompiler:
+    """
+    Compiles `.kubernator.py` scripts, caching the code objects in the same way `__pycache__` does for modules.
+    A cache entry is keyed by the script path and is only used if the interpreter magic, the optimization level
+    and the hash of the script source all match.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = cache_dir
+        self._header_prefix = importlib.util.MAGIC_NUMBER + bytes((sys.flags.optimize,))
+
+    def compile(self, source: bytes, display_path: str):
+        cache_dir = self.cache_dir
+        if cache_dir is None:
+            return compile(source, display_path, "exec")
+
+        cache_file = cache_dir / sha256(display_path.encode("UTF-8")).hexdigest()
+        header = self._header_prefix + sha256(source).digest()
+        try:
+            with open(cache_file, "rb") as f:
+                data = f.read()
+            if data.startswith(header):
+                return marshal.loads(memoryview(data)[len(header):])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            logger.trace("Failed to load cached code of %s from %s", display_path, cache_file, exc_info=e)
+
+        co = compile(source, display_path, "exec")
+
+        try:
+            fd, tmp_name = mkstemp(dir=cache_dir, prefix=cache_file.name, suffix=".tmp")
+            try:
+                with open(fd, "wb") as f:
+                    f.write(header)
+                    marshal.dump(co, f)
+                os.replace(tmp_name, cache_file)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
+        except OSError as e:
+            logger.trace("Failed to cache code of %s in %s", display_path, cache_file, exc_info=e)
+        return co
+
+
+def _get_script_cache_dir() -> Optional[Path]:
+    cache_tag = sys.implementation.cache_tag
+    if not cache_tag:
+        return None
+    try:
+        return get_cache_dir("scripts", cache_tag)
+    except OSError as e:
+        logger.debug("Script code cache is disabled", exc_info=e)
+        return None
+
+
+class _DirectoryContents:
+    """Everything App reads from a directory before handing it over to the plugins"""
+    __slots__ = ("path", "listing", "has_ktor", "ktor_stat", "ktor_code", "read_ns")
+
+    def __init__(self, path: Path, ktor_display_path: str, compiler: _ScriptCompiler):
+        self.path = path
+        self.read_ns = time.time_ns()
+        self.listing = None
+        self.ktor_stat = None
+        self.ktor_code = None
+
+        ktor_py = path / ".kubernator.py"
+        try:
+            self.listing = DirectoryListing(path)
+        except OSError:
+            # Leave reporting the problem to the handlers, in their usual order
+            self.has_ktor = ktor_py.exists()
+            return
+
+        ktor_entry = self.listing.entries.get(".kubernator.py")
+        self.has_ktor = ktor_entry is not None and (ktor_entry.is_file() or ktor_entry.is_dir())
+
+        if self.has_ktor:
+            try:
+                with open(ktor_py, "rb") as f:
+                    self.ktor_stat = os.fstat(f.fileno())
+                    source = f.read()
+                self.ktor_code = compiler.compile(source, ktor_display_path)
+            except (OSError, SyntaxError, ValueError):
+                # The script will be read again and the error will be raised when it's executed
+                self.ktor_stat = None
+                self.ktor_code = None
+
+    def is_current(self):
+        if self.listing is None or not self.listing.is_current():
+            return False
+        if not self.has_ktor:
+            return True
+        if self.ktor_code is None:
+            return False
+        try:
+            st = os.stat(self.path / ".kubernator.py")
+        except OSError:
+            return False
+        ktor_stat = self.ktor_stat
+        return ((st.st_ino, st.st_size, st.st_mtime_ns) ==
+                (ktor_stat.st_ino, ktor_stat.st_size, ktor_stat.st_mtime_ns) and
+                st.st_mtime_ns < self.read_ns - DirectoryListing.RACY_WINDOW_NS)
+
+
+def _prefetch_directory(path: Path, ktor_display_path: str,
+                        compiler: _ScriptCompiler) -> Optional[_DirectoryContents]:
+    try:
+        return _DirectoryContents(path, ktor_display_path, compiler)
+    except Exception:  # noqa
+        # The directory will be read again when it's its turn
+        return None
+
+
+class _DirectoryPrefetcher:
+    """
+    Reads the directories that are about to be traversed on the hub threadpool, ahead of the plugins.
+    Only the most recently scheduled paths are kept, anything else is dropped.
+    """
+
+    def __init__(self, depth: int, compiler: _ScriptCompiler):
+        self.depth = depth
+        self.compiler = compiler
+        self._pending: dict[Path, AsyncResult] = {}
+
+    def schedule(self, paths: Iterable[tuple[Path, str]]):
+        pending = self._pending
+        scheduled = {}
+        threadpool = None
+        for path, ktor_display_path in paths:
+            if len(scheduled) >= self.depth:
+                break
+            if path in scheduled:
+                continue
+            result = pending.get(path)
+            if result is None:
+                if threadpool is None:
+                    threadpool = gevent.get_hub().threadpool
+                logger.trace("Prefetching %s", path)
+                result = threadpool.spawn(_prefetch_directory, path, ktor_display_path, self.compiler)
+            scheduled[path] = result
+        self._pending = scheduled
+
+    def take(self, path: Path, ktor_display_path: str) -> _DirectoryContents:
+        result = self._pending.pop(path, None)
+        if result is not None:
+            contents = result.get()
+            if contents is not None and contents.is_current():
+                return contents
+            logger.trace("Prefetched contents of %s are not current, reading again", path)
+        return _DirectoryContents(path, ktor_display_path, self.compiler)
+
+
+def _relative_paths(path_prefixes) -> list[Path]:
+    """Path prefixes within a repository, where absolute ones are relative to its root"""
+    paths = []
+    for path_prefix in path_prefixes:
+        path = Path(path_prefix)
+        if path.is_absolute():
+            path = Path(*path.parts[1:])
+        paths.append(path)
+    return paths
+
+
 class App(KubernatorPlugin):
     _name = "app"
 
+    PREFETCH_DEPTH = 4
+    REPOSITORY_CONCURRENCY = 8
+
     def __init__(self, args):
         self.args = args
         path = args.path.absolute()
@@ -173,14 +359,21 @@ class App(KubernatorPlugin):
         self._top_dir_context = PropertyDict(_parent=self.context)
 
         self.repos: MutableMapping[Repository, Repository] = dict()
+        # The last git job of each repository, each job runs after the previous one of the same repository
+        self._repository_jobs: dict[Repository, gevent.Greenlet] = {}
+        self._repository_semaphore = BoundedSemaphore(self.REPOSITORY_CONCURRENCY)
         self.path_q: deque[tuple[PropertyDict, Path]] = deque(((self._top_dir_context, path),))
 
         self._new_paths: list[tuple[PropertyDict, Path]] = []
+        self._script_compiler = _ScriptCompiler(_get_script_cache_dir())
+        self._prefetcher = _DirectoryPrefetcher(self.PREFETCH_DEPTH, self._script_compiler)
 
         self._cleanups = []
         self._plugin_types = {}
         self._project_segments: dict[PropertyDict, str] = {}
 
+        timings.reset()
+
     def __enter__(self):
         return self
 
@@ -192,47 +385,48 @@ class App(KubernatorPlugin):
 
         self.register_plugin(self)
 
+        if self.args.trace_file:
+            tracer.start()
+        try:
+            with tracer.span("kubernator", {"kubernator.path": str(self.args.path)}):
+                self._run_phases()
+        finally:
+            if self.args.timing_report:
+                logger.info("Writing timing report to %s", self.args.timing_report)
+                timings.write_report(self.args.timing_report)
+            if self.args.trace_file:
+                tracer.stop()
+                logger.info("Writing trace to %s", self.args.trace_file)
+                tracer.write(self.args.trace_file, {"service.version": kubernator.__version__})
+
+    @contextmanager
+    def _phase(self, name):
+        with timings.measure(PHASE, name), tracer.span(name):
+            yield
+
+    def _run_phases(self):
         try:
             try:
-                while True:
-                    cwd = self.next()
-                    if not cwd:
-                        logger.debug("No paths left to traverse")
-                        break
-
-                    context = self.context
-
-                    logger.debug("Inspecting directory %s", self._display_path(cwd))
-                    self._run_handlers(KubernatorPlugin.handle_before_dir, False, context, None, cwd)
-
-                    if (ktor_py := (cwd / ".kubernator.py")).exists():
-                        self._run_handlers(KubernatorPlugin.handle_before_script, False, context, None, cwd)
-
-                        for h in self.context._plugins:
-                            h.set_context(context)
-
-                        self._exec_ktor(ktor_py)
-
-                        for h in self.context._plugins:
-                            h.set_context(None)
-
-                        self._run_handlers(KubernatorPlugin.handle_after_script, True, context, None, cwd)
-
-                    self._run_handlers(KubernatorPlugin.handle_after_dir, True, context, None, cwd)
+                with self._phase("walk"):
+                    self._walk()
 
                 self.context = self._top_dir_context
                 context = self.context
 
-                self._run_handlers(KubernatorPlugin.handle_apply, True, context, None)
+                with self._phase("apply"):
+                    self._run_handlers(KubernatorPlugin.handle_apply, True, context, None)
 
-                self._run_handlers(KubernatorPlugin.handle_verify, True, context, None)
+                with self._phase("verify"):
+                    self._run_handlers(KubernatorPlugin.handle_verify, True, context, None)
 
                 # Cleanup runs after verify so a verify failure prevents cleanup.
-                self._run_handlers(KubernatorPlugin.handle_cleanup, True, context, None)
+                with self._phase("cleanup"):
+                    self._run_handlers(KubernatorPlugin.handle_cleanup, True, context, None)
             finally:
                 self.context = self._top_dir_context
                 context = self.context
-                self._run_handlers(KubernatorPlugin.handle_shutdown, True, context, None)
+                with self._phase("shutdown"):
+                    self._run_handlers(KubernatorPlugin.handle_shutdown, True, context, None)
         except:  # noqa E722
             raise
         else:
@@ -240,6 +434,49 @@ class App(KubernatorPlugin):
             context = self.context
             self._run_handlers(KubernatorPlugin.handle_summary, True, context, None)
 
+    def _walk(self):
+        while True:
+            cwd = self.next()
+            if not cwd:
+                logger.debug("No paths left to traverse")
+                break
+
+            repository = self._path_to_repository(cwd)
+            if repository:
+                self._wait_for_repository(repository)
+
+            context = self.context
+
+            cwd_display_path = self._display_path(cwd)
+            with tracer.span("directory", {"kubernator.directory": cwd_display_path}):
+                logger.debug("Inspecting directory %s", cwd_display_path)
+                self._run_handlers(KubernatorPlugin.handle_before_dir, False, context, None, cwd)
+
+                ktor_py = cwd / ".kubernator.py"
+                contents = self._prefetcher.take(cwd, self._display_path(ktor_py))
+                if contents.listing is not None:
+                    DirectoryListing.remember(contents.listing)
+                if contents.has_ktor:
+                    self._run_handlers(KubernatorPlugin.handle_before_script, False, context, None, cwd)
+
+                    for h in self.context._plugins:
+                        h.set_context(context)
+
+                    self._exec_ktor(ktor_py, contents.ktor_code)
+
+                    for h in self.context._plugins:
+                        h.set_context(None)
+
+                    self._run_handlers(KubernatorPlugin.handle_after_script, True, context, None, cwd)
+
+                self._snapshot_dir(cwd)
+                self._prefetch_upcoming(cwd)
+                self._run_handlers(KubernatorPlugin.handle_after_dir, True, context, None, cwd)
+
+        # Repositories prefetched but never walked must not fail, nor be written to, while applying
+        for repository in list(self._repository_jobs):
+            self._wait_for_repository(repository)
+
     def discover_plugins(self):
         importlib.invalidate_caches()
         search_path = Path(kubernator.__path__[0], "plugins")
@@ -326,7 +563,11 @@ class App(KubernatorPlugin):
             h_f = getattr(h, f_name, None)
             if h_f:
                 logger.trace("Running %r handler on %r with %r, %r", f_name, h, args, kwargs)
-                h_f(*args, **kwargs)
+                plugin_name = getattr(h, "_name", None) or type(h).__name__
+                handler_name = "%s.%s" % (plugin_name, f_name)
+                with (timings.measure(HANDLER, handler_name),
+                      tracer.span(handler_name, {"kubernator.plugin": plugin_name, "kubernator.handler": f_name})):
+                    h_f(*args, **kwargs)
 
         if __plugin:
             __plugin.set_context(__context)
@@ -345,17 +586,51 @@ class App(KubernatorPlugin):
             for h in plugins:
                 h.set_context(None)
 
-    def _exec_ktor(self, ktor_py: Path):
+    def _exec_ktor(self, ktor_py: Path, co=None):
         ktor_py_display_path = self._display_path(ktor_py)
         logger.debug("Executing %s", ktor_py_display_path)
-        with open(ktor_py, "rb") as f:
-            source = f.read()
-        co = compile(source, ktor_py_display_path, "exec")
+        if co is None:
+            with open(ktor_py, "rb") as f:
+                source = f.read()
+            co = self._script_compiler.compile(source, ktor_py_display_path)
         globs = {"ktor": self.context,
                  "logger": logger.getChild("script")
                  }
-        exec(co, globs)
-        logger.debug("Executed %r", ktor_py_display_path)
+        start = time.monotonic()
+        with (timings.measure(SCRIPT, ktor_py_display_path),
+              tracer.span("script", {"code.filepath": ktor_py_display_path})):
+            exec(co, globs)
+        logger.debug("Executed %r in %.3fs", ktor_py_display_path, time.monotonic() - start)
+
+    def _snapshot_dir(self, cwd: Path):
+        """Publishes the listing of `cwd` all plugins filter in their `handle_after_dir`"""
+        try:
+            listing = DirectoryListing.of(cwd)
+        except OSError:
+            # Leave reporting the problem to the handlers
+            listing = None
+        self.context.app.listing = listing
+
+    def _prefetch_upcoming(self, cwd: Path):
+        """
+        Schedules reading of the directories most likely to be traversed next, in the order they would be:
+        the ones added to the plan by the script, then the subdirectories of `cwd`, then the ones already queued.
+        """
+        app = self.context.app
+        listing = app.listing
+        subdirs = ()
+        if listing is not None:
+            excludes = app.excludes
+            includes = app.includes
+            subdirs = (cwd / name for name, d in listing.entries.items()
+                       if d.is_dir() and not excludes.matches(name) and includes.matches(name))
+
+        paths = chain((p for _, p in self._new_paths),
+                      subdirs,
+                      (p for _, p in reversed(self.path_q)))
+        self._prefetcher.schedule((p, self._display_path(p / ".kubernator.py"))
+                                  for p in islice(paths, self.PREFETCH_DEPTH)
+                                  if self._is_path_ready(p))
 
     def next(self) -> Path:
         path_queue: deque[tuple[PropertyDict, Path]] = self.path_q
@@ -369,6 +644,7 @@ class App(KubernatorPlugin):
         self._cleanups.append(h)
 
     def cleanup(self):
+        gevent.killall(list(self._repository_jobs.values()))
         for h in self._cleanups:
             h.cleanup()
 
@@ -383,6 +659,7 @@ class App(KubernatorPlugin):
                                    args=self.args,
                                    repository_credentials_provider=self._repository_credentials_provider,
                                    walk_remote=self.walk_remote,
+                                   prefetch_repositories=self.prefetch_repositories,
                                    walk_local=self.walk_local,
                                    register_plugin=self.register_plugin,
                                    assert_plugin=self.assert_plugin,
@@ -453,14 +730,17 @@ class App(KubernatorPlugin):
         context = self.context
         app = context.app
 
-        for f in scan_dir(logger, cwd, lambda d: d.is_dir(), app.excludes, app.includes):
+        for f in scan_dir(logger, cwd, lambda d: d.is_dir(), app.excludes, app.includes, app.listing):
             self._new_paths.append((PropertyDict(_parent=context), f))
 
         self.path_q.extend(reversed(self._new_paths))
 
+        del app.listing
         del app.cwd
 
     def handle_summary(self):
+        timings.log_summary(logger)
+
         if "project" in self.context.globals:
             return
         args = self.args
@@ -473,17 +753,68 @@ class App(KubernatorPlugin):
                 "Project scoping flag(s) %s had no effect because the project "
                 "plugin was not registered in this run.", ", ".join(unused))
 
-    def repository(self, repo):
+    def repository(self, repo, path_prefixes=None):
+        """Returns the repository checked out, only the `path_prefixes` of it if specified"""
+        repository = self._repository(repo, path_prefixes)
+        self._wait_for_repository(repository)
+        return repository
+
+    def prefetch_repositories(self, repos: Iterable[Union[str, Path, tuple]]):
+        """
+        Starts checking out the repositories in the background. A repository is either a URL, to check out all of it,
+        or a tuple of a URL and the path prefixes to check out, as passed to `walk_remote`.
+        """
+        for repo in repos:
+            if isinstance(repo, (str, Path)):
+                self._repository(repo, None)
+            else:
+                repo, *path_prefixes = repo
+                paths = _relative_paths(path_prefixes)
+                self._repository(repo, [path.as_posix() for path in paths] if paths else None)
+
+    def _repository(self, repo, path_prefixes) -> Repository:
+        """Returns the repository, whose checkout may still be in progress in the background"""
         repository = Repository(repo, self._repo_cred_augmentation)
         if repository in self.repos:
             repository = self.repos[repository]
+            sync = repository.checkout_paths
+            args = (path_prefixes,)
         else:
             self.repos[repository] = repository
-            repository.init(logger, self.context)
+            repository.prepare(self.context)
             self.register_cleanup(repository)
+            sync = repository.sync
+            args = (logger, path_prefixes)
 
+        self._repository_jobs[repository] = gevent.spawn(self._sync_repository,
+                                                         self._repository_jobs.get(repository), sync, *args)
         return repository
 
+    def _sync_repository(self, previous_job: Optional[gevent.Greenlet], sync, *args):
+        if previous_job is not None:
+            exc = previous_job.get()
+            if exc is not None:
+                return exc
+        with self._repository_semaphore:
+            try:
+                sync(*args)
+            except Exception as e:
+                return e
+
+    def _wait_for_repository(self, repository: Repository):
+        job = self._repository_jobs.get(repository)
+        if job is not None:
+            exc = job.get()
+            if exc is not None:
+                raise exc
+
+    def _is_path_ready(self, path: Path) -> bool:
+        repository = self._path_to_repository(path)
+        if repository is None:
+            return True
+        job = self._repository_jobs.get(repository)
+        return job is None or job.ready()
+
     def walk_local(self, *paths: Union[Path, str, bytes], keep_context=False):
         for path in paths:
             p = Path(path)
@@ -492,13 +823,13 @@ class App(KubernatorPlugin):
             self._add_local(p, keep_context)
 
     def walk_remote(self, repo, *path_prefixes: Union[Path, str, bytes], keep_context=False):
-        repository = self.repository(repo)
+        paths = _relative_paths(path_prefixes)
+
+        # Only the paths walked are checked out, and the walk waits for them when it gets to them
+        repository = self._repository(repo, [path.as_posix() for path in paths] if paths else None)
 
-        if path_prefixes:
-            for path_prefix in path_prefixes:
-                path = Path(path_prefix)
-                if path.is_absolute():
-                    path = Path(*path.parts[1:])
+        if paths:
+            for path in paths:
                 self._add_local(repository.local_dir / path, keep_context)
         else:
             self._add_local(repository.local_dir, keep_context)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import logging
+import re
+from collections.abc import Iterable, Mapping, MutableMapping
+from typing import Optional, Union
+
+import jsonpatch
+
+from kubernator.api import Globs
+
+logger = logging.getLogger("kubernator.k8s")
+
+_REGEX_SPECIAL = frozenset(".^$*+?{}[]|()")
+
+
+def escape_pointer_segment(segment: str) -> str:
+    return segment.replace("~", "~0").replace("/", "~1")
+
+
+def unescape_pointer_segment(segment: str) -> str:
+    return segment.replace("~1", "/").replace("~0", "~")
+
+
+def literal_pointer_prefix(pattern: str) -> Optional[str]:
+    """Returns the JSON pointer prefix an anchored regex matches if it is a plain literal, i.e. ``^/metadata/uid``,
+    or ``None`` if the pattern uses any other regex syntax"""
+    if not pattern.startswith("^"):
+        return None
+    result = []
+    escaped = False
+    for c in pattern[1:]:
+        if escaped:
+            if c.isalnum():
+                return None
+            result.append(c)
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c in _REGEX_SPECIAL:
+            return None
+        else:
+            result.append(c)
+    if escaped:
+        return None
+    prefix = "".join(result)
+    if not prefix.startswith("/"):
+        return None
+    return prefix
+
+
+class PathPrefixTrie:
+    """JSON pointer prefixes arranged by complete path segments.
+
+    A prefix such as ``/metadata/managedFields`` is stored as the ``managedFields`` key prefix of the ``metadata``
+    node, as the prefix also covers e.g. ``/metadata/managedFieldsX``. An empty key prefix covers every key.
+    """
+    __slots__ = ("children", "prefixes")
+
+    def __init__(self, prefixes: Iterable[str] = ()):
+        self.children: dict[str, PathPrefixTrie] = {}
+        self.prefixes: dict[str, object] = {}
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix: str, value=None):
+        """Adds a JSON pointer prefix with an optional associated value"""
+        if not prefix.startswith("/"):
+            raise ValueError("JSON pointer prefix %r must start with '/'" % (prefix,))
+        *parents, key_prefix = prefix[1:].split("/")
+        node = self
+        for segment in parents:
+            segment = unescape_pointer_segment(segment)
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = PathPrefixTrie()
+            node = child
+        node.prefixes.setdefault(key_prefix, value)
+
+    def match_key(self, key: str):
+        """Returns the key prefix of this node covering the key, or ``None``"""
+        escaped_key = escape_pointer_segment(key)
+        for key_prefix in self.prefixes:
+            if escaped_key.startswith(key_prefix):
+                return key_prefix
+        return None
+
+    def __bool__(self):
+        return bool(self.children or self.prefixes)
+
+
+class PatchFieldExcludes:
+    """``patch_field_excludes`` compiled for matching patch operation paths.
+
+    Plain anchored literals are looked up in a ``PathPrefixTrie`` segment by segment, everything else is matched with a
+    single combined regex. The number of operations excluded by each rule is counted.
+    """
+
+    def __init__(self, excludes: Iterable[Union[str, re.Pattern]]):
+        self.rules = rules = tuple(e if isinstance(e, re.Pattern) else re.compile(e) for e in excludes)
+        self.prune = PathPrefixTrie()
+        self.counts = [0] * len(rules)
+
+        regex_rules = []
+        self._regex_rule_index = []
+        for idx, rule in enumerate(rules):
+            prefix = None
+            if isinstance(rule.pattern, str) and not rule.flags & (re.IGNORECASE | re.VERBOSE):
+                prefix = literal_pointer_prefix(rule.pattern)
+            if prefix is not None:
+                self.prune.add(prefix, idx)
+            else:
+                regex_rules.append(rule)
+                self._regex_rule_index.append(idx)
+        self._regex = Globs(regex_rules, immutable=True) if regex_rules else None
+
+    def match_index(self, path: str) -> Optional[int]:
+        """Returns the index of the first rule matching the JSON pointer or ``None``"""
+        found = None
+        if path.startswith("/"):
+            node = self.prune
+            for segment in path[1:].split("/"):
+                for key_prefix, idx in node.prefixes.items():
+                    if segment.startswith(key_prefix) and (found is None or idx < found):
+                        found = idx
+                node = node.children.get(unescape_pointer_segment(segment))
+                if node is None:
+                    break
+
+        if self._regex is not None:
+            regex_idx = self._regex.match_index(path)
+            if regex_idx is not None:
+                idx = self._regex_rule_index[regex_idx]
+                if found is None or idx < found:
+                    found = idx
+        return found
+
+    def filter(self, patch: Iterable[Mapping]) -> list:
+        """Returns the operations not excluded by any rule, ``test`` operations are always kept"""
+        result = []
+        for op in patch:
+            if op["op"] != "test":
+                idx = self.match_index(op["path"])
+                if idx is not None:
+                    self.counts[idx] += 1
+                    logger.trace("Excluding %r from patch by %r", op, self.rules[idx].pattern)
+                    continue
+            result.append(op)
+        return result
+
+    def log_counts(self):
+        for rule, count in zip(self.rules, self.counts):
+            logger.debug("Patch field exclude %r excluded %d operation(s)", rule.pattern, count)
+
+
+def _prune(src, dst, prune: PathPrefixTrie):
+    """Returns ``src`` and ``dst`` without the keys covered by ``prune`` where both are objects, copying only the
+    objects that lose keys or contain ones that do"""
+    if not isinstance(src, MutableMapping) or not isinstance(dst, MutableMapping):
+        return src, dst
+
+    copied = bool(prune.prefixes)
+    if copied:
+        src = {k: v for k, v in src.items() if prune.match_key(str(k)) is None}
+        dst = {k: v for k, v in dst.items() if prune.match_key(str(k)) is None}
+
+    for key, child in prune.children.items():
+        if key in src and key in dst:
+            src_value, dst_value = _prune(src[key], dst[key], child)
+            if src_value is not src[key]:
+                if not copied:
+                    src = dict(src)
+                    dst = dict(dst)
+                    copied = True
+                src[key] = src_value
+                dst[key] = dst_value
+    return src, dst
+
+
+def make_patch(src, dst, *, prune: Optional[PathPrefixTrie] = None) -> jsonpatch.JsonPatch:
+    """Creates a JSON patch turning ``src`` into ``dst``.
+
+    Subtrees covered by ``prune`` are dropped where both documents have objects along their path before the documents
+    are compared, so the patch is the one ``jsonpatch.make_patch`` produces outside the pruned paths. Neither document
+    is modified.
+    """
+    if prune:
+        src, dst = _prune(src, dst, prune)
+    return jsonpatch.make_patch(src, dst)
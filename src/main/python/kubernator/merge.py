@@ -15,53 +15,102 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 #
-from copy import deepcopy
-from kubernator.api import jp
-from jsonpath_ng.jsonpath import Index, Child
+# https://github.com/kubernetes/community/blob/master/contributors/devel/sig-api-machinery/strategic-merge-patch.md
 
+PATCH_DIRECTIVE = "$patch"
+DELETE_FROM_PRIMITIVE_LIST_DIRECTIVE = "$deleteFromPrimitiveList/"
+
+
+class MergePath(tuple):
+    """Location of a merged object as a sequence of dict keys and list indices"""
+    __slots__ = ()
+
+    def resolve(self, obj):
+        for item in self:
+            obj = obj[item]
+        return obj
+
+    def __str__(self):
+        return "$" + "".join(f"[{item}]" if isinstance(item, int) else f".{item}" for item in self)
+
+
+def _is_directive(key):
+    return type(key) is str and (key.startswith(PATCH_DIRECTIVE) or
+                                 key.startswith(DELETE_FROM_PRIMITIVE_LIST_DIRECTIVE))
+
+
+def has_merge_directives(manifest) -> bool:
+    """Returns whether the manifest contains any strategic merge patch directives at any depth"""
+    stack = [manifest]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if _is_directive(k):
+                    return True
+                if isinstance(v, (dict, list)):
+                    stack.append(v)
+        elif isinstance(obj, list):
+            stack.extend(v for v in obj if isinstance(v, (dict, list)))
+    return False
 
-# https://github.com/kubernetes/community/blob/master/contributors/devel/sig-api-machinery/strategic-merge-patch.md
 
 def extract_merge_instructions(manifest, resource):
-    normalized_manifest = deepcopy(manifest)
-    change_instrs = jp('$..`match(/\\\\$patch|\\\\$deleteFromPrimitiveList\\/.*/)`').find(manifest)
+    """Collects merge directives in document order and returns them with a copy of the manifest stripped of them.
 
+    Dicts carrying a directive inside a list are removed from the copy entirely and matched by their remaining keys.
+    """
     instructions = []
-    for change_instr in change_instrs:
-        field = change_instr.path.fields[0]
-        context = change_instr.context.value
-
-        list_of_maps = False
-        search_key = None
-        change_path = change_instr.full_path.left
-        if isinstance(change_path, Child) and isinstance(change_path.right, Index):
-            list_of_maps = True
-            index = change_path.right.indices[0]
-            change_path = change_path.left
-            clean_manifest_result: list = change_path.find(normalized_manifest)[0].value
-            search_key = context.copy()
-            del search_key[field]
-            del clean_manifest_result[index]
-        else:
-            clean_manifest_result = change_path.find(normalized_manifest)[0]
-            clean_manifest_result_context = clean_manifest_result.value
-            del clean_manifest_result_context[field]
-
-        instruction_value = context[field]
-        if field == "$patch":
-            if instruction_value in ("replace", "delete"):
-                instructions.append(("patch", instruction_value,
-                                     change_path, list_of_maps, search_key))
+    normalized_manifest = _extract(manifest, MergePath(), instructions, resource)
+    return instructions, normalized_manifest
+
+
+def _extract(obj, path, instructions, resource):
+    if isinstance(obj, dict):
+        normalized = {}
+        for field, value in obj.items():
+            field_path = MergePath(path + (field,))
+            if _is_directive(field):
+                _add_instruction(obj, field, path, instructions, resource)
+                _extract(value, field_path, instructions, resource)
             else:
-                raise ValueError("Invalid $patch instruction %r in resource %s at %s" %
-                                 (instruction_value,
-                                  resource,
-                                  change_path))
-        elif field.startswith("$deleteFromPrimitiveList/"):
-            instructions.append(("delete-from-list", instruction_value, field[25:],
-                                 change_path))
+                normalized[field] = _extract(value, field_path, instructions, resource)
+        return normalized
 
-    return instructions, normalized_manifest
+    if isinstance(obj, list):
+        normalized = []
+        for idx, value in enumerate(obj):
+            normalized_value = _extract(value, MergePath(path + (idx,)), instructions, resource)
+            if not (isinstance(value, dict) and any(_is_directive(k) for k in value)):
+                normalized.append(normalized_value)
+        return normalized
+
+    return obj
+
+
+def _add_instruction(context, field, path, instructions, resource):
+    list_of_maps = False
+    search_key = None
+    change_path = path
+    if path and type(path[-1]) is int:
+        list_of_maps = True
+        change_path = MergePath(path[:-1])
+        search_key = context.copy()
+        del search_key[field]
+
+    instruction_value = context[field]
+    if field == PATCH_DIRECTIVE:
+        if instruction_value in ("replace", "delete"):
+            instructions.append(("patch", instruction_value,
+                                 change_path, list_of_maps, search_key))
+        else:
+            raise ValueError("Invalid $patch instruction %r in resource %s at %s" %
+                             (instruction_value,
+                              resource,
+                              change_path))
+    elif field.startswith(DELETE_FROM_PRIMITIVE_LIST_DIRECTIVE):
+        instructions.append(("delete-from-list", instruction_value, field[len(DELETE_FROM_PRIMITIVE_LIST_DIRECTIVE):],
+                             change_path))
 
 
 def apply_merge_instructions(merge_instrs, source_manifest, target_manifest, logger, resource):
@@ -72,8 +121,8 @@ def apply_merge_instructions(merge_instrs, source_manifest, target_manifest, log
             op, delete_list, field_name, change_path = merge_instr
 
         if op == "patch":
-            source_obj = change_path.find(source_manifest)[0].value
-            merged_obj = change_path.find(target_manifest)[0].value
+            source_obj = change_path.resolve(source_manifest)
+            merged_obj = change_path.resolve(target_manifest)
             if op_type == "delete":
                 if list_of_maps:
                     logger.trace("Deleting locally in resource %s: %s from %s at %s",
@@ -95,8 +144,7 @@ def apply_merge_instructions(merge_instrs, source_manifest, target_manifest, log
                                  resource,
                                  merged_obj,
                                  change_path)
-                    merged_datum = change_path.find(target_manifest)[0]
-                    merged_datum.context.value[merged_datum.path.fields[0]] = None
+                    MergePath(change_path[:-1]).resolve(target_manifest)[change_path[-1]] = None
             elif op_type == "replace":
                 logger.trace("Replacing locally in resource %s: %s with %s at %s",
                              resource,
@@ -112,7 +160,7 @@ def apply_merge_instructions(merge_instrs, source_manifest, target_manifest, log
                                  op_type, change_path, resource)
 
         elif op == "delete-from-list":
-            merged_list: list = change_path.find(target_manifest)[0].value[field_name]
+            merged_list: list = change_path.resolve(target_manifest)[field_name]
             if not isinstance(merged_list, list):
                 raise ValueError("Not a list in resource %s: %s in %r at %s" %
                                  (resource, merged_list, field_name, change_path))
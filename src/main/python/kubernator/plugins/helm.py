@@ -19,15 +19,24 @@
 import json
 import logging
 import os
+import re
 import sys
 import tarfile
 import tempfile
+import time
+from copy import deepcopy
+from datetime import datetime, timezone
 from hashlib import sha256
 from pathlib import Path
-from shutil import which, copy
-from typing import Sequence
+from shutil import which, copy, copyfile
+from typing import Sequence, Optional
+from urllib.parse import urljoin
 
+import gevent
+import requests
 import yaml
+from gevent.event import AsyncResult
+from gevent.lock import BoundedSemaphore
 from jsonschema import Draft7Validator
 
 from kubernator.api import (KubernatorPlugin, Globs, StripNL,
@@ -38,10 +47,15 @@ from kubernator.api import (KubernatorPlugin, Globs, StripNL,
                             validator_with_defaults,
                             get_golang_os,
                             get_golang_machine,
-                            prepend_os_path, TemplateEngine, get_cache_dir
+                            prepend_os_path, TemplateEngine, get_cache_dir,
+                            download_remote_file,
+                            YAMLDocumentSplitter
                             )
+from kubernator.plugins.helm_chart import HelmChart, UnsupportedTemplateError
 from kubernator.plugins.k8s_api import K8SResource
 from kubernator.proc import DEVNULL
+from kubernator.timing import timings, HELM
+from kubernator.tracing import tracer
 
 logger = logging.getLogger("kubernator.helm")
 proc_logger = logger.getChild("proc")
@@ -93,6 +107,308 @@ Draft7Validator.check_schema(HELM_SCHEMA)
 HELM_VALIDATOR_CLS = validator_with_defaults(Draft7Validator)
 HELM_VALIDATOR = HELM_VALIDATOR_CLS(HELM_SCHEMA, format_checker=Draft7Validator.FORMAT_CHECKER)
 
+# Bump when the rendered output stored in the cache or the way it is keyed changes
+RENDER_CACHE_VERSION = 1
+
+OCI_MANIFEST_MEDIA_TYPE = "application/vnd.oci.image.manifest.v1+json"
+OCI_REQUEST_TIMEOUT = 10
+
+_WWW_AUTHENTICATE_PARAM = re.compile(r'(\w+)="([^"]*)"')
+
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+_SEMVER = re.compile(r"^v?(0|[1-9]\d*)(?:\.(0|[1-9]\d*))?(?:\.(0|[1-9]\d*))?"
+                     r"(?:-([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?(?:\+[0-9A-Za-z.-]+)?$")
+
+
+def _sha256_file(path) -> str:
+    file_hash = sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def semver_key(version: str) -> Optional[tuple]:
+    """Returns a key ordering versions by SemVer 2.0 precedence or `None` if the version is not a SemVer.
+
+    As in Helm a `v` prefix and a missing minor or patch version are accepted, and build metadata is ignored.
+    """
+    m = _SEMVER.match(version)
+    if not m:
+        return None
+    major, minor, patch, prerelease = m.groups()
+    if prerelease is None:
+        # A release has a higher precedence than any of its pre-releases
+        return int(major), int(minor or 0), int(patch or 0), 1, ()
+    # Numeric identifiers have a lower precedence than alphanumeric ones
+    return (int(major), int(minor or 0), int(patch or 0), 0,
+            tuple((0, int(p), "") if p.isdigit() else (1, 0, p) for p in prerelease.split(".")))
+
+
+def _oci_anonymous_token(challenge: Optional[str]) -> Optional[str]:
+    if not challenge or not challenge.lower().startswith("bearer "):
+        return None
+    params = dict(_WWW_AUTHENTICATE_PARAM.findall(challenge[7:]))
+    realm = params.pop("realm", None)
+    if not realm:
+        return None
+    r = requests.get(realm, params=params, timeout=OCI_REQUEST_TIMEOUT)
+    if r.status_code != 200:
+        return None
+    token = r.json()
+    return token.get("token") or token.get("access_token")
+
+
+def oci_chart_digest(chart: str, version: str) -> Optional[str]:
+    """Resolves the manifest digest of an OCI chart version with the registry API, authenticating anonymously if the
+    registry asks for a token. Returns `None` if the digest cannot be resolved, e.g. for a private registry."""
+    host, _, repository = chart[len("oci://"):].partition("/")
+    if not repository:
+        return None
+    # OCI tags cannot contain `+`, Helm replaces it with `_`
+    url = f"https://{host}/v2/{repository}/manifests/{version.replace('+', '_')}"
+    headers = {"Accept": OCI_MANIFEST_MEDIA_TYPE}
+    try:
+        r = requests.head(url, headers=headers, timeout=OCI_REQUEST_TIMEOUT)
+        if r.status_code == 401:
+            token = _oci_anonymous_token(r.headers.get("www-authenticate"))
+            if not token:
+                return None
+            headers["Authorization"] = f"Bearer {token}"
+            r = requests.head(url, headers=headers, timeout=OCI_REQUEST_TIMEOUT)
+        if r.status_code != 200:
+            return None
+        return r.headers.get("docker-content-digest")
+    except (requests.RequestException, ValueError) as e:
+        logger.debug("Unable to resolve the digest of %s version %s", chart, version, exc_info=e)
+        return None
+
+
+class HelmRepositories:
+    """The classic Helm chart repositories, kept in the Helm repository config and cache files of the plugin.
+
+    Repositories are registered without running Helm. The index of a repository is refreshed at most once per run,
+    when a chart of the repository is first rendered, using a conditional request for the `index.yaml`. An index
+    refreshed within `freshness` seconds, possibly by an earlier run, is used as is, unless the chart or the chart
+    version asked for is missing from it, in which case the index is refreshed regardless, once per run.
+    """
+
+    def __init__(self, repositories_file: Path, repository_cache: Path, freshness: float):
+        self.repositories_file = repositories_file
+        self.repository_cache = repository_cache
+        self.freshness = freshness
+
+        self._entries: dict[str, dict] = {}
+        self._refreshed: dict[str, AsyncResult] = {}
+        self._forced: dict[str, AsyncResult] = {}
+        self._checked: set[str] = set()
+        self._indices: dict[str, dict[str, dict[str, Optional[str]]]] = {}
+        self._chart_urls: dict[str, dict[str, dict[str, str]]] = {}
+        self._latest_versions: dict[tuple[str, str], Optional[str]] = {}
+        self._load()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def add(self, url: str) -> str:
+        """Registers the repository URL and returns the name of the repository"""
+        name = sha256(url.encode("UTF-8")).hexdigest()
+        if name not in self._entries:
+            logger.info("Adding repository %s mapping to %s", url, name)
+            self._entries[name] = {"name": name, "url": url}
+            self._save()
+        return name
+
+    def index_file(self, name: str) -> Path:
+        return self.repository_cache / f"{name}-index.yaml"
+
+    def index(self, name: str) -> dict[str, dict[str, Optional[str]]]:
+        """Returns the versions of every chart in the repository index and their digests.
+
+        The index is parsed once per run, and the parsed form is kept next to the index, so that an index that has not
+        changed since an earlier run is loaded without parsing the YAML.
+        """
+        index = self._indices.get(name)
+        if index is None:
+            index, self._chart_urls[name] = self._load_index(name)
+            self._indices[name] = index
+        return index
+
+    def chart_url(self, name: str, chart: str, version: str) -> Optional[str]:
+        """Returns the URL of the chart version's archive as listed in the repository index"""
+        self.index(name)
+        url = self._chart_urls[name].get(chart, {}).get(version)
+        if url:
+            return urljoin(self._entries[name]["url"].rstrip("/") + "/", url)
+        return None
+
+    def latest_version(self, name: str, chart: str) -> Optional[str]:
+        """Returns the latest released (not pre-release) SemVer version of the chart in the repository index"""
+        key = name, chart
+        if key not in self._latest_versions:
+            latest = None
+            latest_key = None
+            for version in self.index(name).get(chart, ()):
+                version_key = semver_key(version)
+                if version_key is not None and version_key[3] and (latest_key is None or version_key > latest_key):
+                    latest = version
+                    latest_key = version_key
+            self._latest_versions[key] = latest
+        return self._latest_versions[key]
+
+    def refresh(self, name: str, chart: Optional[str] = None, version: Optional[str] = None):
+        """Brings the index of the repository up to date unless it has already been during this run.
+
+        If the `chart`, or the SemVer `version` of it, is missing from an index that was considered fresh without
+        checking, the index is refreshed again ignoring its freshness, at most once per run. Version constraints are
+        not resolved against the index and never force a refresh.
+        """
+        self._once(self._refreshed, name, False)
+        if chart is not None and name not in self._checked:
+            versions = self.index(name).get(chart)
+            if versions is None or (version is not None and version not in versions
+                                    and semver_key(version) is not None):
+                logger.debug("Chart %s version %s is missing from the index of repository %s",
+                             chart, version, name)
+                self._once(self._forced, name, True)
+
+    def _once(self, results: dict[str, AsyncResult], name: str, force: bool):
+        result = results.get(name)
+        if result is not None:
+            return result.get()
+
+        result = results[name] = AsyncResult()
+        try:
+            self._refresh(name, force)
+        except Exception as e:
+            result.set_exception(e)
+            raise
+        result.set(None)
+
+    def _refresh(self, name: str, force: bool = False):
+        index_file = self.index_file(name)
+        try:
+            age = time.time() - index_file.stat().st_mtime
+        except FileNotFoundError:
+            age = None
+        if not force and age is not None and age < self.freshness:
+            logger.debug("Index of repository %s was refreshed %.0fs ago", name, age)
+            return
+
+        url = self._entries[name]["url"]
+        index_url = url.rstrip("/") + "/index.yaml"
+        logger.info("Refreshing index of repository %s mapping to %s", url, name)
+        downloaded_file, up_to_date = download_remote_file(logger, index_url, "helm", "index")
+        if up_to_date and age is not None:
+            index_file.touch()
+        else:
+            fd, tmp_file = tempfile.mkstemp(dir=index_file.parent, prefix=index_file.name, suffix=".tmp")
+            os.close(fd)
+            copyfile(downloaded_file, tmp_file)
+            os.replace(tmp_file, index_file)
+        self._checked.add(name)
+        self._indices.pop(name, None)
+        self._chart_urls.pop(name, None)
+        for key in [key for key in self._latest_versions if key[0] == name]:
+            del self._latest_versions[key]
+
+    def _load_index(self, name: str) -> tuple[dict[str, dict[str, Optional[str]]], dict[str, dict[str, str]]]:
+        index_file = self.index_file(name)
+        parsed_file = self.repository_cache / f"{name}-index.json"
+        try:
+            index_digest = _sha256_file(index_file)
+        except OSError as e:
+            logger.debug("Unable to load the index of repository %s", name, exc_info=e)
+            return {}, {}
+
+        try:
+            with open(parsed_file, "rb") as f:
+                parsed = json.load(f)
+            if parsed["sha256"] == index_digest:
+                return parsed["entries"], parsed["urls"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        logger.debug("Parsing the index of repository %s", name)
+        try:
+            with open(index_file, "rb") as f:
+                index = yaml.load(f, Loader=_YAML_LOADER) or {}
+        except (OSError, yaml.YAMLError) as e:
+            logger.debug("Unable to load the index of repository %s", name, exc_info=e)
+            return {}, {}
+
+        entries = {}
+        urls = {}
+        for chart, chart_versions in (index.get("entries") or {}).items():
+            versions = entries[chart] = {}
+            version_urls = urls[chart] = {}
+            for chart_version in chart_versions or ():
+                version = chart_version.get("version")
+                if version is not None:
+                    versions[str(version)] = chart_version.get("digest")
+                    if chart_version.get("urls"):
+                        version_urls[str(version)] = chart_version["urls"][0]
+
+        fd, tmp_file = tempfile.mkstemp(dir=self.repository_cache, prefix=parsed_file.name, suffix=".tmp")
+        with open(fd, "wt") as f:
+            json.dump({"sha256": index_digest, "entries": entries, "urls": urls}, f)
+        os.replace(tmp_file, parsed_file)
+        return entries, urls
+
+    def _load(self):
+        try:
+            with open(self.repositories_file, "rb") as f:
+                config = yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            return
+        for entry in config.get("repositories") or ():
+            logger.debug("Recording pre-existing repository %s mapping %s", entry["name"], entry.get("url"))
+            self._entries[entry["name"]] = entry
+
+    def _save(self):
+        config = {"apiVersion": "",
+                  "generated": datetime.now(timezone.utc).isoformat(),
+                  "repositories": list(self._entries.values())}
+        fd, tmp_file = tempfile.mkstemp(dir=self.repositories_file.parent, prefix=self.repositories_file.name,
+                                        suffix=".tmp")
+        with open(fd, "wt") as f:
+            yaml.safe_dump(config, f)
+        os.replace(tmp_file, self.repositories_file)
+
+
+class _HelmRelease:
+    __slots__ = ("source", "chart", "repository", "repository_hash", "version", "name", "namespace", "values",
+                 "include_crds", "api_versions", "template_args", "stanza", "render_cache", "native_render",
+                 "namespace_transformer", "transformers", "run", "k8s")
+
+    def __init__(self, source, chart, repository, repository_hash, version, name, namespace, values, include_crds,
+                 api_versions, template_args, stanza, render_cache, native_render, namespace_transformer,
+                 transformers, run, k8s):
+        self.source = source
+        self.chart = chart
+        self.repository = repository
+        self.repository_hash = repository_hash
+        self.version = version
+        self.name = name
+        self.namespace = namespace
+        self.values = values
+        self.include_crds = include_crds
+        self.api_versions = api_versions
+        self.template_args = template_args
+        self.stanza = stanza
+        self.render_cache = render_cache
+        self.native_render = native_render
+        self.namespace_transformer = namespace_transformer
+        self.transformers = transformers
+        self.run = run
+        self.k8s = k8s
+
 
 class HelmPlugin(KubernatorPlugin):
     logger = logger
@@ -101,14 +417,19 @@ class HelmPlugin(KubernatorPlugin):
 
     def __init__(self):
         self.context = None
-        self.repositories = set()
+        self.repositories: Optional[HelmRepositories] = None
         self.helm_dir = None
         self.template_engine = TemplateEngine(logger)
 
-        self._repositories_not_populated = True
         self._helm_repositories_file = None
+        self._helm_repository_cache = None
         self._charts_used: dict[str, list[tuple[str, str]]] = {}
 
+        self.helm_version = None
+        self._pending_releases: list[tuple[_HelmRelease, gevent.Greenlet]] = []
+        self._render_semaphore = BoundedSemaphore(os.cpu_count() or 1)
+        self._oci_digests: dict[tuple[str, str], Optional[str]] = {}
+
     def set_context(self, context):
         self.context = context
 
@@ -116,12 +437,14 @@ class HelmPlugin(KubernatorPlugin):
         context = self.context
         stanza = [context.helm.helm_file,
                   f"--kubeconfig={context.kubeconfig.kubeconfig}",
-                  f"--repository-config={self._helm_repositories_file}"]
+                  f"--repository-config={self._helm_repositories_file}",
+                  f"--repository-cache={self._helm_repository_cache}"]
         if logger.getEffectiveLevel() < logging.INFO:
             stanza.append("--debug")
         return stanza
 
-    def register(self, version=None, check_chart_versions=False):
+    def register(self, version=None, check_chart_versions=False, render_cache=True, render_concurrency=None,
+                 index_freshness=600, native_render=False):
         context = self.context
         context.app.register_plugin("kubeconfig")
         context.app.assert_plugin("k8s", self)
@@ -150,8 +473,14 @@ class HelmPlugin(KubernatorPlugin):
 
             logger.debug("Found Helm in %r", helm_file)
 
+        if render_concurrency:
+            self._render_semaphore = BoundedSemaphore(render_concurrency)
+
         helm_dir = get_cache_dir("helm")
         self._helm_repositories_file = Path(helm_dir) / "repositories.yaml"
+        self._helm_repository_cache = get_cache_dir("helm", "repository")
+        self.repositories = HelmRepositories(self._helm_repositories_file, self._helm_repository_cache,
+                                             index_freshness)
         context.globals.helm = dict(default_includes=Globs(["*.helm.yaml", "*.helm.yml"], True),
                                     default_excludes=Globs([".*"], True),
                                     namespace_transformer=True,
@@ -160,12 +489,16 @@ class HelmPlugin(KubernatorPlugin):
                                     add_helm_template=self.add_helm_template,
                                     add_helm=self.add_helm,
                                     check_chart_versions=check_chart_versions,
+                                    render_cache=render_cache,
+                                    native_render=native_render,
+                                    flush=self.flush,
                                     )
 
     def handle_init(self):
         version = self.context.app.run_capturing_out(self.stanza() + ["version", "--template", "{{.Version}}"],
                                                      logger.error)
         logger.info("Found Helm version %s", version)
+        self.helm_version = version
 
     def handle_start(self):
         pass
@@ -186,7 +519,8 @@ class HelmPlugin(KubernatorPlugin):
         context = self.context
         helm = context.helm
 
-        for f in scan_dir(logger, cwd, lambda d: d.is_file(), helm.excludes, helm.includes):
+        for f in scan_dir(logger, cwd, lambda d: d.is_file(), helm.excludes, helm.includes,
+                          context.app.listing):
             p = cwd / f.name
             display_p = context.app.display_path(p)
             logger.debug("Adding Helm template from %s", display_p)
@@ -198,36 +532,41 @@ class HelmPlugin(KubernatorPlugin):
             for helm_template in helm_templates:
                 self._add_helm(helm_template, display_p)
 
+        self.flush()
+
+    def handle_after_script(self, cwd: Path):
+        self.flush()
+
+    def handle_apply(self):
+        self.flush()
+
+    def handle_shutdown(self):
+        gevent.killall([job for _, job in self._pending_releases])
+        self._pending_releases = []
+
     def handle_summary(self):
         context = self.context
         if context.helm.check_chart_versions:
             logger.info("Checking Helm chart versions")
-            all_chart_versions = json.loads(self.context.app.run_capturing_out(self.stanza() +
-                                                                               ["search", "repo",
-                                                                                "-l", "-o", "json",
-                                                                                ],
-                                                                               stderr_logger,
-                                                                               ))
-
-            def chart_version_part_normalizer(x):
-                return int(x) if x.isnumeric() else x
-
-            def chart_version_normalizer(x):
-                return tuple(map(chart_version_part_normalizer, x.split(".")))
-
-            charts_versions = {}
-            for chart_version in all_chart_versions:
-                charts_versions.setdefault(chart_version["name"], []).append(
-                    chart_version_normalizer(chart_version["version"]))
-
-            for chart, version_source in self._charts_used.items():
-                chart_versions = sorted(charts_versions[chart])
+            for chart_name, version_source in self._charts_used.items():
+                repository_hash, chart = chart_name.split("/", 1)
+                for version, _ in version_source:
+                    self.repositories.refresh(repository_hash, chart, version)
+                latest = self.repositories.latest_version(repository_hash, chart)
+                if latest is None:
+                    logger.warning("Chart %s has no released versions in its repository", chart)
+                    continue
+                latest_key = semver_key(latest)
                 for version, source in version_source:
-                    if chart_versions[-1] > chart_version_normalizer(version):
+                    version_key = semver_key(version)
+                    if version_key is None:
+                        logger.debug("Not checking chart %s version %s as it is not a SemVer (defined in %s)",
+                                     chart, version, source)
+                    elif latest_key > version_key:
                         logger.warning("Chart %s is version %s while the latest is %s (defined in %s)",
-                                       chart.split("/")[1],
+                                       chart,
                                        version,
-                                       ".".join(map(str, chart_versions[-1])),
+                                       latest,
                                        source,
                                        )
 
@@ -246,36 +585,6 @@ class HelmPlugin(KubernatorPlugin):
 
         return self._internal_add_helm(source, **{k.replace("-", "_"): v for k, v in template.items()})
 
-    def _add_repository(self, repository: str):
-        def _update_repositories():
-            if self.repositories:
-                self.context.app.run(self.stanza() + ["repo", "update"],
-                                     stdout_logger,
-                                     stderr_logger).wait()
-
-        if self._repositories_not_populated:
-            preexisting_repositories = json.loads(
-                self.context.app.run_capturing_out(self.stanza() + ["repo", "list", "-o", "json"], stderr_logger))
-            for pr in preexisting_repositories:
-                repo_name = pr["name"]
-                repo_url = pr["url"]
-                logger.debug("Recording pre-existing repository %s mapping %s", repo_name, repo_url)
-                self.repositories.add(repo_name)
-            _update_repositories()
-            self._repositories_not_populated = False
-
-        repository_hash = sha256(repository.encode("UTF-8")).hexdigest()
-        logger.debug("Repository %s mapping to %s", repository, repository_hash)
-        if repository_hash not in self.repositories:
-            logger.info("Adding and updating repository %s mapping to %s", repository, repository_hash)
-            self.context.app.run(self.stanza() + ["repo", "add", repository_hash, repository],
-                                 stdout_logger,
-                                 stderr_logger).wait()
-            _update_repositories()
-            self.repositories.add(repository_hash)
-
-        return repository_hash
-
     def _internal_add_helm(self, source, *, chart, name, namespace, include_crds,
                            values=None, values_file=None, repository=None, version=None):
         if values and values_file:
@@ -305,39 +614,239 @@ class HelmPlugin(KubernatorPlugin):
                                                                }}))
             values = values[0] if values else {}
 
-        version_spec = []
+        repository_hash = None
         if repository:
-            repository_hash = self._add_repository(repository)
+            repository_hash = self.repositories.add(repository)
             chart_name = f"{repository_hash}/{chart}"
             if version:
                 self._charts_used.setdefault(chart_name, []).append((version, source))
         else:
             chart_name = chart
 
+        api_versions = self.context.k8s.get_api_versions()
+        template_args = ["template",
+                         name,
+                         chart_name,
+                         "-n", namespace,
+                         "-a", ",".join(api_versions)
+                         ]
         if version:
-            version_spec = ["--version", version]
+            template_args += ["--version", version]
+        if include_crds:
+            template_args.append("--include-crds")
+        template_args += ["-f", "-"]
+
+        # Everything depending on the context is captured now as the release is rendered outside any handler.
+        # The values are copied lest the script changes them for the next release, and the resources are added
+        # with the transformers and manifest patchers in effect now, not with the ones in effect when flushed.
+        release = _HelmRelease(source, chart, repository, repository_hash, version, name, namespace,
+                               deepcopy(values), include_crds, api_versions, template_args, self.stanza(),
+                               self.context.helm.render_cache, self.context.helm.native_render,
+                               self.context.helm.namespace_transformer, self.context.k8s.transformers_snapshot(),
+                               self.context.app.run, self.context.k8s)
+        self._pending_releases.append((release, gevent.spawn(self._render_release, release)))
+
+    def flush(self):
+        """Waits for the releases added so far to render and adds their resources in the order they were added"""
+        pending = self._pending_releases
+        self._pending_releases = []
+        try:
+            while pending:
+                release, job = pending[0]
+                api_versions = release.k8s.get_api_versions()
+                if api_versions != release.api_versions:
+                    # The releases added before, e.g. bringing CRDs, changed the API versions the rest are rendered for
+                    pending = [self._rerender(release, job, api_versions) for release, job in pending]
+                    release, job = pending[0]
+                job.join()
+                manifests, exc = job.value
+                if exc is not None:
+                    logger.error("Failed to render chart %s version %s as release %s from %s",
+                                 release.chart, release.version, release.name, release.source)
+                    raise exc
+                pending.pop(0)
+                self._add_release_resources(release, manifests)
+        finally:
+            gevent.killall([job for _, job in pending])
+
+    def _rerender(self, release: "_HelmRelease", job: gevent.Greenlet, api_versions: list[str]):
+        """Renders the release again in the background unless it was rendered for the same API versions"""
+        if api_versions == release.api_versions:
+            return release, job
+        logger.debug("Rendering release %s from %s again as the API versions changed since it was declared",
+                     release.name, release.source)
+        job.kill()
+        release.api_versions = api_versions
+        template_args = release.template_args
+        template_args[template_args.index("-a") + 1] = ",".join(api_versions)
+        return release, gevent.spawn(self._render_release, release)
+
+    def _render_release(self, release: "_HelmRelease"):
+        """Runs in its own greenlet and returns `(manifests, None)` or `(None, exception)`"""
+        try:
+            with self._render_semaphore:
+                return self._render(release), None
+        except Exception as e:
+            return None, e
+
+    def _render(self, release: "_HelmRelease") -> list[dict]:
+        chart = release.chart
+        version = release.version
+        if release.repository_hash:
+            self.repositories.refresh(release.repository_hash, chart, version)
+        with (timings.measure(HELM, chart),
+              tracer.span("helm template", {"kubernator.helm.chart": chart,
+                                            "kubernator.helm.repository": release.repository,
+                                            "kubernator.helm.version": version,
+                                            "kubernator.helm.release": release.name,
+                                            "kubernator.helm.namespace": release.namespace,
+                                            "kubernator.resource.source": release.source}) as span):
+            render_file = None
+            if release.render_cache:
+                digest = self._chart_digest(chart, release.repository_hash, version)
+                if digest:
+                    render_file = self._render_cache_file(release, digest)
+                else:
+                    logger.debug("Not caching the rendering of %s version %s as its digest is unknown",
+                                 chart, version)
+
+            manifests = None
+            if render_file is not None and render_file.exists():
+                logger.debug("Using cached rendering of chart %s version %s as release %s from %s",
+                             chart, version, release.name, render_file)
+                try:
+                    manifests = self._load_render(render_file)
+                except OSError as e:
+                    logger.debug("Failed to read cached rendering from %s", render_file, exc_info=e)
+            span.set_attribute("kubernator.helm.cached", manifests is not None)
+
+            if manifests is None and release.native_render:
+                output = self._render_natively(release)
+                span.set_attribute("kubernator.helm.native", output is not None)
+                if output is not None:
+                    manifests = self._load_render_lines(output.splitlines(keepends=True))
+                    if render_file is not None:
+                        self._store_render(render_file, output)
+
+            if manifests is None:
+                manifests = self._template(release, render_file)
+
+            return manifests
+
+    def _render_natively(self, release: "_HelmRelease") -> Optional[str]:
+        """Renders a repository chart in-process, returns None if the chart has to be rendered by Helm"""
+        if not release.repository_hash:
+            return None
+        try:
+            archive = self._chart_archive(release.repository_hash, release.chart, release.version)
+            if archive is None:
+                return None
+            chart = HelmChart.load_archive(archive)
+            return chart.render(release.name, release.namespace, release.values, release.api_versions,
+                                release.include_crds)
+        except UnsupportedTemplateError as e:
+            logger.debug("Rendering chart %s version %s with Helm as the chart is not supported natively: %s",
+                         release.chart, release.version, e)
+        except Exception as e:
+            logger.debug("Rendering chart %s version %s with Helm as it failed to render natively",
+                         release.chart, release.version, exc_info=e)
+        return None
+
+    def _chart_archive(self, repository_hash: str, chart: str, version: str) -> Optional[Path]:
+        """Returns the chart archive, kept by its digest so that it is downloaded once"""
+        url = self.repositories.chart_url(repository_hash, chart, version)
+        if not url:
+            return None
+        digest = self.repositories.index(repository_hash).get(chart, {}).get(version)
+        if not digest or not _SHA256_HEX.fullmatch(digest):
+            return None
+
+        archive = get_cache_dir("helm", "chart") / f"{digest}.tgz"
+        if archive.exists():
+            return archive
+
+        downloaded_file, _ = download_remote_file(logger, url, "helm", "download")
+        if _sha256_file(downloaded_file) != digest:
+            raise RuntimeError(f"Chart {chart} version {version} downloaded from {url} does not match its digest")
+        fd, tmp_file = tempfile.mkstemp(dir=archive.parent, prefix=archive.name, suffix=".tmp")
+        os.close(fd)
+        copyfile(downloaded_file, tmp_file)
+        os.replace(tmp_file, archive)
+        return archive
+
+    def _template(self, release: "_HelmRelease", render_file: Optional[Path]) -> list[dict]:
+        """Runs `helm template`, parsing every document as soon as helm writes it out and streaming the output into
+        the render cache, if any, so that the complete output is never held in memory"""
+        manifests = []
+        splitter = YAMLDocumentSplitter(manifests.append)
+        errors = []
+
+        cache_f = None
+        tmp_file = None
+        if render_file is not None:
+            try:
+                fd, tmp_file = tempfile.mkstemp(dir=render_file.parent, prefix=render_file.name, suffix=".tmp")
+                cache_f = open(fd, "wt")
+            except OSError as e:
+                logger.debug("Failed to cache the rendering in %s", render_file, exc_info=e)
+
+        def write_out(line):
+            nonlocal cache_f
+            if cache_f is not None:
+                try:
+                    cache_f.write(line)
+                except OSError as e:
+                    logger.debug("Failed to cache the rendering in %s", render_file, exc_info=e)
+                    cache_f.close()
+                    cache_f = None
+            # Keep draining the output after a parsing failure lest helm blocks on a full pipe
+            if not errors:
+                try:
+                    splitter.feed(line)
+                except Exception as e:
+                    errors.append(e)
 
         stdin = DEVNULL
-
-        if values:
+        if release.values:
             def write_stdin():
-                return json.dumps(values)
+                return json.dumps(release.values)
 
             stdin = write_stdin
 
-        resources = self.context.app.run_capturing_out(self.stanza() +
-                                                       ["template",
-                                                        name,
-                                                        chart_name,
-                                                        "-n", namespace,
-                                                        "-a", ",".join(self.context.k8s.get_api_versions())
-                                                        ] +
-                                                       version_spec +
-                                                       (["--include-crds"] if include_crds else []) +
-                                                       ["-f", "-"],
-                                                       stderr_logger,
-                                                       stdin=stdin,
-                                                       )
+        try:
+            release.run(release.stanza + release.template_args, write_out, stderr_logger, stdin).wait()
+            if errors:
+                raise errors[0]
+            splitter.close()
+            if cache_f is not None:
+                cache_f.close()
+                cache_f = None
+                os.replace(tmp_file, render_file)
+                tmp_file = None
+        finally:
+            if cache_f is not None:
+                cache_f.close()
+            if tmp_file is not None:
+                Path(tmp_file).unlink(missing_ok=True)
+
+        return manifests
+
+    def _load_render(self, render_file: Path) -> list[dict]:
+        with open(render_file, "rt") as f:
+            return self._load_render_lines(f)
+
+    @staticmethod
+    def _load_render_lines(lines) -> list[dict]:
+        manifests = []
+        splitter = YAMLDocumentSplitter(manifests.append)
+        for line in lines:
+            splitter.feed(line)
+        splitter.close()
+        return manifests
+
+    def _add_release_resources(self, release: "_HelmRelease", manifests: list[dict]):
+        namespace = release.namespace
+        k8s = release.k8s
 
         def helm_namespace_transformer(resources: Sequence[K8SResource],
                                        resource: K8SResource):
@@ -345,13 +854,40 @@ class HelmPlugin(KubernatorPlugin):
                 resource.namespace = namespace
                 return resource
 
-        if self.context.helm.namespace_transformer:
-            self.context.k8s.add_transformer(helm_namespace_transformer)
-
-        self.context.k8s.add_resources(yaml.safe_load_all(resources), source)
-
-        if self.context.helm.namespace_transformer:
-            self.context.k8s.remove_transformer(helm_namespace_transformer)
+        transformers, manifest_patchers = release.transformers
+        if release.namespace_transformer:
+            transformers += (helm_namespace_transformer,)
+
+        k8s.add_resources_as_of((transformers, manifest_patchers), manifests, release.source)
+
+    def _chart_digest(self, chart: str, repository_hash: Optional[str], version: Optional[str]) -> Optional[str]:
+        """Resolves the digest of the chart version from the repository index or the OCI registry"""
+        if not version:
+            return None
+        if repository_hash:
+            return self.repositories.index(repository_hash).get(chart, {}).get(version)
+
+        key = chart, version
+        if key not in self._oci_digests:
+            self._oci_digests[key] = oci_chart_digest(chart, version)
+        return self._oci_digests[key]
+
+    def _render_cache_file(self, release: "_HelmRelease", digest: str) -> Path:
+        # The `helm template` arguments cover the release name, namespace, API versions and `--include-crds`
+        key = json.dumps([RENDER_CACHE_VERSION, self.helm_version, release.repository, release.chart, digest,
+                          release.template_args, release.values],
+                         sort_keys=True, separators=(",", ":"), default=str)
+        return get_cache_dir("helm", "render") / f"{sha256(key.encode('UTF-8')).hexdigest()}.yaml"
+
+    def _store_render(self, render_file: Path, output: str):
+        fd, tmp_file = tempfile.mkstemp(dir=render_file.parent, prefix=render_file.name, suffix=".tmp")
+        try:
+            with open(fd, "wt") as f:
+                f.write(output)
+            os.replace(tmp_file, render_file)
+        except OSError as e:
+            logger.debug("Failed to cache the rendering in %s", render_file, exc_info=e)
+            Path(tmp_file).unlink(missing_ok=True)
 
     def __repr__(self):
         return "Helm Plugin"
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import copy
+import json
+import re
+import tarfile
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+import yaml
+from jsonschema import Draft7Validator
+
+from kubernator._go_template import (GoTemplates, UnsupportedTemplateError, SPRIG_FUNCS, NO_VALUE,
+                                     go_numbers, strval)
+
+__all__ = ["HelmChart", "UnsupportedTemplateError"]
+
+# The order in which Helm sorts the manifests of a release by kind, unknown kinds go last
+INSTALL_ORDER = ["PriorityClass", "Namespace", "NetworkPolicy", "ResourceQuota", "LimitRange", "PodSecurityPolicy",
+                 "PodDisruptionBudget", "ServiceAccount", "Secret", "SecretList", "ConfigMap", "StorageClass",
+                 "PersistentVolume", "PersistentVolumeClaim", "CustomResourceDefinition", "ClusterRole",
+                 "ClusterRoleList", "ClusterRoleBinding", "ClusterRoleBindingList", "Role", "RoleList", "RoleBinding",
+                 "RoleBindingList", "Service", "DaemonSet", "Pod", "ReplicationController", "ReplicaSet",
+                 "Deployment", "HorizontalPodAutoscaler", "StatefulSet", "Job", "CronJob", "IngressClass", "Ingress",
+                 "APIService", "MutatingWebhookConfiguration", "ValidatingWebhookConfiguration"]
+_INSTALL_ORDER = {kind: i for i, kind in enumerate(INSTALL_ORDER)}
+
+# Splits a template's output into manifests exactly as Helm does
+_MANIFEST_SEPARATOR = re.compile(r"(?:^|\s*\n)---\s*")
+
+_METADATA_FIELDS = {"name": "Name", "home": "Home", "sources": "Sources", "version": "Version",
+                    "description": "Description", "keywords": "Keywords", "maintainers": "Maintainers",
+                    "icon": "Icon", "apiVersion": "APIVersion", "condition": "Condition", "tags": "Tags",
+                    "appVersion": "AppVersion", "deprecated": "Deprecated", "annotations": "Annotations",
+                    "kubeVersion": "KubeVersion", "dependencies": "Dependencies", "type": "Type"}
+
+# The zero values of the fields of chart metadata that are not strings
+_METADATA_DEFAULTS = {"Sources": None, "Keywords": None, "Maintainers": None, "Annotations": None,
+                      "Dependencies": None, "Tags": "", "Deprecated": False}
+
+_MANIFEST_SUFFIXES = (".yaml", ".yml", ".json")
+
+
+class _Object:
+    """Stands in for the Go structs exposed to the templates, whose fields are the attributes"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class _APIVersions:
+    def __init__(self, api_versions):
+        self._api_versions = frozenset(api_versions)
+
+    def Has(self, api_version):
+        if api_version in self._api_versions:
+            return True
+        # Helm also has the API versions built into it, which are not known here
+        raise UnsupportedTemplateError(f"Capabilities.APIVersions.Has {api_version!r} is not supported for API "
+                                       f"versions not offered by the cluster")
+
+
+class _Capabilities:
+    def __init__(self, api_versions):
+        self.APIVersions = _APIVersions(api_versions)
+
+    @property
+    def KubeVersion(self):
+        # `helm template` reports the Kubernetes version Helm was built against
+        raise UnsupportedTemplateError("Capabilities.KubeVersion is not supported")
+
+    @property
+    def HelmVersion(self):
+        raise UnsupportedTemplateError("Capabilities.HelmVersion is not supported")
+
+
+class _Files:
+    def __init__(self, files: dict[str, bytes]):
+        self._files = files
+
+    def Get(self, name):
+        data = self._files.get(name)
+        return data.decode("UTF-8") if data is not None else ""
+
+    def Lines(self, name):
+        data = self._files.get(name)
+        return data.decode("UTF-8").split("\n") if data else []
+
+
+def _coalesce_values(defaults: dict, values: dict) -> dict:
+    """Merges the values over the defaults of the chart, a null value removes the default"""
+    result = copy.deepcopy(values)
+    for key, default in defaults.items():
+        if key not in result:
+            result[key] = copy.deepcopy(default)
+        elif result[key] is None:
+            del result[key]
+        elif isinstance(result[key], dict) and isinstance(default, dict):
+            result[key] = _coalesce_values(default, result[key])
+    return result
+
+
+class HelmChart:
+    """A chart rendered in-process the way `helm template` renders it.
+
+    Only charts without dependencies, using the subset of Go templates and Sprig functions supported by
+    `kubernator._go_template` and not relying on hooks or on the Kubernetes version Helm was built for, can be rendered.
+    Anything else raises `UnsupportedTemplateError`, and the chart has to be rendered by `helm`.
+    """
+
+    def __init__(self, files: dict[str, bytes]):
+        try:
+            chart_yaml = files["Chart.yaml"]
+        except KeyError:
+            raise UnsupportedTemplateError("chart has no Chart.yaml") from None
+        metadata = yaml.safe_load(chart_yaml) or {}
+        if metadata.get("apiVersion") not in ("v1", "v2"):
+            raise UnsupportedTemplateError(f"chart API version {metadata.get('apiVersion')!r} is not supported")
+        if metadata.get("type") == "library":
+            raise UnsupportedTemplateError("library charts cannot be rendered")
+        if (metadata.get("dependencies") or "requirements.yaml" in files or
+                any(name.startswith("charts/") for name in files)):
+            raise UnsupportedTemplateError("charts with dependencies are not supported")
+
+        self.name = metadata["name"]
+        fields = {}
+        for key, field in _METADATA_FIELDS.items():
+            value = metadata.get(key)
+            if value is None:
+                value = _METADATA_DEFAULTS.get(field, "")
+            elif isinstance(value, (int, float)):
+                value = strval(value)
+            fields[field] = value
+        self.metadata = _Object(**fields)
+        self.values = go_numbers(yaml.safe_load(files.get("values.yaml", b"")) or {})
+        schema = files.get("values.schema.json")
+        self.schema = json.loads(schema) if schema else None
+        self.templates = {name: data.decode("UTF-8") for name, data in sorted(files.items())
+                          if name.startswith("templates/")}
+        self.crds = {name: data.decode("UTF-8") for name, data in sorted(files.items())
+                     if name.startswith("crds/") and name.endswith(_MANIFEST_SUFFIXES)}
+        self.files = {name: data for name, data in files.items()
+                      if not name.startswith("templates/") and
+                      name not in ("Chart.yaml", "values.yaml", "values.schema.json")}
+
+    @classmethod
+    def load_archive(cls, path: Path) -> "HelmChart":
+        """Loads a chart packaged as a `.tgz`, whose files all are in the chart's directory"""
+        files = {}
+        with tarfile.open(path, "r:gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                parts = PurePosixPath(member.name).parts
+                if len(parts) < 2 or ".." in parts:
+                    raise UnsupportedTemplateError(f"unexpected file {member.name} in chart archive {path}")
+                files["/".join(parts[1:])] = tar.extractfile(member).read()
+        return cls(files)
+
+    def render(self, release_name: str, namespace: str, values: Optional[dict], api_versions,
+               include_crds: bool) -> str:
+        """Returns the output `helm template` produces for the release"""
+        values = _coalesce_values(self.values, go_numbers(values or {}))
+        if self.schema is not None:
+            errors = list(Draft7Validator(self.schema).iter_errors(values))
+            if errors:
+                raise UnsupportedTemplateError(f"values do not match the schema of the chart: {errors[0].message}")
+
+        templates = GoTemplates(SPRIG_FUNCS)
+        templates.funcs.update(include=lambda name, data: templates.execute(name, data),
+                               tpl=lambda text, data: self._tpl(templates, text, data),
+                               lookup=lambda *args: {})
+        template_names = [f"{self.name}/{name}" for name in self.templates]
+        for template_name, source in zip(template_names, self.templates.values()):
+            templates.parse(template_name, source)
+
+        top = {"Values": values,
+               "Release": _Object(Name=release_name, Namespace=namespace, IsUpgrade=False, IsInstall=True,
+                                  Revision=1, Service="Helm"),
+               "Chart": self.metadata,
+               "Capabilities": _Capabilities(api_versions),
+               "Files": _Files(self.files),
+               "Subcharts": {}}
+
+        manifests = []
+        base_path = f"{self.name}/templates"
+        for template_name in template_names:
+            if PurePosixPath(template_name).name.startswith("_"):
+                continue
+            data = dict(top, Template=_Object(Name=template_name, BasePath=base_path))
+            output = templates.execute(template_name, data).replace(NO_VALUE, "")
+            if template_name == f"{base_path}/NOTES.txt" or not output.strip():
+                continue
+            for content in _MANIFEST_SEPARATOR.split(output.strip()):
+                if content:
+                    manifests.append((template_name, content.strip()))
+
+        kinds = []
+        for template_name, content in manifests:
+            head = yaml.safe_load(content)
+            if not isinstance(head, dict):
+                head = {}
+            if ((head.get("metadata") or {}).get("annotations") or {}).get("helm.sh/hook"):
+                raise UnsupportedTemplateError(f"hooks are not supported, found in {template_name}")
+            kinds.append(strval(head.get("kind") or ""))
+        order = sorted(range(len(manifests)),
+                       key=lambda i: (_INSTALL_ORDER.get(kinds[i], len(_INSTALL_ORDER)),
+                                      "" if kinds[i] in _INSTALL_ORDER else kinds[i]))
+
+        out = []
+        if include_crds:
+            for name, content in self.crds.items():
+                out.append(f"---\n# Source: {self.name}/{name}\n{content}\n")
+        for i in order:
+            template_name, content = manifests[i]
+            out.append(f"---\n# Source: {template_name}\n{content}\n")
+        return "".join(out)
+
+    @staticmethod
+    def _tpl(templates: GoTemplates, text, data) -> str:
+        # The template is parsed along with the chart's, whose definitions it may use but not replace
+        tpl_templates = templates.copy()
+        tpl_templates.parse("tpl", text)
+        return tpl_templates.execute("tpl", data).replace(NO_VALUE, "")
@@ -203,7 +203,8 @@ class IstioPlugin(KubernatorPlugin, K8SResourcePluginMixin):
         context = self.context
         istio = context.istio
 
-        for f in scan_dir(logger, cwd, lambda d: d.is_file(), istio.excludes, istio.includes):
+        for f in scan_dir(logger, cwd, lambda d: d.is_file(), istio.excludes, istio.includes,
+                          context.app.listing):
             p = cwd / f.name
             display_p = context.app.display_path(p)
             logger.info("Adding Istio Operator from %s", display_p)
@@ -32,11 +32,11 @@ from collections.abc import Mapping
 from datetime import datetime, timedelta, timezone
 from functools import partial, wraps
 from importlib.metadata import version as pkg_version
+from operator import itemgetter
 from pathlib import Path
-from typing import Iterable, Callable, Sequence, Optional
+from typing import Iterable, Callable, Sequence, Optional, Union
 
 import gevent
-import jsonpatch
 import yaml
 
 from kubernator.api import (KubernatorPlugin,
@@ -49,7 +49,10 @@ from kubernator.api import (KubernatorPlugin,
                             TemplateEngine,
                             calling_frame_source,
                             parse_yaml_docs)
+from kubernator.diff import make_patch, PatchFieldExcludes
 from kubernator.merge import extract_merge_instructions, apply_merge_instructions
+from kubernator.timing import timings, K8S
+from kubernator.tracing import tracer
 from kubernator.plugins import k8s_schema
 from kubernator.plugins.k8s_api import (K8SResourcePluginMixin,
                                         K8SResource,
@@ -84,6 +87,16 @@ _STATE_RESOURCES = "resources"
 _STATE_PENDING = "pending"
 
 
+def _apply_outcome(created, patched, deleted) -> str:
+    if deleted:
+        return "recreated"
+    if created:
+        return "created"
+    if patched:
+        return "patched"
+    return "unchanged"
+
+
 def _project_matches(p: str, q: str) -> bool:
     """Prefix match: ``p`` matches ``q`` iff ``p == q`` or ``p`` starts with
     ``q + "."``. Sub-projects of ``q`` are considered matches."""
@@ -211,6 +224,7 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
 
         self._transformers = []
         self._validators = []
+        self._validator_kinds = {}
         self._manifest_patchers = []
         self._resource_filters = []
         self._summary = 0, 0, 0
@@ -265,6 +279,7 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
                                    default_includes=Globs(["*.yaml", "*.yml"], True),
                                    default_excludes=Globs([".*"], True),
                                    add_resources=self.add_resources,
+                                   find_resources=self.find_resources,
                                    load_resources=self.api_load_resources,
                                    load_remote_resources=self.api_load_remote_resources,
                                    load_crds=self.api_load_crds,
@@ -272,6 +287,8 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
                                    load_remote_crds=self.api_load_remote_crds,
                                    add_transformer=self.api_add_transformer,
                                    remove_transformer=self.api_remove_transformer,
+                                   transformers_snapshot=self.api_transformers_snapshot,
+                                   add_resources_as_of=self.api_add_resources_as_of,
                                    add_validator=self.api_add_validator,
                                    remove_validator=self.api_remove_validator,
                                    add_manifest_patcher=self.api_add_manifest_patcher,
@@ -391,7 +408,8 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
         context = self.context
         k8s = context.k8s
 
-        for f in scan_dir(logger, cwd, lambda d: d.is_file(), k8s.excludes, k8s.includes):
+        for f in scan_dir(logger, cwd, lambda d: d.is_file(), k8s.excludes, k8s.includes,
+                          context.app.listing):
             p = cwd / f.name
             display_p = context.app.display_path(p)
             logger.debug("Adding Kubernetes manifest from %s", display_p)
@@ -448,7 +466,7 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
         if dump:
             logger.info("Will dump the changes into a file %s in %s format", file_name or "<stdout>", file_format)
 
-        patch_field_excludes = [re.compile(e) for e in context.globals.k8s.patch_field_excludes]
+        patch_field_excludes = PatchFieldExcludes(context.globals.k8s.patch_field_excludes)
         dump_results = []
         total_created, total_patched, total_deleted = 0, 0, 0
         for resource in k8s.resource_generator():
@@ -486,18 +504,28 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
                 create_func = partial(resource.create, dry_run=dry_run)
                 delete_func = partial(resource.delete, dry_run=dry_run)
 
-            created, patched, deleted, result = self._apply_resource(dry_run,
-                                                                     patch_field_excludes,
-                                                                     resource,
-                                                                     patch_func,
-                                                                     create_func,
-                                                                     delete_func,
-                                                                     status_msg)
+            with tracer.span("apply resource", {"kubernator.resource.key": str(resource),
+                                                "kubernator.resource.source": resource.source,
+                                                "kubernator.dry_run": dry_run}) as span:
+                try:
+                    created, patched, deleted, result = self._apply_resource(dry_run,
+                                                                             patch_field_excludes,
+                                                                             resource,
+                                                                             patch_func,
+                                                                             create_func,
+                                                                             delete_func,
+                                                                             status_msg)
+                except Exception:
+                    span.set_attribute("kubernator.resource.outcome", "failed")
+                    raise
+                span.set_attribute("kubernator.resource.outcome", _apply_outcome(created, patched, deleted))
 
             total_created += created
             total_patched += patched
             total_deleted += deleted
 
+        patch_field_excludes.log_counts()
+
         if ((dump or dry_run) and
                 k8s.field_validation_warn_fatal and self.context.globals.k8s.field_validation_warnings):
             msg = ("There were %d field validation warnings and the warnings are fatal!" %
@@ -571,9 +599,28 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
         if transformer not in self._transformers:
             self._transformers.append(transformer)
 
-    def api_add_validator(self, validator):
+    def api_transformers_snapshot(self) -> tuple[tuple, tuple]:
+        """Returns the transformers and manifest patchers in effect now, for `add_resources_as_of`"""
+        return tuple(self._transformers), tuple(self._manifest_patchers)
+
+    def api_add_resources_as_of(self, snapshot: tuple[tuple, tuple], manifests, source=None):
+        """Adds resources with the transformers and manifest patchers of the snapshot instead of the current ones"""
+        if not source:
+            source = calling_frame_source()
+        transformers, manifest_patchers = self._transformers, self._manifest_patchers
+        self._transformers, self._manifest_patchers = list(snapshot[0]), list(snapshot[1])
+        try:
+            return self.add_resources(manifests, source)
+        finally:
+            self._transformers, self._manifest_patchers = transformers, manifest_patchers
+
+    def api_add_validator(self, validator, kinds: Optional[Iterable[str]] = None):
         if validator not in self._validators:
             self._validators.append(validator)
+        if kinds is None:
+            self._validator_kinds.pop(validator, None)
+        else:
+            self._validator_kinds[validator] = frozenset((kinds,) if isinstance(kinds, str) else kinds)
 
     def api_add_manifest_patcher(self, patcher):
         if patcher not in self._manifest_patchers:
@@ -1132,6 +1179,7 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
     def api_remove_validator(self, validator):
         if validator in self._validators:
             self._validators.remove(validator)
+            self._validator_kinds.pop(validator, None)
 
     def api_validation_error(self, msg, *args):
         frame = sys._getframe().f_back
@@ -1163,22 +1211,53 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
 
         return resource
 
+    @timings.timed(K8S, "validators")
     def _validate_resources(self):
-        errors: list[Exception] = []
-        for resource in self.resources.values():
-            for validator in reversed(self._validators):
-                logger.debug("Applying validator %s to %s from %s",
-                             getattr(validator, "__name__", validator),
-                             resource, resource.source)
-                errors.extend(validator(self.resources, resource, self.api_validation_error))
+        resources = self.resources
+        positions = {id(r): idx for idx, r in enumerate(resources.values())}
+
+        jobs = []
+        for validator in reversed(self._validators):
+            kinds = self._validator_kinds.get(validator)
+            if kinds is None:
+                targets = list(resources.values())
+            else:
+                targets = sorted((r for kind in kinds for r in resources.find(kind=kind)),
+                                 key=lambda r: positions[id(r)])
+            jobs.append(gevent.spawn(self._run_validator, validator, targets, positions))
+        gevent.joinall(jobs)
+
+        # Report errors in the same resource-major, validator-minor order as running the validators serially would
+        found: list[tuple[int, Exception]] = []
+        for job in jobs:
+            validator_errors, exc = job.value
+            if exc is not None:
+                raise exc
+            found.extend(validator_errors)
+        found.sort(key=itemgetter(0))
+        errors = [error for _, error in found]
         if errors:
             for error in errors:
                 logger.error("Validation error: %s", error)
             raise errors[0]
 
+    def _run_validator(self, validator, targets: Sequence[K8SResource], positions: Mapping[int, int]):
+        validator_name = getattr(validator, "__name__", validator)
+        try:
+            errors = []
+            with timings.measure(K8S, f"validator {validator_name}"):
+                for resource in targets:
+                    logger.debug("Applying validator %s to %s from %s", validator_name, resource, resource.source)
+                    position = positions[id(resource)]
+                    for error in validator(self.resources, resource, self.api_validation_error):
+                        errors.append((position, error))
+            return errors, None
+        except Exception as e:
+            return None, e
+
     def _apply_resource(self,
                         dry_run,
-                        patch_field_excludes: Iterable[re.compile],
+                        patch_field_excludes: Union[PatchFieldExcludes, Iterable[re.Pattern]],
                         resource: K8SResource,
                         patch_func: Callable[[Iterable[dict]], Optional[dict]],
                         create_func: Callable[[], Optional[dict]],
@@ -1218,12 +1297,18 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
                     return None
                 raise
 
-        merge_instrs, normalized_manifest = extract_merge_instructions(resource.manifest, resource)
-        if merge_instrs:
-            logger.trace("Normalized manifest (no merge instructions) for resource %s: %s", resource,
-                         normalized_manifest)
-        else:
-            normalized_manifest = resource.manifest
+        if not isinstance(patch_field_excludes, PatchFieldExcludes):
+            patch_field_excludes = PatchFieldExcludes(patch_field_excludes)
+        patch_prune = patch_field_excludes.prune
+
+        merge_instrs = None
+        normalized_manifest = resource.manifest
+        if resource.has_merge_directives:
+            merge_instrs, stripped_manifest = extract_merge_instructions(resource.manifest, resource)
+            if merge_instrs:
+                normalized_manifest = stripped_manifest
+                logger.trace("Normalized manifest (no merge instructions) for resource %s: %s", resource,
+                             normalized_manifest)
 
         logger.debug("Applying resource %s%s", resource, status_msg)
         try:
@@ -1305,7 +1390,8 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
                     if merge_instrs:
                         apply_merge_instructions(merge_instrs, normalized_manifest, merged_resource, logger, resource)
 
-                    patch = jsonpatch.make_patch(remote_resource, merged_resource)
+                    with timings.measure(K8S, "diff"):
+                        patch = make_patch(remote_resource, merged_resource, prune=patch_prune)
 
                     resource_version = merged_resource["metadata"]["resourceVersion"]
                     resource_uid = merged_resource["metadata"]["uid"]
@@ -1331,21 +1417,11 @@ class KubernetesPlugin(KubernatorPlugin, K8SResourcePluginMixin):
                         logger.info("Nothing to patch for resource %s", resource)
                         return 0, 0, 0, None
 
-    def _filter_resource_patch(self, patch: Iterable[Mapping], excludes: Iterable[re.compile]):
-        result = []
-        for op in patch:
-            if op["op"] != "test":
-                path = op["path"]
-                excluded = False
-                for exclude in excludes:
-                    if exclude.match(path):
-                        logger.trace("Excluding %r from patch %s", op, patch)
-                        excluded = True
-                        break
-                if excluded:
-                    continue
-            result.append(op)
-        return result
+    def _filter_resource_patch(self, patch: Iterable[Mapping],
+                               excludes: Union[PatchFieldExcludes, Iterable[re.Pattern]]):
+        if not isinstance(excludes, PatchFieldExcludes):
+            excludes = PatchFieldExcludes(excludes)
+        return excludes.filter(patch)
 
     def _setup_k8s_client(self):
         from kubernetes import client
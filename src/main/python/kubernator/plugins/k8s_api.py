@@ -16,12 +16,16 @@
 #   limitations under the License.
 #
 
+import inspect
 import json
 import re
+import sys
 from collections import namedtuple
 from collections.abc import Callable, Mapping, MutableMapping, Sequence
 from enum import Enum, auto
 from functools import partial, wraps
+from itertools import count
+from operator import itemgetter
 from pathlib import Path
 from typing import Union, Optional
 
@@ -29,6 +33,9 @@ import yaml
 from jsonschema.exceptions import ValidationError
 
 from kubernator.api import load_file, FileType, load_remote_file, calling_frame_source, parse_yaml_docs
+from kubernator.merge import has_merge_directives
+from kubernator.timing import timings, K8S_API, K8S
+from kubernator.tracing import tracer, SPAN_KIND_CLIENT
 
 
 def api_exc_normalize_body(e):
@@ -69,6 +76,26 @@ def _normalize_api_exc(func):
     return wrapper
 
 
+def _instrumented_api_call(func):
+    """Decorator: measure and trace the API call, telling dry-runs apart from the calls making changes."""
+    name = func.__name__
+    dry_run_name = f"{name} (dry-run)"
+    has_dry_run = "dry_run" in inspect.signature(func).parameters
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        dry_run = kwargs.get("dry_run", True) if has_dry_run else None
+        attributes = None
+        if tracer.enabled:
+            attributes = {"kubernator.resource.key": str(self),
+                          "kubernator.resource.source": self.source,
+                          "kubernator.dry_run": dry_run}
+        with (timings.measure(K8S_API, dry_run_name if dry_run else name),
+              tracer.span(f"k8s {name}", attributes, kind=SPAN_KIND_CLIENT)):
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
 K8S_WARNING_HEADER = re.compile(r'(?:,\s*)?(\d{3})\s+(\S+)\s+"(.+?)(?<!\\)"(?:\s+\"(.+?)(?<!\\)\")?\s*')
 UPPER_FOLLOWED_BY_LOWER_RE = re.compile(r"(.)([A-Z][a-z]+)")
 LOWER_OR_NUM_FOLLOWED_BY_UPPER_RE = re.compile(r"([a-z0-9])([A-Z])")
@@ -98,12 +125,16 @@ def to_group_and_version(api_version):
     if not version:
         version = group
         group = ""
-    return group, version
+    return sys.intern(group), sys.intern(version)
+
+
+def _intern_optional(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if type(value) is str else value
 
 
 def to_k8s_resource_def_key(manifest):
     return K8SResourceDefKey(*to_group_and_version(manifest["apiVersion"]),
-                             manifest["kind"])
+                             _intern_optional(manifest["kind"]))
 
 
 class K8SResourceDefKey(namedtuple("K8SResourceDefKey", ["group", "version", "kind"])):
@@ -114,6 +145,11 @@ class K8SResourceDefKey(namedtuple("K8SResourceDefKey", ["group", "version", "ki
 
 
 class K8SResourceDef:
+    # ``__dict__`` allows replacing a method such as ``populate_api`` on a single instance, e.g. with a mock, which a
+    # slot can't as it would shadow the method. It is only materialized when that happens.
+    __slots__ = ("key", "singular", "plural", "namespaced", "custom", "schema",
+                 "_api_get", "_api_create", "_api_patch", "_api_delete", "_api_list", "__dict__")
+
     def __init__(self, key, singular, plural, namespaced, custom, schema):
         self.key = key
         self.singular = singular
@@ -288,6 +324,10 @@ class K8SResourceKey(namedtuple("K8SResourceKey", ["group", "kind", "name", "nam
 
 
 class K8SResource:
+    # ``__dict__`` allows replacing a method such as ``get`` or ``patch`` on a single instance, e.g. with a mock,
+    # which a slot can't as it would shadow the method. It is only materialized when that happens.
+    __slots__ = ("key", "manifest", "rdef", "source", "_merge_directives", "__dict__")
+
     _k8s_client_version = None
     _k8s_field_validation = None
     _k8s_field_validation_patched = None
@@ -300,6 +340,7 @@ class K8SResource:
         self.manifest = manifest
         self.rdef = rdef
         self.source = source
+        self._merge_directives = None
 
     @property
     def group(self) -> str:
@@ -343,6 +384,13 @@ class K8SResource:
     def is_crd(self):
         return self.group == "apiextensions.k8s.io" and self.kind == "CustomResourceDefinition"
 
+    @property
+    def has_merge_directives(self) -> bool:
+        """Whether the manifest contains strategic merge directives, as recorded when the resource was added"""
+        if self._merge_directives is None:
+            self._merge_directives = has_merge_directives(self.manifest)
+        return self._merge_directives
+
     @property
     def project(self) -> Optional[str]:
         metadata = self.manifest.get("metadata") or {}
@@ -353,6 +401,7 @@ class K8SResource:
         return f"{self.api_version}/{self.kind}/{self.name}{'.' + self.namespace if self.namespace else ''}"
 
     @_normalize_api_exc
+    @_instrumented_api_call
     def get(self):
         rdef = self.rdef
         kwargs = {"name": self.name,
@@ -362,6 +411,7 @@ class K8SResource:
         return json.loads(self.rdef.get(**kwargs).data)
 
     @_normalize_api_exc
+    @_instrumented_api_call
     def create(self, dry_run=True):
         rdef = self.rdef
         kwargs = {"body": self.manifest,
@@ -381,6 +431,7 @@ class K8SResource:
         return json.loads(resp.data)
 
     @_normalize_api_exc
+    @_instrumented_api_call
     def patch(self, json_patch, *, patch_type: K8SResourcePatchType, force=False, dry_run=True):
         rdef = self.rdef
         kwargs = {"name": self.name,
@@ -421,6 +472,7 @@ class K8SResource:
             api_client.select_header_content_type = old_func
 
     @_normalize_api_exc
+    @_instrumented_api_call
     def delete(self, *, dry_run=True, propagation_policy=K8SPropagationPolicy.BACKGROUND, wait=True):
         from kubernetes.client import ApiException
         rdef = self.rdef
@@ -465,10 +517,11 @@ class K8SResource:
 
     @staticmethod
     def get_manifest_key(manifest):
+        metadata = manifest["metadata"]
         return K8SResourceKey(to_group_and_version(manifest["apiVersion"])[0],
-                              manifest["kind"],
-                              manifest["metadata"]["name"],
-                              manifest["metadata"].get("namespace"))
+                              _intern_optional(manifest["kind"]),
+                              metadata["name"],
+                              _intern_optional(metadata.get("namespace")))
 
     @staticmethod
     def get_manifest_description(manifest: dict, source=None):
@@ -503,10 +556,257 @@ class K8SResource:
                                          self, self.source, code, msg)
 
 
+class K8SResourceIndex(MutableMapping):
+    """Resource table keyed by ``K8SResourceKey`` with secondary indexes by kind, namespace, label and project.
+
+    The secondary indexes reflect each resource as it was stored. A resource whose name, kind, namespace, labels or
+    project annotation are changed in place after it has been added must be passed to ``reindex()`` to be found by the
+    new values; lookups always re-check the current manifest, so stale entries never produce false matches.
+    """
+
+    def __init__(self, resources: Optional[Mapping[K8SResourceKey, K8SResource]] = None):
+        self._resources: dict[K8SResourceKey, K8SResource] = {}
+        self._index_keys: dict[K8SResourceKey, tuple] = {}
+        self._order: dict[K8SResourceKey, int] = {}
+        self._counter = count()
+        self._by_kind: dict[str, dict[K8SResourceKey, None]] = {}
+        self._by_namespace: dict[Optional[str], dict[K8SResourceKey, None]] = {}
+        self._by_label: dict[tuple[str, Optional[str]], dict[K8SResourceKey, None]] = {}
+        self._by_project: dict[Optional[str], dict[K8SResourceKey, None]] = {}
+        # The key each stored resource is stored under by its id, to find a resource whose key changed in place
+        self._stored_keys: dict[int, K8SResourceKey] = {}
+        # The stored resources in insertion order for positional access, rebuilt after a removal or a replacement
+        self._values: Optional[list[K8SResource]] = []
+        self._view = K8SResourceView(self)
+        if resources:
+            self.update(resources)
+
+    @property
+    def view(self) -> "K8SResourceView":
+        """Live read-only sequence of the stored resources in insertion order."""
+        return self._view
+
+    def __getitem__(self, key):
+        return self._resources[key]
+
+    def __setitem__(self, key, resource):
+        stored = self._resources.get(key)
+        if stored is not None:
+            self._unindex(key)
+            del self._stored_keys[id(stored)]
+            self._values = None
+        else:
+            self._order[key] = next(self._counter)
+            if self._values is not None:
+                self._values.append(resource)
+        self._resources[key] = resource
+        self._stored_keys[id(resource)] = key
+        self._index(key, resource)
+
+    def __delitem__(self, key):
+        resource = self._resources.pop(key)
+        del self._order[key]
+        del self._stored_keys[id(resource)]
+        self._values = None
+        self._unindex(key)
+
+    def __iter__(self):
+        return iter(self._resources)
+
+    def __len__(self):
+        return len(self._resources)
+
+    def __contains__(self, key):
+        return key in self._resources
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._resources!r})"
+
+    def values(self):
+        return self._resources.values()
+
+    def items(self):
+        return self._resources.items()
+
+    def keys(self):
+        return self._resources.keys()
+
+    def clear(self):
+        self._resources.clear()
+        self._index_keys.clear()
+        self._order.clear()
+        self._by_kind.clear()
+        self._by_namespace.clear()
+        self._by_label.clear()
+        self._by_project.clear()
+        self._stored_keys.clear()
+        self._values = []
+
+    def _values_list(self) -> list[K8SResource]:
+        values = self._values
+        if values is None:
+            values = self._values = list(self._resources.values())
+        return values
+
+    def reindex(self, resource: K8SResource):
+        """Refresh the key and the secondary indexes of a stored resource after it was changed in place.
+
+        A resource whose key changed is stored under the new key as if it was added anew.
+        """
+        key = self._stored_keys.get(id(resource))
+        if key is None:
+            raise KeyError(resource.key)
+
+        new_key = resource.get_manifest_key(resource.manifest)
+        if new_key == key:
+            self._unindex(key)
+            self._index(key, resource)
+            return
+
+        if new_key in self._resources:
+            raise ValueError(f"resource {new_key} is already stored")
+        del self[key]
+        resource.key = new_key
+        self[new_key] = resource
+
+    def find(self, *,
+             group: Optional[str] = None,
+             kind: Optional[str] = None,
+             namespace: Optional[str] = None,
+             labels: Optional[Mapping[str, Optional[str]]] = None,
+             project: Optional[str] = None) -> list[K8SResource]:
+        """Return resources matching all the given criteria in insertion order.
+
+        ``labels`` maps label names to the required values; a value of ``None`` only requires the label to be present.
+        Criteria left as ``None`` are not checked. Pass ``namespace=""`` to select cluster-scoped resources.
+        """
+        candidates = []
+        if kind is not None:
+            candidates.append(self._by_kind.get(kind, {}))
+        if namespace is not None:
+            candidates.append(self._by_namespace.get(namespace or None, {}))
+        if project is not None:
+            candidates.append(self._by_project.get(project, {}))
+        if labels:
+            for label in labels.items():
+                candidates.append(self._by_label.get(label, {}))
+
+        if candidates:
+            keys = min(candidates, key=len)
+        else:
+            keys = self._resources
+
+        result = []
+        for key in keys:
+            resource = self._resources[key]
+            if group is not None and resource.group != group:
+                continue
+            if kind is not None and resource.kind != kind:
+                continue
+            if namespace is not None and resource.namespace != (namespace or None):
+                continue
+            if project is not None and resource.project != project:
+                continue
+            if labels and not self._labels_match(resource, labels):
+                continue
+            result.append((self._order[key], resource))
+        if candidates:
+            result.sort(key=itemgetter(0))
+        return [resource for _, resource in result]
+
+    @staticmethod
+    def _labels_of(resource: K8SResource) -> Mapping[str, str]:
+        metadata = resource.manifest.get("metadata") or {}
+        return metadata.get("labels") or {}
+
+    @classmethod
+    def _labels_match(cls, resource: K8SResource, labels: Mapping[str, Optional[str]]) -> bool:
+        resource_labels = cls._labels_of(resource)
+        for name, value in labels.items():
+            if name not in resource_labels:
+                return False
+            if value is not None and resource_labels[name] != value:
+                return False
+        return True
+
+    def _index(self, key, resource: K8SResource):
+        kind = resource.kind
+        namespace = resource.namespace
+        project = resource.project
+        label_keys = []
+        for name, value in self._labels_of(resource).items():
+            label_keys.append((name, None))
+            label_keys.append((name, value))
+
+        self._by_kind.setdefault(kind, {})[key] = None
+        self._by_namespace.setdefault(namespace, {})[key] = None
+        if project is not None:
+            self._by_project.setdefault(project, {})[key] = None
+        for label_key in label_keys:
+            self._by_label.setdefault(label_key, {})[key] = None
+        self._index_keys[key] = (kind, namespace, project, label_keys)
+
+    def _unindex(self, key):
+        kind, namespace, project, label_keys = self._index_keys.pop(key)
+        self._discard(self._by_kind, kind, key)
+        self._discard(self._by_namespace, namespace, key)
+        if project is not None:
+            self._discard(self._by_project, project, key)
+        for label_key in label_keys:
+            self._discard(self._by_label, label_key, key)
+
+    @staticmethod
+    def _discard(index: dict, index_key, key):
+        keys = index.get(index_key)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del index[index_key]
+
+
+class K8SResourceView(Sequence):
+    """Live read-only sequence over a ``K8SResourceIndex`` passed to transformers instead of a copy."""
+
+    __slots__ = ("_index",)
+
+    def __init__(self, index: K8SResourceIndex):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index.values())
+
+    def __reversed__(self):
+        return reversed(self._index.values())
+
+    def __getitem__(self, item):
+        try:
+            return self._index._values_list()[item]
+        except IndexError:
+            raise IndexError("resource index out of range") from None
+
+    def __contains__(self, resource):
+        key = getattr(resource, "key", None)
+        return key is not None and self._index.get(key) is resource
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self)!r})"
+
+    def find(self, **kwargs) -> list[K8SResource]:
+        """Same as ``K8SResourceIndex.find``."""
+        return self._index.find(**kwargs)
+
+
 class K8SResourcePluginMixin:
     def __init__(self):
         self.validator = None
-        self.resources: MutableMapping[K8SResourceKey, K8SResource] = {}
+        self.resources: K8SResourceIndex = K8SResourceIndex()
+        # The validator the API versions were listed for and the list, which only adding a CRD changes otherwise
+        self._api_versions: Optional[tuple[object, tuple[str, ...]]] = None
+        # Canonical instances of the resource sources, held as long as the plugin and the resources it added
+        self._sources: dict[Union[str, Path], Union[str, Path]] = {}
 
     def _require_validator(self):
         if self.validator is None:
@@ -540,12 +840,14 @@ class K8SResourcePluginMixin:
         resource = self._create_resource(manifest, source)
 
         try:
-            trans_resource = self._transform_resource(list(self.resources.values()), resource)
+            with timings.measure(K8S, "transformers"):
+                trans_resource = self._transform_resource(self.resources.view, resource)
         except Exception as e:
             self.logger.error("An error occurred running transformers on %s", resource, exc_info=e)
             raise
 
-        errors = list(self._validate_resource(trans_resource.manifest, source))
+        with timings.measure(K8S, "schema validation"):
+            errors = list(self._validate_resource(trans_resource.manifest, source))
         if errors:
             for error in errors:
                 if source:
@@ -607,8 +909,13 @@ class K8SResourcePluginMixin:
 
         return [self.add_crd(m, source or url) for m in manifests if m]
 
-    def get_api_versions(self):
-        return self.validator.api_versions()
+    def get_api_versions(self) -> list[str]:
+        """Returns a copy of the API versions known to the validator, listed once until the validator or its CRDs
+        change"""
+        validator = self.validator
+        if self._api_versions is None or self._api_versions[0] is not validator:
+            self._api_versions = validator, tuple(validator.api_versions())
+        return list(self._api_versions[1])
 
     def _create_resource(self, manifest: dict, source: Union[str, Path] = None):
         resource_description = K8SResource.get_manifest_description(manifest, source)
@@ -619,7 +926,8 @@ class K8SResourcePluginMixin:
             resource_description = K8SResource.get_manifest_description(manifest, source)
 
         self.logger.debug("Validating K8S manifest for %s", resource_description)
-        errors = list(self._validate_resource(manifest, source))
+        with timings.measure(K8S, "schema validation"):
+            errors = list(self._validate_resource(manifest, source))
         if errors:
             for error in errors:
                 self.logger.error("Error detected in K8S manifest %s from %s: \n%s",
@@ -628,7 +936,17 @@ class K8SResourcePluginMixin:
             raise errors[0]
 
         rdef = self._get_manifest_rdef(manifest)
-        return K8SResource(manifest, rdef, source)
+        return K8SResource(manifest, rdef, self._shared_source(source))
+
+    def _shared_source(self, source: Union[str, Path, None]) -> Union[str, Path, None]:
+        """Return a canonical instance of an equal resource source so that resources coming from the same file or call
+        site share one object instead of each holding its own copy"""
+        if source is None:
+            return None
+        try:
+            return self._sources.setdefault(source, source)
+        except TypeError:
+            return source
 
     def _add_resource(self, resource: K8SResource, source):
         if resource.key in self.resources:
@@ -640,6 +958,7 @@ class K8SResourcePluginMixin:
             return existing_resource
 
         self.logger.info("Adding K8S resource for %s from %s", resource, source)
+        resource._merge_directives = has_merge_directives(resource.manifest)
         self.resources[resource.key] = resource
 
         if resource.is_crd:
@@ -647,6 +966,10 @@ class K8SResourcePluginMixin:
 
         return resource
 
+    def find_resources(self, **kwargs) -> list[K8SResource]:
+        """Query added resources by ``group``, ``kind``, ``namespace``, ``labels`` and ``project``"""
+        return self.resources.find(**kwargs)
+
     def _patch_manifest(self,
                         manifest: dict,
                         resource_description: str):
@@ -670,3 +993,4 @@ class K8SResourcePluginMixin:
         for crd in K8SResourceDef.from_resource(resource):
             self.logger.info("Adding K8S CRD definition %s", crd.key)
             self.resource_definitions[crd.key] = crd
+        self._api_versions = None
@@ -127,7 +127,8 @@ class TemplatePlugin(KubernatorPlugin):
         context = self.context
         templates = context.templates
 
-        for f in scan_dir(logger, cwd, lambda d: d.is_file(), templates.excludes, templates.includes):
+        for f in scan_dir(logger, cwd, lambda d: d.is_file(), templates.excludes, templates.includes,
+                          context.app.listing):
             p = cwd / f.name
             display_p = context.app.display_path(p)
             logger.debug("Adding Kubernator template from %s", display_p)
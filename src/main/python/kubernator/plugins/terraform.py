@@ -119,7 +119,8 @@ class TerraformPlugin(KubernatorPlugin):
         tf = context.terraform
 
         tf_detected = False
-        for f in scan_dir(logger, cwd, lambda d: d.is_file(), tf.excludes, tf.includes):
+        for f in scan_dir(logger, cwd, lambda d: d.is_file(), tf.excludes, tf.includes,
+                          context.app.listing):
             p = cwd / f.name
             display_p = context.app.display_path(p)
             logger.debug("Detected Terraform file in %s", display_p)
@@ -106,7 +106,8 @@ class TerragruntPlugin(KubernatorPlugin):
         tg = context.terragrunt
 
         tg_detected = False
-        for f in scan_dir(logger, cwd, lambda d: d.is_file(), tg.excludes, tg.includes):
+        for f in scan_dir(logger, cwd, lambda d: d.is_file(), tg.excludes, tg.includes,
+                          context.app.listing):
             p = cwd / f.name
             display_p = context.app.display_path(p)
             logger.debug("Detected Terragrunt file in %s", display_p)
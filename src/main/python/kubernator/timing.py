@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import json
+from collections.abc import Callable
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter_ns
+from typing import Optional
+
+PHASE = "phase"
+HANDLER = "handler"
+SCRIPT = "script"
+K8S_API = "k8s-api"
+K8S = "k8s"
+YAML = "yaml"
+HELM = "helm"
+
+_NS_PER_S = 1_000_000_000
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+class Timings:
+    """Accumulates monotonic wall-clock time spent in the parts of a run by category and name.
+
+    Measurements nest, i.e. the time of the `apply` phase includes the time of the `handle_apply` handlers, which in
+    turn includes the time of the K8S API calls they make. Greenlets running concurrently each add their own time, so
+    the total of a category may exceed the wall-clock time of the run.
+    """
+
+    def __init__(self):
+        self._timings: dict[tuple[str, str], _Timing] = {}
+        self._start = perf_counter_ns()
+
+    def reset(self):
+        self._timings.clear()
+        self._start = perf_counter_ns()
+
+    def add(self, category: str, name: str, elapsed_ns: int):
+        key = category, name
+        timing = self._timings.get(key)
+        if timing is None:
+            timing = self._timings[key] = _Timing()
+        timing.count += 1
+        timing.total += elapsed_ns
+        if elapsed_ns > timing.max:
+            timing.max = elapsed_ns
+
+    @contextmanager
+    def measure(self, category: str, name: str):
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(category, name, perf_counter_ns() - start)
+
+    def timed(self, category: str, name: Optional[str] = None):
+        """Decorator measuring every call of the function under its own name unless `name` is specified"""
+
+        def decorator(func: Callable):
+            timing_name = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.add(category, timing_name, perf_counter_ns() - start)
+
+            return wrapper
+
+        return decorator
+
+    def entries(self, category: Optional[str] = None) -> list[dict]:
+        """Returns the timings, optionally of a single category, ordered by category and the largest total first"""
+        result = [{"category": c,
+                   "name": n,
+                   "count": t.count,
+                   "total": t.total / _NS_PER_S,
+                   "max": t.max / _NS_PER_S}
+                  for (c, n), t in self._timings.items()
+                  if category is None or c == category]
+        result.sort(key=lambda e: (e["category"], -e["total"], e["name"]))
+        return result
+
+    def report(self) -> dict:
+        return {"elapsed": (perf_counter_ns() - self._start) / _NS_PER_S,
+                "timings": self.entries()}
+
+    def write_report(self, path):
+        with open(path, "wt") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def log_summary(self, logger, top=10):
+        """Logs the time of every phase and the `top` most expensive handlers and operations of other categories"""
+        elapsed = (perf_counter_ns() - self._start) / _NS_PER_S
+        # Phases are listed in the order they ran
+        phases = ", ".join("%s %.3fs" % (n, t.total / _NS_PER_S) for (c, n), t in self._timings.items() if c == PHASE)
+        logger.info("Run took %.3fs: %s", elapsed, phases or "no phases completed")
+
+        others = sorted((e for e in self.entries() if e["category"] != PHASE), key=lambda e: -e["total"])
+        for e in others[:top]:
+            logger.info("  %s %s: %.3fs in %d call(s), longest %.3fs",
+                        e["category"], e["name"], e["total"], e["count"], e["max"])
+
+
+timings = Timings()
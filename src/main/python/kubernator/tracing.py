@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter_ns, time_ns
+from typing import Optional
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    __slots__ = ("name", "kind", "span_id", "parent", "start", "end", "attributes", "status", "status_message",
+                 "_start_ns")
+
+    def __init__(self, name: str, kind: int, parent: Optional["Span"], attributes: Optional[dict]):
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = STATUS_UNSET
+        self.status_message = None
+        # Wall-clock start as required by OTLP, the duration is measured with the monotonic clock
+        self.start = time_ns()
+        self.end = None
+        self._start_ns = perf_counter_ns()
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_status(self, status: int, message: Optional[str] = None):
+        self.status = status
+        self.status_message = message
+
+    def _finish(self):
+        self.end = self.start + perf_counter_ns() - self._start_ns
+
+
+class _NoSpan:
+    """Stands in for a span while tracing is disabled"""
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_status(self, status: int, message: Optional[str] = None):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+class Tracer:
+    """Records the spans of a run and exports them as an OTLP-JSON trace file.
+
+    Tracing is disabled until `start` is called, and `span` is then a no-op. The parent of a span is the innermost span
+    open in the same greenlet, spans opened in a greenlet with no open spans become children of the first span of the
+    trace.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_id = None
+        self._root: Optional[Span] = None
+        self._spans: list[Span] = []
+        self._current: ContextVar[Optional[Span]] = ContextVar("kubernator_span", default=None)
+
+    def start(self):
+        self.enabled = True
+        self.trace_id = os.urandom(16).hex()
+        self._root = None
+        self._spans = []
+
+    def stop(self):
+        self.enabled = False
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[dict] = None, kind: int = SPAN_KIND_INTERNAL):
+        if not self.enabled:
+            yield _NO_SPAN
+            return
+
+        span = Span(name, kind, self._current.get() or self._root, attributes)
+        if self._root is None:
+            self._root = span
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if span.status == STATUS_UNSET:
+                span.set_status(STATUS_ERROR, str(e) or type(e).__name__)
+            raise
+        finally:
+            self._current.reset(token)
+            span._finish()
+            self._spans.append(span)
+
+    def export(self, resource_attributes: Optional[dict] = None) -> dict:
+        spans = []
+        for span in self._spans:
+            otlp_span = {"traceId": self.trace_id,
+                         "spanId": span.span_id,
+                         "name": span.name,
+                         "kind": span.kind,
+                         "startTimeUnixNano": str(span.start),
+                         "endTimeUnixNano": str(span.end),
+                         "attributes": _otlp_attributes(span.attributes),
+                         "status": {"code": span.status}}
+            if span.parent is not None:
+                otlp_span["parentSpanId"] = span.parent.span_id
+            if span.status_message:
+                otlp_span["status"]["message"] = span.status_message
+            spans.append(otlp_span)
+
+        attributes = {"service.name": "kubernator"}
+        if resource_attributes:
+            attributes.update(resource_attributes)
+        return {"resourceSpans": [{"resource": {"attributes": _otlp_attributes(attributes)},
+                                   "scopeSpans": [{"scope": {"name": "kubernator"},
+                                                   "spans": spans}]}]}
+
+    def write(self, path, resource_attributes: Optional[dict] = None):
+        with open(path, "wt") as f:
+            json.dump(self.export(resource_attributes), f)
+
+
+tracer = Tracer()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import os
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from kubernator.api import DirectoryListing, KubernatorPlugin
+from kubernator.app import App, _DirectoryPrefetcher, _ScriptCompiler
+
+
+def _write(path: Path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(content))
+
+
+def _age(root: Path):
+    """Moves all modification times out of the racy window so that the prefetched state is reusable"""
+    past = time.time_ns() - 10 * DirectoryListing.RACY_WINDOW_NS
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            os.utime(Path(dirpath, name), ns=(past, past))
+    os.utime(root, ns=(past, past))
+
+
+class DirectoryPrefetcherTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_prefetched_contents_reused(self):
+        _write(self.root / ".kubernator.py", "x = 1\n")
+        (self.root / "sub").mkdir()
+        _age(self.root)
+
+        prefetcher = _DirectoryPrefetcher(2, _ScriptCompiler())
+        prefetcher.schedule([(self.root, "ktor")])
+        prefetched = prefetcher._pending[self.root].get()
+
+        contents = prefetcher.take(self.root, "ktor")
+        self.assertIs(contents, prefetched)
+        self.assertTrue(contents.has_ktor)
+        self.assertIsNotNone(contents.ktor_code)
+        self.assertEqual(list(contents.listing.entries), [".kubernator.py", "sub"])
+
+    def test_modified_script_read_again(self):
+        _write(self.root / ".kubernator.py", "x = 1\n")
+        _age(self.root)
+
+        prefetcher = _DirectoryPrefetcher(2, _ScriptCompiler())
+        prefetcher.schedule([(self.root, "ktor")])
+        prefetched = prefetcher._pending[self.root].get()
+
+        _write(self.root / ".kubernator.py", "x = 22\n")
+        contents = prefetcher.take(self.root, "ktor")
+        self.assertIsNot(contents, prefetched)
+        globs = {}
+        exec(contents.ktor_code, globs)
+        self.assertEqual(globs["x"], 22)
+
+    def test_added_entry_read_again(self):
+        _age(self.root)
+
+        prefetcher = _DirectoryPrefetcher(2, _ScriptCompiler())
+        prefetcher.schedule([(self.root, "ktor")])
+        prefetcher._pending[self.root].get()
+
+        _write(self.root / ".kubernator.py", "x = 1\n")
+        contents = prefetcher.take(self.root, "ktor")
+        self.assertTrue(contents.has_ktor)
+
+    def test_schedule_drops_unlisted_paths(self):
+        a = self.root / "a"
+        b = self.root / "b"
+        a.mkdir()
+        b.mkdir()
+
+        prefetcher = _DirectoryPrefetcher(1, _ScriptCompiler())
+        prefetcher.schedule([(a, "a"), (b, "b")])
+        self.assertEqual(list(prefetcher._pending), [a])
+        prefetcher.schedule([(b, "b")])
+        self.assertEqual(list(prefetcher._pending), [b])
+
+
+class ScriptCompilerTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self._tmp.name)
+        self.compiler = _ScriptCompiler(self.cache_dir)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _exec(self, co):
+        globs = {}
+        exec(co, globs)
+        return globs["x"]
+
+    def test_cached_code_reused(self):
+        self.assertEqual(self._exec(self.compiler.compile(b"x = 1", "/a/.kubernator.py")), 1)
+        self.assertEqual(len(list(self.cache_dir.iterdir())), 1)
+
+        with patch("kubernator.app.compile", side_effect=AssertionError("compiled"), create=True):
+            co = self.compiler.compile(b"x = 1", "/a/.kubernator.py")
+        self.assertEqual(self._exec(co), 1)
+        self.assertEqual(co.co_filename, "/a/.kubernator.py")
+
+    def test_changed_source_recompiled(self):
+        self.compiler.compile(b"x = 1", "/a/.kubernator.py")
+        self.assertEqual(self._exec(self.compiler.compile(b"x = 2", "/a/.kubernator.py")), 2)
+        self.assertEqual(self._exec(self.compiler.compile(b"x = 3", "/b/.kubernator.py")), 3)
+        self.assertEqual(len(list(self.cache_dir.iterdir())), 2)
+
+    def test_corrupt_cache_recompiled(self):
+        self.compiler.compile(b"x = 1", "/a/.kubernator.py")
+        cache_file, = self.cache_dir.iterdir()
+        data = cache_file.read_bytes()
+        cache_file.write_bytes(data[:-5])
+
+        self.assertEqual(self._exec(self.compiler.compile(b"x = 1", "/a/.kubernator.py")), 1)
+        self.assertEqual(cache_file.read_bytes(), data)
+
+    def test_syntax_error_not_cached(self):
+        with self.assertRaises(SyntaxError):
+            self.compiler.compile(b"x = ", "/a/.kubernator.py")
+        self.assertEqual(list(self.cache_dir.iterdir()), [])
+
+
+class ListingRecorderPlugin(KubernatorPlugin):
+    _name = "listing_recorder"
+
+    def __init__(self):
+        self.context = None
+        self.listings = []
+
+    def set_context(self, context):
+        self.context = context
+
+    def handle_after_dir(self, cwd: Path):
+        listing = self.context.app.listing
+        self.listings.append((cwd.name, listing.path, list(listing.entries)))
+
+
+class AppTraversalTests(unittest.TestCase):
+    def setUp(self):
+        # Compiled scripts are cached in a temporary directory instead of the user cache
+        self._cache = tempfile.TemporaryDirectory()
+        self.addCleanup(self._cache.cleanup)
+        self.cache_dir = Path(self._cache.name)
+        patcher = patch("kubernator.app.get_cache_dir", return_value=self.cache_dir)
+        self.get_cache_dir = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_traversal_order_unchanged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _write(root / ".kubernator.py", """
+            ktor.globals.visited = ["root"]
+            ktor.app.walk_local("../" + ktor.app.cwd.name + "_extra")
+            """)
+            _write(root.parent / (root.name + "_extra") / ".kubernator.py", """
+            ktor.globals.visited.append("extra")
+            """)
+            for name in ("b", "a", "c"):
+                _write(root / name / ".kubernator.py", f"""
+                ktor.globals.visited.append({name!r})
+                """)
+            _write(root / "a" / "a1" / ".kubernator.py", """
+            ktor.globals.visited.append("a1")
+            """)
+            (root / ".hidden").mkdir()
+            _write(root / ".hidden" / ".kubernator.py", """
+            ktor.globals.visited.append("hidden")
+            """)
+            _age(root)
+
+            try:
+                args = SimpleNamespace(path=root, include_project=[], exclude_project=[], timing_report=None,
+                                       trace_file=None)
+                with App(args) as app:
+                    app.run()
+                    visited = list(app._top_level_context.globals.visited)
+            finally:
+                extra = root.parent / (root.name + "_extra")
+                (extra / ".kubernator.py").unlink()
+                extra.rmdir()
+
+        self.assertEqual(visited, ["root", "extra", "a", "a1", "b", "c"])
+        self.get_cache_dir.assert_called_once_with("scripts", sys.implementation.cache_tag)
+        self.assertEqual(len(list(self.cache_dir.iterdir())), 6)
+
+    def test_listing_published_to_plugins(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _write(root / ".kubernator.py", """
+            ktor.app.register_plugin(ktor.globals.recorder)
+            (ktor.app.cwd / "generated").mkdir()
+            """)
+            (root / "sub").mkdir()
+            _age(root)
+
+            recorder = ListingRecorderPlugin()
+            args = SimpleNamespace(path=root, include_project=[], exclude_project=[], timing_report=None,
+                                   trace_file=None)
+            with App(args) as app:
+                app._top_level_context.globals.recorder = recorder
+                app.run()
+                self.assertNotIn("listing", app._top_level_context.app)
+
+        self.assertEqual(recorder.listings, [(root.name, root, [".kubernator.py", "generated", "sub"]),
+                                             ("generated", root / "generated", []),
+                                             ("sub", root / "sub", [])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,9 +21,13 @@ from gevent.monkey import patch_all, is_anything_patched
 if not is_anything_patched():
     patch_all()
 
+import logging
+import timeit
 import unittest
 
-from kubernator.api import ContextProperty, PropertyDict, config_parent
+from kubernator.api import ContextProperty, PropertyDict, _PropertyList, config_parent
+
+logger = logging.getLogger("kubernator.test")
 
 
 def _make_segment_descriptor():
@@ -206,5 +210,85 @@ class ContextPropertyTestcase(unittest.TestCase):
         self.assertEqual(sibling.app.seg, "x.z")
 
 
+class PropertyListViewTestcase(unittest.TestCase):
+    def test_view_reused_until_list_changes(self):
+        root = PropertyDict()
+        root.value = [1]
+        child = PropertyDict(_parent=root)
+
+        view = child.value
+        self.assertIs(child.value, view)
+        self.assertIsNot(root.value, view)
+
+        view.append(2)
+        self.assertIs(child.value, view)
+        self.assertEqual(list(child.value), [1, 2])
+        self.assertEqual(list(root.value), [1])
+
+        root.value = [3]
+        self.assertIs(child.value, view)
+        del child.value
+        self.assertIsNot(child.value, view)
+        self.assertEqual(list(child.value), [3])
+
+    def test_shared_view_writes_are_not_lost(self):
+        root = PropertyDict()
+        root.value = []
+        child = PropertyDict(_parent=root)
+
+        first = child.value
+        second = child.value
+        first.append(1)
+        second.append(2)
+        self.assertEqual(list(child.value), [1, 2])
+        self.assertEqual(list(root.value), [])
+
+    def test_non_mutating_operations_do_not_copy(self):
+        root = PropertyDict()
+        root.value = [1]
+        child = PropertyDict(_parent=root)
+
+        self.assertEqual(child.value.copy(), [1])
+        self.assertEqual(child.value + [2], [1, 2])
+        self.assertNotIn("value", child._PropertyDict__dict)
+
+        v = child.value
+        v *= 2
+        self.assertEqual(list(child.value), [1, 1])
+        self.assertEqual(list(root.value), [1])
+
+    def test_list_read_benchmark(self):
+        """Compares repeated list reads through a deep chain against allocating a view per read"""
+        root = PropertyDict()
+        root.value = list(range(16))
+        leaf = root
+        for _ in range(16):
+            leaf = PropertyDict(_parent=leaf)
+
+        def allocating_reads():
+            for _ in range(reads):
+                cur = leaf
+                while "value" not in cur._PropertyDict__dict:
+                    cur = config_parent(cur)
+                v = _PropertyList(cur._PropertyDict__dict["value"], cur, "value")
+                v._PropertyList__write_parent = leaf
+                for _ in v:
+                    pass
+
+        def cached_reads():
+            for _ in range(reads):
+                for _ in leaf.value:
+                    pass
+
+        reads = 20000
+        allocating = min(timeit.repeat(allocating_reads, number=1, repeat=3))
+        cached = min(timeit.repeat(cached_reads, number=1, repeat=3))
+        logger.info("%d list reads through %d layers: %.1f ms allocating views, %.1f ms with cached views",
+                    reads, 16, allocating * 1000, cached * 1000)
+
+        self.assertIs(leaf.value, leaf.value)
+        self.assertEqual(list(leaf.value), list(range(16)))
+
+
 if __name__ == "__main__":
     unittest.main()
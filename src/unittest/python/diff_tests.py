@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import copy
+import logging
+import re
+import unittest
+
+import jsonpatch
+
+from kubernator.diff import make_patch, literal_pointer_prefix, PathPrefixTrie, PatchFieldExcludes
+
+TRACE = 5
+
+
+def trace(self, msg, *args, **kwargs):
+    """
+    Log 'msg % args' with severity 'TRACE'.
+
+    To pass exception information, use the keyword argument exc_info with
+    a true value, e.g.
+
+    logger.trace("Houston, we have a %s", "interesting problem", exc_info=1)
+    """
+    if self.isEnabledFor(TRACE):
+        self._log(TRACE, msg, args, **kwargs)
+
+
+logging.addLevelName(5, "TRACE")
+logging.Logger.trace = trace
+
+
+def _pod(*containers):
+    return {"apiVersion": "v1", "kind": "Pod",
+            "metadata": {"name": "p", "namespace": "default", "resourceVersion": "1",
+                         "managedFields": [{"manager": "kubectl", "fieldsV1": {"f:spec": {}}}]},
+            "spec": {"containers": [dict(c) for c in containers]},
+            "status": {"phase": "Running"}}
+
+
+class LiteralPointerPrefixTest(unittest.TestCase):
+    def test_literal_patterns(self):
+        self.assertEqual(literal_pointer_prefix("^/metadata/managedFields"), "/metadata/managedFields")
+        self.assertEqual(literal_pointer_prefix(r"^/metadata/annotations/kubectl\.kubernetes\.io~1last"),
+                         "/metadata/annotations/kubectl.kubernetes.io~1last")
+
+    def test_non_literal_patterns(self):
+        self.assertIsNone(literal_pointer_prefix("/metadata/uid"))
+        self.assertIsNone(literal_pointer_prefix("^/metadata/.*Fields"))
+        self.assertIsNone(literal_pointer_prefix(r"^/spec/\d+"))
+        self.assertIsNone(literal_pointer_prefix("^/status$"))
+        self.assertIsNone(literal_pointer_prefix("^metadata"))
+
+
+class PathPrefixTrieTest(unittest.TestCase):
+    def test_match_key(self):
+        trie = PathPrefixTrie(["/metadata/managedFields", "/status", "/metadata/annotations/a~1b"])
+        self.assertEqual(trie.match_key("status"), "status")
+        self.assertIsNone(trie.match_key("spec"))
+        metadata = trie.children["metadata"]
+        self.assertEqual(metadata.match_key("managedFieldsX"), "managedFields")
+        self.assertEqual(metadata.children["annotations"].match_key("a/b/c"), "a~1b")
+
+    def test_invalid_prefix(self):
+        with self.assertRaises(ValueError):
+            PathPrefixTrie(["metadata"])
+
+
+class PatchFieldExcludesTest(unittest.TestCase):
+    RULES = ("^/metadata/managedFields",
+             "^/metadata/generation",
+             r"^/metadata/annotations/.*\.example\.com",
+             "^/status",
+             "/uid$",
+             )
+
+    def _reference(self, path):
+        for idx, rule in enumerate(self.RULES):
+            if re.match(rule, path):
+                return idx
+        return None
+
+    def test_matches_like_regexes(self):
+        excludes = PatchFieldExcludes(self.RULES)
+        self.assertEqual(len(excludes._regex_rule_index), 2)
+        for path in ("/metadata/managedFields", "/metadata/managedFields/0/manager", "/metadata/managedFieldsX",
+                     "/metadata/generation", "/metadata/generationally", "/metadata/name",
+                     "/metadata/annotations/a.example.com", "/metadata/annotations/a~1b", "/status",
+                     "/status/uid", "/spec/uid", "/statuses", "/spec", "/", "", "/metadata"):
+            self.assertEqual(excludes.match_index(path), self._reference(path), path)
+
+    def test_filter_counts_first_matching_rule(self):
+        excludes = PatchFieldExcludes([re.compile(rule) for rule in self.RULES])
+        patch = [{"op": "replace", "path": "/metadata/managedFields/0", "value": {}},
+                 {"op": "remove", "path": "/metadata/managedFields/1"},
+                 {"op": "replace", "path": "/status/uid", "value": "x"},
+                 {"op": "replace", "path": "/spec/replicas", "value": 2},
+                 {"op": "test", "path": "/metadata/uid", "value": "u"}]
+
+        self.assertEqual(excludes.filter(patch), patch[3:])
+        self.assertEqual(excludes.counts, [2, 0, 0, 1, 0])
+
+        with self.assertLogs("kubernator.k8s", "DEBUG") as logs:
+            excludes.log_counts()
+        self.assertIn("'^/metadata/managedFields' excluded 2 operation(s)", logs.output[0])
+
+
+class MakePatchTest(unittest.TestCase):
+    def assertSamePatch(self, src, dst, **kwargs):
+        expected = jsonpatch.make_patch(src, dst).patch
+        self.assertEqual(make_patch(src, dst, **kwargs).patch, expected)
+        return expected
+
+    def test_matches_jsonpatch(self):
+        src = _pod({"name": "a", "image": "x:1", "ports": [{"containerPort": 80, "protocol": "TCP"}]},
+                   {"name": "b", "image": "y:1"})
+        dst = copy.deepcopy(src)
+        dst["spec"]["containers"][0]["image"] = "x:2"
+        dst["spec"]["containers"][0]["ports"].append({"containerPort": 443, "protocol": "TCP"})
+        dst["spec"]["containers"][1]["args"] = ["--v"]
+        dst["metadata"]["labels"] = {"app": "a"}
+
+        self.assertTrue(self.assertSamePatch(src, dst))
+        self.assertTrue(self.assertSamePatch(src, dst, prune=PathPrefixTrie(["/status"])))
+
+    def test_reordered_list(self):
+        src = _pod({"name": "a", "image": "x"}, {"name": "b", "image": "y"})
+        dst = _pod({"name": "b", "image": "y"}, {"name": "a", "image": "z"})
+        self.assertSamePatch(src, dst, prune=PathPrefixTrie(["/metadata/managedFields"]))
+
+    def test_type_change_detected(self):
+        src = _pod({"name": "a", "image": 1})
+        dst = _pod({"name": "a", "image": True})
+        self.assertEqual(self.assertSamePatch(src, dst, prune=PathPrefixTrie(["/status"])),
+                         [{"op": "replace", "path": "/spec/containers/0/image", "value": True}])
+
+    def test_prune(self):
+        src = _pod({"name": "a", "image": "x"})
+        dst = copy.deepcopy(src)
+        dst["metadata"]["managedFields"].append({"manager": "kubernator"})
+        dst["metadata"]["managedFieldsExtra"] = 1
+        dst["metadata"]["resourceVersion"] = "2"
+        dst["status"]["phase"] = "Pending"
+        dst["spec"]["containers"][0]["image"] = "y"
+
+        src_copy = copy.deepcopy(src)
+        dst_copy = copy.deepcopy(dst)
+
+        prune = PathPrefixTrie(["/metadata/managedFields", "/status"])
+        self.assertEqual(make_patch(src, dst, prune=prune).patch,
+                         [{"op": "replace", "path": "/metadata/resourceVersion", "value": "2"},
+                          {"op": "replace", "path": "/spec/containers/0/image", "value": "y"}])
+        self.assertEqual(src, src_copy)
+        self.assertEqual(dst, dst_copy)
+
+    def test_prune_requires_objects_on_both_sides(self):
+        src = {"metadata": {"name": "a"}}
+        dst = {"metadata": {"name": "a", "managedFields": []}, "status": {"phase": "x"}}
+        prune = PathPrefixTrie(["/metadata/managedFields", "/status/phase"])
+        self.assertEqual(make_patch(src, dst, prune=prune).patch,
+                         [{"op": "add", "path": "/status", "value": {"phase": "x"}}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import os
+import re
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from kubernator.api import Globs, DirectoryListing, scan_dir
+
+
+class GlobsMatcherTests(unittest.TestCase):
+    def test_match_index_first_pattern_wins(self):
+        g = Globs(["*.tmpl.yaml", "*.yaml", "x*"])
+        self.assertEqual(g.match_index("a.tmpl.yaml"), 0)
+        self.assertEqual(g.match_index("a.yaml"), 1)
+        self.assertEqual(g.match_index("x.yaml"), 1)
+        self.assertEqual(g.match_index("x.yml"), 2)
+        self.assertIsNone(g.match_index("a.yml"))
+        self.assertFalse(Globs().matches("a"))
+
+    def test_matcher_reset_on_mutation(self):
+        g = Globs(["*.yaml"])
+        self.assertFalse(g.matches("a.yml"))
+        g.add("*.yml")
+        self.assertEqual(g.match_index("a.yml"), 1)
+        g.add_first("a.*")
+        self.assertEqual(g.match_index("a.yml"), 0)
+        g.discard("a.*")
+        self.assertEqual(g.match_index("a.yml"), 1)
+        g.discard("*.yml")
+        self.assertFalse(g.matches("a.yml"))
+
+    def test_copy_independent_of_source(self):
+        source = Globs(["*.yaml"])
+        self.assertTrue(source.matches("a.yaml"))
+        copy = Globs(source)
+        source.add("*.yml")
+        self.assertTrue(source.matches("a.yml"))
+        self.assertFalse(copy.matches("a.yml"))
+        copy.discard("*.yaml")
+        self.assertTrue(source.matches("a.yaml"))
+        self.assertFalse(copy.matches("a.yaml"))
+
+    def test_uncombinable_patterns(self):
+        g = Globs([re.compile(r"(a)\1"), re.compile("B", re.IGNORECASE), "*.yaml"])
+        self.assertEqual(g.match_index("aa"), 0)
+        self.assertEqual(g.match_index("b"), 1)
+        self.assertEqual(g.match_index("c.yaml"), 2)
+        self.assertIsNone(g.match_index("ab"))
+
+    def test_patterns_with_groups(self):
+        g = Globs([re.compile(r"(x)(y)?z"), re.compile(r"((a)|b)+c"), "*"])
+        self.assertEqual(g.match_index("xz"), 0)
+        self.assertEqual(g.match_index("ababc"), 1)
+        self.assertEqual(g.match_index("q"), 2)
+
+
+class ScanDirTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        for name in ("foo", "bal", "bar", "baz"):
+            (self.root / name).mkdir()
+        (self.root / "baq").touch()
+        past = time.time_ns() - 10 * DirectoryListing.RACY_WINDOW_NS
+        os.utime(self.root, ns=(past, past))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_order_follows_includes(self):
+        result = list(scan_dir(Mock(), self.root, lambda d: d.is_dir(), Globs(["f*"]), Globs(["baz", "*"])))
+        self.assertEqual(result, [self.root / "baz", self.root / "bal", self.root / "bar"])
+
+    def test_pattern_lists_accepted(self):
+        result = list(scan_dir(Mock(), self.root, lambda d: d.is_file(), [], [re.compile("ba.")]))
+        self.assertEqual(result, [self.root / "baq"])
+
+    def test_listing_shared(self):
+        with patch("kubernator.api.os.scandir", wraps=os.scandir) as scandir:
+            list(scan_dir(Mock(), self.root, lambda d: d.is_dir(), Globs(), Globs(["*"])))
+            list(scan_dir(Mock(), self.root, lambda d: d.is_file(), Globs(), Globs(["*"])))
+            self.assertEqual(scandir.call_count, 1)
+
+            (self.root / "new").mkdir()
+            result = list(scan_dir(Mock(), self.root, lambda d: d.is_dir(), Globs(), Globs(["new"])))
+            self.assertEqual(result, [self.root / "new"])
+            self.assertEqual(scandir.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
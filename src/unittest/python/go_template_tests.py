@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import unittest
+
+from kubernator._go_template import (GoTemplates, GoTemplateError, UnsupportedTemplateError, SPRIG_FUNCS,
+                                     go_format, go_numbers, to_yaml)
+
+
+def render(source, data=None, **funcs):
+    templates = GoTemplates(SPRIG_FUNCS)
+    templates.funcs.update(funcs)
+    templates.parse("t", source)
+    return templates.execute("t", data)
+
+
+class GoTemplatesTest(unittest.TestCase):
+    def test_trim_markers_and_comments(self):
+        self.assertEqual(render("a  {{- 1 -}}  b {{/* c */}} {{- /* d */ -}} e"), "a1b e")
+        self.assertEqual(render("{{-3}}"), "-3")
+
+    def test_fields_variables_and_pipelines(self):
+        data = {"Values": go_numbers({"a": {"b": 2}, "s": "x"})}
+        self.assertEqual(render("{{ .Values.a.b }} {{ $v := .Values.a }}{{ $v.b }} {{ $.Values.s | upper | quote }}",
+                                data), "2 2 \"X\"")
+        self.assertEqual(render("{{ $x := 1 }}{{ if true }}{{ $x = 2 }}{{ end }}{{ $x }}"), "2")
+        self.assertEqual(render("{{ (dict \"k\" \"v\").k }}"), "v")
+        self.assertEqual(render("{{ .missing }}", {}), "<no value>")
+        with self.assertRaises(GoTemplateError):
+            render("{{ .missing.field }}", {})
+
+    def test_control_structures(self):
+        data = {"l": ["a", "b", "c"], "m": {"y": 2, "x": 1}, "e": []}
+        self.assertEqual(render("{{ range $i, $v := .l }}{{ if eq $i 1 }}{{ continue }}{{ end }}{{ $v }}{{ end }}",
+                                data), "ac")
+        self.assertEqual(render("{{ range $k, $v := .m }}{{ $k }}={{ $v }};{{ end }}", data), "x=1;y=2;")
+        self.assertEqual(render("{{ range .e }}x{{ else }}empty{{ end }}", data), "empty")
+        self.assertEqual(render("{{ range 3 }}{{ . }}{{ if eq . 1 }}{{ break }}{{ end }}{{ end }}"), "01")
+        self.assertEqual(render("{{ with .m }}{{ .x }}{{ else }}none{{ end }}", data), "1")
+        self.assertEqual(render("{{ if .e }}a{{ else if .l }}b{{ else }}c{{ end }}", data), "b")
+        self.assertEqual(render("{{ and 1 0 2 }} {{ or 0 \"\" \"z\" }} {{ or 1 (fail \"not evaluated\") | not }}"),
+                         "0 z false")
+
+    def test_define_template_and_block(self):
+        source = '{{ define "n" }}[{{ . }}]{{ end }}{{ template "n" "a" }}{{ block "b" . }}<{{ . }}>{{ end }}'
+        self.assertEqual(render(source, "d"), "[a]<d>")
+
+    def test_go_formatting(self):
+        self.assertEqual([go_format(v) for v in (3.0, 1000000.0, 123456.5, 0.00001, 0.5, True, None)],
+                         ["3", "1e+06", "123456.5", "1e-05", "0.5", "true", "<no value>"])
+        self.assertEqual(go_format({"b": [1, None], "a": "x"}), "map[a:x b:[1 <nil>]]")
+        self.assertEqual(render('{{ printf "%s-%d-%q-%v-%05.2f-%x" "a" 3 "b" 1.5 2.5 255 }}'),
+                         'a-3-"b"-1.5-02.50-ff')
+        self.assertEqual(render('{{ print 1 2 "a" 3 }}'), "1 2a3")
+
+    def test_comparisons_follow_go_types(self):
+        self.assertEqual(render("{{ eq 1 2 1 }} {{ ne \"a\" \"b\" }} {{ lt 1.5 2.0 }} {{ ge 2 2 }}"),
+                         "true true true true")
+        with self.assertRaises(GoTemplateError):
+            render("{{ eq .n 1 }}", {"n": 1.0})
+        with self.assertRaises(GoTemplateError):
+            render("{{ eq .missing \"a\" }}", {})
+
+    def test_sprig_functions(self):
+        self.assertEqual(render('{{ "a-b-" | trunc 3 | trimSuffix "-" }}'), "a-b")
+        self.assertEqual(render('{{ list "a" "b" | join "," }} {{ splitList "," "x,y" | last }}'), "a,b y")
+        self.assertEqual(render('{{ toYaml .m | indent 2 }}', {"m": {"b": [1.0, "x"], "a": {}}}),
+                         "  a: {}\n  b:\n  - 1\n  - x")
+        self.assertEqual(render('{{ toJson .m }}', {"m": {"b": 1.0, "a": 0.5}}), '{"a":0.5,"b":1}')
+        self.assertEqual(render('{{ default "d" .missing }} {{ default "d" "v" }} {{ .n | int | add 1 }}',
+                                {"n": 2.9}), "d v 3")
+        self.assertEqual(render('{{ $d := dict "a" 1 }}{{ $_ := set $d "b" 2 }}{{ keys $d | sortAlpha }} '
+                                '{{ hasKey $d "a" }} {{ get $d "c" | quote }}'), '[a b] true ""')
+        self.assertEqual(render('{{ merge (dict "a" 1) (dict "a" 2 "b" 3) }} '
+                                '{{ mergeOverwrite (dict "a" 1) (dict "a" 2) }}'), "map[a:1 b:3] map[a:2]")
+        self.assertEqual(render('{{ regexReplaceAll "(a+)b" "xaab" "${1}c" }} {{ b64enc "hi" }} '
+                                '{{ "hi" | sha256sum | trunc 8 }}'), "xaac aGk= 8f434346")
+        self.assertEqual(render('{{ ternary "y" "n" true }} {{ coalesce "" .none "c" }} {{ title "hello world" }}', {}),
+                         "y c Hello World")
+        with self.assertRaisesRegex(GoTemplateError, "needed"):
+            render('{{ required "needed" .missing }}', {})
+
+    def test_wrong_argument_types_fail(self):
+        with self.assertRaises(GoTemplateError):
+            render("{{ upper .n }}", {"n": 1.0})
+        with self.assertRaises(GoTemplateError):
+            render("{{ indent .n \"a\" }}", {"n": 2.0})
+
+    def test_unsupported(self):
+        with self.assertRaises(UnsupportedTemplateError):
+            render("{{ now }}")
+        with self.assertRaises(UnsupportedTemplateError):
+            render("{{ printf \"%g\" 1.5 }}")
+
+    def test_to_yaml_scalars(self):
+        self.assertEqual(to_yaml("abc"), "abc")
+        self.assertEqual(to_yaml(None), "null")
+        self.assertEqual(to_yaml([]), "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+
+from kubernator.plugins.helm_chart import HelmChart, UnsupportedTemplateError
+
+CHARTS = Path(__file__).parent / "helm_chart"
+API_VERSIONS = ["v1", "apps/v1"]
+
+# Golden outputs of `helm template` for the charts in CHARTS, verified against Helm by the helm_chart_golden
+# integration test
+GOLDEN = [("simple.golden.yaml", "simple", "demo", "apps",
+           {"replicaCount": 3, "image": {"tag": "1.0"}, "env": {"WORKERS": None}}, True),
+          ("simple-defaults.golden.yaml", "simple", "simple", "default", None, False)]
+
+
+def chart_files(chart_dir: Path) -> dict[str, bytes]:
+    return {str(p.relative_to(chart_dir)): p.read_bytes() for p in sorted(chart_dir.rglob("*")) if p.is_file()}
+
+
+class HelmChartGoldenTest(unittest.TestCase):
+    def test_golden(self):
+        for golden, chart, release, namespace, values, include_crds in GOLDEN:
+            with self.subTest(golden):
+                output = HelmChart(chart_files(CHARTS / chart)).render(release, namespace, values, API_VERSIONS,
+                                                                       include_crds)
+                self.assertEqual(output, (CHARTS / golden).read_text())
+
+    def test_load_archive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = Path(tmp, "simple-1.2.3.tgz")
+            with tarfile.open(archive, "w:gz") as tar:
+                tar.add(CHARTS / "simple", "simple")
+            chart = HelmChart.load_archive(archive)
+
+        self.assertEqual(chart.name, "simple")
+        self.assertEqual(chart.metadata.AppVersion, "4.5")
+        self.assertEqual(chart.values["replicaCount"], 1.0)
+        self.assertEqual(list(chart.templates), ["templates/NOTES.txt", "templates/_helpers.tpl",
+                                                 "templates/configmap.yaml", "templates/deployment.yaml",
+                                                 "templates/ingress.yaml", "templates/service.yaml"])
+        self.assertEqual(list(chart.crds), ["crds/widgets.yaml"])
+
+
+class HelmChartUnsupportedTest(unittest.TestCase):
+    def chart(self, template, files=None):
+        files = {"Chart.yaml": "apiVersion: v2\nname: c\nversion: 1.0.0\n", "templates/t.yaml": template,
+                 **(files or {})}
+        return HelmChart({name: data.encode() for name, data in files.items()})
+
+    def render(self, chart, values=None):
+        return chart.render("r", "ns", values, API_VERSIONS, True)
+
+    def test_unsupported_constructs(self):
+        for template in ("{{ .Capabilities.KubeVersion.Version }}",
+                         "{{ if .Capabilities.APIVersions.Has \"policy/v1beta1\" }}x{{ end }}",
+                         "{{ now }}",
+                         "kind: Job\nmetadata:\n  annotations:\n    helm.sh/hook: pre-install\n"):
+            with self.subTest(template):
+                with self.assertRaises(UnsupportedTemplateError):
+                    self.render(self.chart(template))
+
+    def test_unsupported_charts(self):
+        with self.assertRaises(UnsupportedTemplateError):
+            self.chart("", {"charts/d/Chart.yaml": ""})
+        with self.assertRaises(UnsupportedTemplateError):
+            self.chart("", {"Chart.yaml": "apiVersion: v2\nname: c\nversion: 1.0.0\ndependencies:\n- name: d\n"})
+
+    def test_api_versions_offered(self):
+        chart = self.chart("{{ if .Capabilities.APIVersions.Has \"apps/v1\" }}kind: Deployment{{ end }}")
+        self.assertEqual(self.render(chart), "---\n# Source: c/templates/t.yaml\nkind: Deployment\n")
+
+    def test_values_schema(self):
+        chart = self.chart("kind: {{ .Values.kind }}",
+                           {"values.schema.json": '{"properties": {"kind": {"type": "string"}}}'})
+        self.assertEqual(self.render(chart, {"kind": "ConfigMap"}),
+                         "---\n# Source: c/templates/t.yaml\nkind: ConfigMap\n")
+        with self.assertRaises(UnsupportedTemplateError):
+            self.render(chart, {"kind": 1})
+
+    def test_null_removes_default(self):
+        chart = self.chart("a: {{ .Values.a | default \"none\" }}\nb: {{ .Values.b.c }}",
+                           {"values.yaml": "a: x\nb:\n  c: y\n  d: z\n"})
+        self.assertEqual(self.render(chart, {"a": None, "b": {"d": None}}),
+                         "---\n# Source: c/templates/t.yaml\na: none\nb: y\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
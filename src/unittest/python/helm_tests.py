@@ -0,0 +1,612 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import os
+import tarfile
+import tempfile
+import unittest
+from hashlib import sha256
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import gevent
+import yaml
+from gevent.lock import BoundedSemaphore
+
+from kubernator.api import YAMLDocumentSplitter
+from kubernator.plugins import helm
+from kubernator.plugins.helm import HelmPlugin, HelmRepositories, oci_chart_digest, semver_key
+
+REPOSITORY = "https://charts.example.com"
+REPOSITORY_HASH = sha256(REPOSITORY.encode("UTF-8")).hexdigest()
+
+RENDERED = """---
+# Source: chart/templates/cm.yaml
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: cm
+"""
+
+
+def _running(output):
+    """Stands in for `app.run`, writing the output to the stdout sink line by line"""
+
+    def run(args, stdout, stderr, stdin):
+        for line in output.splitlines(keepends=True):
+            stdout(line)
+        return SimpleNamespace(wait=lambda: 0)
+
+    return run
+
+
+def _response(status_code, headers=None, json=None):
+    return SimpleNamespace(status_code=status_code, headers=headers or {}, json=lambda: json)
+
+
+class HelmPluginTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.repository_cache = self.tmp / "repository"
+        self.repository_cache.mkdir()
+
+        def get_cache_dir(category, sub_category=None):
+            cache_dir = self.tmp / category / (sub_category or "")
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            return cache_dir
+
+        patcher = mock.patch.object(helm, "get_cache_dir", get_cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.downloaded_index = self.tmp / "downloaded-index.yaml"
+        self.downloaded_index.write_text("apiVersion: v1\nentries: {}\n")
+        patcher = mock.patch.object(helm, "download_remote_file", return_value=(self.downloaded_index, False))
+        self.download_remote_file = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.added = []
+        self.added_transformers = []
+        self.transformers = []
+        self.plugin = plugin = HelmPlugin()
+        plugin.helm_version = "v3.16.0"
+        plugin._helm_repositories_file = self.tmp / "repositories.yaml"
+        plugin._helm_repository_cache = self.repository_cache
+        plugin.repositories = HelmRepositories(plugin._helm_repositories_file, self.repository_cache, 600)
+        plugin.context = SimpleNamespace(
+            helm=SimpleNamespace(helm_file="helm", render_cache=True, native_render=False,
+                                 namespace_transformer=False),
+            kubeconfig=SimpleNamespace(kubeconfig="kubeconfig"),
+            app=SimpleNamespace(run=mock.Mock(side_effect=_running(RENDERED))),
+            k8s=SimpleNamespace(get_api_versions=mock.Mock(return_value=["v1", "apps/v1"]),
+                                transformers_snapshot=lambda: (tuple(self.transformers), ()),
+                                add_resources_as_of=self._add_resources_as_of))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _add_resources_as_of(self, snapshot, manifests, source):
+        self.added_transformers.append(snapshot[0])
+        self.added.append(list(manifests))
+
+    def write_index(self, digest):
+        index = {"apiVersion": "v1",
+                 "entries": {"chart": [{"name": "chart", "version": "1.0.0", "digest": digest},
+                                       {"name": "chart", "version": "0.9.0", "digest": "old"}]}}
+        with open(self.repository_cache / f"{REPOSITORY_HASH}-index.yaml", "wt") as f:
+            yaml.safe_dump(index, f)
+
+    def add_helm(self, **kwargs):
+        args = dict(chart="chart", name="release", namespace="ns", include_crds=True, repository=REPOSITORY,
+                    version="1.0.0", values={"a": 1})
+        args.update(kwargs)
+        self.plugin._internal_add_helm("source", **args)
+        self.plugin.flush()
+
+
+class HelmRenderCacheTest(HelmPluginTestCase):
+    def test_repository_chart_rendered_once(self):
+        self.write_index("sha256:1")
+        run = self.plugin.context.app.run
+
+        self.add_helm()
+        self.add_helm()
+
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(self.added, [[{"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "cm"}}]] * 2)
+        self.assertEqual(len(list((self.tmp / "helm" / "render").glob("*.yaml"))), 1)
+
+    def test_key_covers_inputs(self):
+        self.write_index("sha256:1")
+        run = self.plugin.context.app.run
+
+        self.add_helm()
+        self.add_helm(values={"a": 2})
+        self.add_helm(name="other")
+        self.add_helm(namespace="other")
+        self.add_helm(include_crds=False)
+        self.plugin.context.k8s.get_api_versions.return_value = ["v1"]
+        self.add_helm()
+        self.assertEqual(run.call_count, 6)
+
+        # A new digest of the same version is a new chart
+        self.plugin.repositories._indices.clear()
+        self.write_index("sha256:2")
+        self.add_helm()
+        self.assertEqual(run.call_count, 7)
+
+    def test_unknown_digest_not_cached(self):
+        self.write_index("sha256:1")
+        run = self.plugin.context.app.run
+
+        self.add_helm(version="2.0.0")
+        self.add_helm(version="2.0.0")
+
+        self.assertEqual(run.call_count, 2)
+        self.assertFalse((self.tmp / "helm" / "render").exists())
+
+    def test_disabled(self):
+        self.write_index("sha256:1")
+        self.plugin.context.helm.render_cache = False
+        run = self.plugin.context.app.run
+
+        self.add_helm()
+        self.add_helm()
+
+        self.assertEqual(run.call_count, 2)
+
+    def test_oci_chart_keyed_by_digest(self):
+        run = self.plugin.context.app.run
+        with mock.patch.object(helm, "oci_chart_digest", return_value="sha256:1") as digest:
+            self.add_helm(chart="oci://registry.example.com/charts/chart", repository=None)
+            self.add_helm(chart="oci://registry.example.com/charts/chart", repository=None)
+
+        digest.assert_called_once_with("oci://registry.example.com/charts/chart", "1.0.0")
+        self.assertEqual(run.call_count, 1)
+
+
+class HelmConcurrentRenderTest(HelmPluginTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plugin.context.helm.render_cache = False
+        self.running = 0
+        self.max_running = 0
+
+        def run(args, stdout, stderr_logger, stdin):
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            try:
+                name = args[args.index("template") + 1]
+                # Later releases finish first
+                gevent.sleep(0.05 / int(name[1:]))
+                return _running(f"kind: ConfigMap\nmetadata:\n  name: {name}\n")(args, stdout, stderr_logger, stdin)
+            finally:
+                self.running -= 1
+
+        self.plugin.context.app.run = run
+
+    def declare(self, *names):
+        for name in names:
+            self.plugin._internal_add_helm("source", chart="chart", name=name, namespace="ns", include_crds=True,
+                                           repository=REPOSITORY, version="1.0.0")
+
+    def added_names(self):
+        return [m["metadata"]["name"] for manifests in self.added for m in manifests]
+
+    def test_added_in_declaration_order(self):
+        self.plugin._render_semaphore = BoundedSemaphore(3)
+        names = [f"r{i}" for i in range(1, 9)]
+        self.declare(*names)
+        self.assertEqual(self.added, [])
+
+        self.plugin.flush()
+
+        self.assertEqual(self.added_names(), names)
+        self.assertEqual(self.max_running, 3)
+
+    def test_render_error(self):
+        def failing(args, stdout, stderr_logger, stdin):
+            raise RuntimeError("helm failed")
+
+        self.declare("r1")
+        self.plugin.context.app.run = failing
+        self.declare("r2", "r3")
+
+        with self.assertRaisesRegex(RuntimeError, "helm failed"):
+            self.plugin.flush()
+        self.assertEqual(self.added_names(), ["r1"])
+        self.assertEqual(self.plugin._pending_releases, [])
+
+    def test_rendered_again_for_crds_of_earlier_releases(self):
+        api_versions = ["v1"]
+        self.plugin.context.k8s.get_api_versions = lambda: list(api_versions)
+        rendered_for = []
+
+        def run(args, stdout, stderr_logger, stdin):
+            name = args[args.index("template") + 1]
+            versions = args[args.index("-a") + 1].split(",")
+            rendered_for.append((name, versions))
+            kind = "ServiceMonitor" if "monitoring.example.com/v1" in versions else "ConfigMap"
+            return _running(f"kind: {kind}\nmetadata:\n  name: {name}\n")(args, stdout, stderr_logger, stdin)
+
+        def add_resources_as_of(snapshot, manifests, source):
+            # The first release brings the CRD
+            if manifests[0]["metadata"]["name"] == "r1":
+                api_versions.append("monitoring.example.com/v1")
+            self._add_resources_as_of(snapshot, manifests, source)
+
+        self.plugin.context.app.run = run
+        self.plugin.context.k8s.add_resources_as_of = add_resources_as_of
+        self.declare("r1", "r2", "r3")
+        self.plugin.flush()
+
+        self.assertEqual([m["kind"] for manifests in self.added for m in manifests],
+                         ["ConfigMap", "ServiceMonitor", "ServiceMonitor"])
+        self.assertEqual(sorted(name for name, _ in rendered_for), ["r1", "r2", "r2", "r3", "r3"])
+        self.assertEqual(rendered_for[-2:], [("r2", ["v1", "monitoring.example.com/v1"]),
+                                             ("r3", ["v1", "monitoring.example.com/v1"])])
+
+    def test_values_copied_when_declared(self):
+        stdins = {}
+
+        def run(args, stdout, stderr_logger, stdin):
+            stdins[args[args.index("template") + 1]] = stdin()
+            return _running(RENDERED)(args, stdout, stderr_logger, stdin)
+
+        self.plugin.context.app.run = run
+        values = {"a": {"b": 1}}
+        self.plugin._internal_add_helm("source", chart="chart", name="r1", namespace="ns", include_crds=True,
+                                       repository=REPOSITORY, version="1.0.0", values=values)
+        values["a"]["b"] = 2
+        self.plugin._internal_add_helm("source", chart="chart", name="r2", namespace="ns", include_crds=True,
+                                       repository=REPOSITORY, version="1.0.0", values=values)
+        self.plugin.flush()
+
+        self.assertEqual(stdins, {"r1": '{"a": {"b": 1}}', "r2": '{"a": {"b": 2}}'})
+
+    def test_transformers_as_declared(self):
+        def transformer(resources, resource):
+            pass
+
+        self.transformers.append(transformer)
+        self.declare("r1")
+        self.transformers.remove(transformer)
+        self.declare("r2")
+        self.plugin.context.helm.namespace_transformer = True
+        self.declare("r3")
+        self.transformers.append(transformer)
+        self.plugin.flush()
+
+        self.assertEqual(self.added_names(), ["r1", "r2", "r3"])
+        self.assertEqual(self.added_transformers[:2], [(transformer,), ()])
+        self.assertEqual([t.__name__ for t in self.added_transformers[2]], ["helm_namespace_transformer"])
+
+
+class YAMLDocumentSplitterTest(unittest.TestCase):
+    def split(self, stream):
+        documents = []
+        splitter = YAMLDocumentSplitter(documents.append)
+        for line in stream.splitlines(keepends=True):
+            splitter.feed(line)
+        splitter.close()
+        return documents
+
+    def test_documents(self):
+        stream = """# leading comment
+%YAML 1.2
+---
+a: 1
+---
+# Source: empty.yaml
+---   # trailing comment
+b: |
+  ---
+  text
+...
+c: 3
+---
+- d
+--- e
+----
+"""
+        self.assertEqual(self.split(stream), [{"a": 1}, {"b": "---\ntext\n"}, {"c": 3}, ["d"], "e ----"])
+
+    def test_last_document_without_newline(self):
+        self.assertEqual(self.split("a: 1\n---\nb: 2"), [{"a": 1}, {"b": 2}])
+
+    def test_documents_parsed_when_complete(self):
+        documents = []
+        splitter = YAMLDocumentSplitter(documents.append)
+        for line in ("a: 1\n", "---\n", "b: 2\n"):
+            splitter.feed(line)
+        self.assertEqual(documents, [{"a": 1}])
+        splitter.close()
+        self.assertEqual(documents, [{"a": 1}, {"b": 2}])
+
+
+class HelmStreamingTest(HelmPluginTestCase):
+    def test_cached_rendering_matches(self):
+        self.write_index("sha256:1")
+        self.plugin.context.app.run.side_effect = _running(RENDERED + "---\n# Source: chart/templates/empty.yaml\n"
+                                                                      "---\nkind: Secret\n")
+
+        self.add_helm()
+        self.add_helm()
+
+        self.assertEqual(self.plugin.context.app.run.call_count, 1)
+        self.assertEqual(self.added[0], [{"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "cm"}},
+                                         {"kind": "Secret"}])
+        self.assertEqual(self.added[1], self.added[0])
+
+    def test_parse_error_drains_output(self):
+        self.write_index("sha256:1")
+        lines = []
+
+        def run(args, stdout, stderr, stdin):
+            for line in ("a: [\n", "---\n", "b: 2\n"):
+                stdout(line)
+                lines.append(line)
+            return SimpleNamespace(wait=lambda: 0)
+
+        self.plugin.context.app.run.side_effect = run
+        with self.assertRaises(yaml.YAMLError):
+            self.add_helm()
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(self.added, [])
+        self.assertEqual(list((self.tmp / "helm" / "render").iterdir()), [])
+
+
+class HelmRepositoriesTest(HelmPluginTestCase):
+    def test_registered_without_helm(self):
+        repositories = self.plugin.repositories
+        self.assertEqual(repositories.add(REPOSITORY), REPOSITORY_HASH)
+        self.assertEqual(repositories.add(REPOSITORY), REPOSITORY_HASH)
+
+        with open(self.tmp / "repositories.yaml") as f:
+            config = yaml.safe_load(f)
+        self.assertEqual(config["repositories"], [{"name": REPOSITORY_HASH, "url": REPOSITORY}])
+
+        reloaded = HelmRepositories(self.tmp / "repositories.yaml", self.repository_cache, 600)
+        self.assertIn(REPOSITORY_HASH, reloaded)
+
+    def test_refreshed_once_per_run(self):
+        repositories = self.plugin.repositories
+        repositories.add(REPOSITORY)
+
+        gevent.joinall([gevent.spawn(repositories.refresh, REPOSITORY_HASH) for _ in range(5)], raise_error=True)
+        repositories.refresh(REPOSITORY_HASH)
+
+        self.download_remote_file.assert_called_once_with(helm.logger, REPOSITORY + "/index.yaml", "helm", "index")
+        self.assertEqual(repositories.index_file(REPOSITORY_HASH).read_text(), self.downloaded_index.read_text())
+
+    def test_fresh_index_not_refreshed(self):
+        repositories = self.plugin.repositories
+        repositories.add(REPOSITORY)
+        self.write_index("sha256:1")
+
+        repositories.refresh(REPOSITORY_HASH)
+
+        self.download_remote_file.assert_not_called()
+
+    def test_stale_index_revalidated(self):
+        repositories = self.plugin.repositories
+        repositories.add(REPOSITORY)
+        self.write_index("sha256:1")
+        index_file = repositories.index_file(REPOSITORY_HASH)
+        os.utime(index_file, (0, 0))
+        self.download_remote_file.return_value = (self.downloaded_index, True)
+
+        repositories.refresh(REPOSITORY_HASH)
+
+        self.download_remote_file.assert_called_once()
+        self.assertIn("sha256:1", index_file.read_text())
+        self.assertGreater(index_file.stat().st_mtime, 0)
+
+    def test_fresh_index_missing_version_refreshed_once(self):
+        repositories = self.plugin.repositories
+        repositories.add(REPOSITORY)
+        self.write_index("sha256:1")
+        self.downloaded_index.write_text(yaml.safe_dump(
+            {"apiVersion": "v1", "entries": {"chart": [{"name": "chart", "version": "1.1.0", "digest": "new"}]}}))
+
+        repositories.refresh(REPOSITORY_HASH, "chart", "1.0.0")
+        self.download_remote_file.assert_not_called()
+        self.assertEqual(repositories.latest_version(REPOSITORY_HASH, "chart"), "1.0.0")
+
+        repositories.refresh(REPOSITORY_HASH, "chart", "1.1.0")
+        repositories.refresh(REPOSITORY_HASH, "chart", "1.2.0")
+        repositories.refresh(REPOSITORY_HASH, "missing")
+
+        self.download_remote_file.assert_called_once()
+        self.assertEqual(repositories.index(REPOSITORY_HASH)["chart"], {"1.1.0": "new"})
+        self.assertEqual(repositories.latest_version(REPOSITORY_HASH, "chart"), "1.1.0")
+
+    def test_checked_index_missing_chart_not_refreshed_again(self):
+        repositories = self.plugin.repositories
+        repositories.add(REPOSITORY)
+
+        repositories.refresh(REPOSITORY_HASH, "chart", "1.0.0")
+
+        self.download_remote_file.assert_called_once()
+
+    def test_release_missing_from_fresh_index_refreshed(self):
+        self.plugin.context.helm.render_cache = False
+        self.write_index("sha256:1")
+        self.add_helm(version="2.0.0")
+        self.download_remote_file.assert_called_once()
+
+    def test_releases_wait_for_refresh(self):
+        self.plugin.context.helm.render_cache = False
+        self.add_helm()
+        self.add_helm()
+        self.download_remote_file.assert_called_once()
+        self.assertTrue(self.plugin.repositories.index_file(REPOSITORY_HASH).exists())
+
+
+class HelmNativeRenderTest(HelmPluginTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plugin.context.helm.native_render = True
+        self.charts = Path(__file__).parent / "helm_chart"
+
+    def package(self, chart_dir: Path, version: str) -> str:
+        archive = self.tmp / f"{chart_dir.name}-{version}.tgz"
+        with tarfile.open(archive, "w:gz") as tar:
+            tar.add(chart_dir, chart_dir.name)
+        digest = sha256(archive.read_bytes()).hexdigest()
+        index = {"apiVersion": "v1",
+                 "entries": {chart_dir.name: [{"name": chart_dir.name, "version": version, "digest": digest,
+                                               "urls": [archive.name]}]}}
+        with open(self.repository_cache / f"{REPOSITORY_HASH}-index.yaml", "wt") as f:
+            yaml.safe_dump(index, f)
+
+        def download_remote_file(logger, url, category, sub_category=None):
+            if url == f"{REPOSITORY}/{archive.name}":
+                return archive, False
+            return self.downloaded_index, False
+
+        self.download_remote_file.side_effect = download_remote_file
+        return digest
+
+    def test_rendered_without_helm(self):
+        digest = self.package(self.charts / "simple", "1.2.3")
+
+        self.add_helm(chart="simple", version="1.2.3", name="demo", namespace="apps",
+                      values={"replicaCount": 3, "image": {"tag": "1.0"}, "env": {"WORKERS": None}})
+        self.add_helm(chart="simple", version="1.2.3", name="demo", namespace="apps", values={"replicaCount": 2})
+
+        self.plugin.context.app.run.assert_not_called()
+        self.assertEqual(self.added[0], list(yaml.safe_load_all((self.charts / "simple.golden.yaml").read_text())))
+        deployment, = (m for m in self.added[1] if m["kind"] == "Deployment")
+        self.assertEqual(deployment["spec"]["replicas"], 2)
+        # The archive is downloaded once and kept by its digest
+        self.assertTrue((self.tmp / "helm" / "chart" / f"{digest}.tgz").exists())
+        self.assertEqual([c.args[1] for c in self.download_remote_file.call_args_list].count(
+            f"{REPOSITORY}/simple-1.2.3.tgz"), 1)
+
+    def test_unsupported_chart_rendered_by_helm(self):
+        chart_dir = self.tmp / "chart"
+        (chart_dir / "templates").mkdir(parents=True)
+        (chart_dir / "Chart.yaml").write_text("apiVersion: v2\nname: chart\nversion: 1.0.0\n")
+        (chart_dir / "templates" / "cm.yaml").write_text("kubeVersion: {{ .Capabilities.KubeVersion }}\n")
+        self.package(chart_dir, "1.0.0")
+
+        self.add_helm()
+
+        self.assertEqual(self.plugin.context.app.run.call_count, 1)
+        self.assertEqual(self.added, [[{"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "cm"}}]])
+
+    def test_digest_mismatch_rendered_by_helm(self):
+        self.package(self.charts / "simple", "1.2.3")
+        self.plugin.repositories._indices[REPOSITORY_HASH] = {"simple": {"1.2.3": "0" * 64}}
+
+        self.add_helm(chart="simple", version="1.2.3")
+
+        self.assertEqual(self.plugin.context.app.run.call_count, 1)
+
+
+class SemverKeyTest(unittest.TestCase):
+    def test_precedence(self):
+        ordered = ["0.9.0", "1.0.0-alpha", "1.0.0-alpha.1", "1.0.0-alpha.beta", "1.0.0-beta", "1.0.0-beta.2",
+                   "1.0.0-beta.11", "1.0.0-rc.1", "1.0.0", "1.2", "v1.2.1", "1.10.0", "10.0.0"]
+        self.assertEqual(sorted(reversed(ordered), key=semver_key), ordered)
+        self.assertEqual(semver_key("1.0.0+build.1"), semver_key("1.0.0"))
+        self.assertEqual(semver_key("1"), semver_key("1.0.0"))
+
+    def test_not_semver(self):
+        for version in ("", "latest", "^1.2.0", "1.2.3.4", "01.2.3", "1.2.3-"):
+            self.assertIsNone(semver_key(version), version)
+
+
+class ChartVersionCheckTest(HelmPluginTestCase):
+    def write_versions(self, *versions):
+        index = {"apiVersion": "v1",
+                 "entries": {"chart": [{"name": "chart", "version": v, "digest": f"sha256:{v}"} for v in versions],
+                             "other": [{"name": "other", "version": "9.9.9"}]}}
+        with open(self.repository_cache / f"{REPOSITORY_HASH}-index.yaml", "wt") as f:
+            yaml.safe_dump(index, f)
+
+    def test_latest_version(self):
+        self.plugin.repositories.add(REPOSITORY)
+        self.write_versions("1.9.0", "1.10.0", "2.0.0-rc.1", "not-a-version")
+        self.assertEqual(self.plugin.repositories.latest_version(REPOSITORY_HASH, "chart"), "1.10.0")
+        self.assertIsNone(self.plugin.repositories.latest_version(REPOSITORY_HASH, "missing"))
+
+    def test_parsed_index_reused(self):
+        self.plugin.repositories.add(REPOSITORY)
+        self.write_versions("1.0.0")
+        self.assertEqual(self.plugin.repositories.index(REPOSITORY_HASH)["chart"], {"1.0.0": "sha256:1.0.0"})
+
+        repositories = HelmRepositories(self.tmp / "repositories.yaml", self.repository_cache, 600)
+        with mock.patch.object(helm.yaml, "load") as load:
+            self.assertEqual(repositories.index(REPOSITORY_HASH)["chart"], {"1.0.0": "sha256:1.0.0"})
+        load.assert_not_called()
+
+        self.write_versions("1.0.0", "1.1.0")
+        repositories = HelmRepositories(self.tmp / "repositories.yaml", self.repository_cache, 600)
+        self.assertEqual(list(repositories.index(REPOSITORY_HASH)["chart"]), ["1.0.0", "1.1.0"])
+
+    def test_outdated_charts_reported(self):
+        self.plugin.context.helm.check_chart_versions = True
+        self.plugin.repositories.add(REPOSITORY)
+        self.write_versions("1.0.0", "1.1.0", "2.0.0-rc.1")
+        chart_name = f"{REPOSITORY_HASH}/chart"
+        self.plugin._charts_used[chart_name] = [("1.0.0", "a.helm.yaml"), ("1.1.0", "b.helm.yaml"),
+                                                ("~1.0", "c.helm.yaml")]
+
+        with mock.patch.object(helm, "logger") as logger:
+            self.plugin.handle_summary()
+
+        logger.warning.assert_called_once_with("Chart %s is version %s while the latest is %s (defined in %s)",
+                                               "chart", "1.0.0", "1.1.0", "a.helm.yaml")
+        self.download_remote_file.assert_not_called()
+
+
+class OciChartDigestTest(unittest.TestCase):
+    def test_anonymous_token(self):
+        challenge = 'Bearer realm="https://auth.example.com/token",service="registry",scope="repository:c:pull"'
+        head_responses = [_response(401, {"www-authenticate": challenge}),
+                          _response(200, {"docker-content-digest": "sha256:abc"})]
+        with (mock.patch.object(helm.requests, "head", side_effect=head_responses) as head,
+              mock.patch.object(helm.requests, "get", return_value=_response(200, json={"token": "t"})) as get):
+            self.assertEqual(oci_chart_digest("oci://registry.example.com/charts/chart", "1.0.0+build"),
+                             "sha256:abc")
+
+        self.assertEqual(head.call_args_list[0][0][0],
+                         "https://registry.example.com/v2/charts/chart/manifests/1.0.0_build")
+        self.assertEqual(head.call_args_list[1][1]["headers"]["Authorization"], "Bearer t")
+        self.assertEqual(get.call_args[1]["params"], {"service": "registry", "scope": "repository:c:pull"})
+
+    def test_unresolvable(self):
+        with mock.patch.object(helm.requests, "head", return_value=_response(401, {"www-authenticate": "Basic"})):
+            self.assertIsNone(oci_chart_digest("oci://registry.example.com/charts/chart", "1.0.0"))
+        with mock.patch.object(helm.requests, "head", side_effect=helm.requests.ConnectionError()):
+            self.assertIsNone(oci_chart_digest("oci://registry.example.com/charts/chart", "1.0.0"))
+        self.assertIsNone(oci_chart_digest("oci://registry.example.com", "1.0.0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
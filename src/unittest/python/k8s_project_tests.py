@@ -152,6 +152,7 @@ def _make_plugin(project_switch=True, include=(), exclude=(),
     plugin = KubernetesPlugin.__new__(KubernetesPlugin)
     plugin._resource_filters = []
     plugin._manifest_patchers = []
+    plugin._validator_kinds = {}
     plugin._in_scope_projects = set(in_scope) if in_scope is not None else None
     plugin._project_prior_state = None
     plugin._project_new_intent = None
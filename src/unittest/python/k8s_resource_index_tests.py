@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import unittest
+from types import SimpleNamespace
+
+import gevent
+
+from kubernator.plugins.k8s import KubernetesPlugin
+from kubernator.plugins.k8s_api import (K8SResource, K8SResourceIndex, K8SResourceKey, K8SResourcePluginMixin,
+                                        PROJECT_ANNOTATION)
+
+
+def _resource(kind, name, namespace=None, labels=None, project=None, api_version="v1"):
+    metadata = {"name": name}
+    if namespace:
+        metadata["namespace"] = namespace
+    if labels:
+        metadata["labels"] = dict(labels)
+    if project:
+        metadata["annotations"] = {PROJECT_ANNOTATION: project}
+    manifest = {"apiVersion": api_version, "kind": kind, "metadata": metadata}
+    return K8SResource(manifest, SimpleNamespace(version=api_version.rpartition("/")[2]), "test")
+
+
+def _index(*resources):
+    index = K8SResourceIndex()
+    for r in resources:
+        index[r.key] = r
+    return index
+
+
+class K8SResourceIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.cm_a = _resource("ConfigMap", "a", "ns1", {"app": "web"}, "alpha")
+        self.cm_b = _resource("ConfigMap", "b", "ns2", {"app": "db"}, "beta")
+        self.dep = _resource("Deployment", "web", "ns1", {"app": "web", "tier": "front"}, "alpha", "apps/v1")
+        self.ns = _resource("Namespace", "ns1")
+        self.index = _index(self.cm_a, self.cm_b, self.dep, self.ns)
+
+    def test_find_by_kind(self):
+        self.assertEqual(self.index.find(kind="ConfigMap"), [self.cm_a, self.cm_b])
+        self.assertEqual(self.index.find(kind="Secret"), [])
+
+    def test_find_by_group(self):
+        self.assertEqual(self.index.find(group="apps"), [self.dep])
+        self.assertEqual(self.index.find(group="", kind="Deployment"), [])
+
+    def test_find_by_namespace(self):
+        self.assertEqual(self.index.find(namespace="ns1"), [self.cm_a, self.dep])
+        self.assertEqual(self.index.find(namespace=""), [self.ns])
+
+    def test_find_by_labels(self):
+        self.assertEqual(self.index.find(labels={"app": "web"}), [self.cm_a, self.dep])
+        self.assertEqual(self.index.find(labels={"app": "web", "tier": "front"}), [self.dep])
+        self.assertEqual(self.index.find(labels={"tier": None}), [self.dep])
+        self.assertEqual(self.index.find(labels={"app": "nope"}), [])
+
+    def test_find_by_project(self):
+        self.assertEqual(self.index.find(project="alpha"), [self.cm_a, self.dep])
+        self.assertEqual(self.index.find(project="alpha", kind="Deployment"), [self.dep])
+
+    def test_find_without_criteria_returns_all(self):
+        self.assertEqual(self.index.find(), [self.cm_a, self.cm_b, self.dep, self.ns])
+
+    def test_delete_and_replace_update_indexes(self):
+        del self.index[self.cm_a.key]
+        self.assertEqual(self.index.find(kind="ConfigMap"), [self.cm_b])
+        self.assertEqual(self.index.find(labels={"app": "web"}), [self.dep])
+
+        replacement = _resource("ConfigMap", "b", "ns2", {"app": "cache"})
+        self.index[replacement.key] = replacement
+        self.assertEqual(self.index.find(labels={"app": "db"}), [])
+        self.assertEqual(self.index.find(labels={"app": "cache"}), [replacement])
+        self.assertEqual(self.index.find(project="beta"), [])
+
+    def test_in_place_changes_need_reindex(self):
+        self.cm_b.manifest["metadata"]["labels"]["app"] = "web"
+        self.assertEqual(self.index.find(labels={"app": "db"}), [])
+        self.assertEqual(self.index.find(labels={"app": "web"}), [self.cm_a, self.dep])
+
+        self.index.reindex(self.cm_b)
+        self.assertEqual(self.index.find(labels={"app": "web"}), [self.cm_a, self.cm_b, self.dep])
+
+        with self.assertRaises(KeyError):
+            self.index.reindex(_resource("Secret", "missing", "ns1"))
+
+    def test_reindex_rekeys_renamed_resource(self):
+        old_key = self.cm_a.key
+        self.cm_a.manifest["metadata"]["name"] = "renamed"
+        self.cm_a.manifest["metadata"]["namespace"] = "ns2"
+        self.index.reindex(self.cm_a)
+
+        self.assertNotIn(old_key, self.index)
+        self.assertEqual(self.cm_a.key, K8SResourceKey("", "ConfigMap", "renamed", "ns2"))
+        self.assertIs(self.index[self.cm_a.key], self.cm_a)
+        self.assertEqual(self.index.find(namespace="ns1"), [self.dep])
+        self.assertEqual(self.index.find(namespace="ns2"), [self.cm_b, self.cm_a])
+        self.assertEqual(list(self.index.view), [self.cm_b, self.dep, self.ns, self.cm_a])
+
+        self.cm_b.name = "renamed"
+        with self.assertRaises(ValueError):
+            self.index.reindex(self.cm_b)
+
+    def test_view_positions_follow_changes(self):
+        view = self.index.view
+        self.assertIs(view[1], self.cm_b)
+        del self.index[self.cm_a.key]
+        self.assertIs(view[0], self.cm_b)
+
+        replacement = _resource("Deployment", "web", "ns1", api_version="apps/v1")
+        self.index[replacement.key] = replacement
+        self.assertEqual(list(view), [self.cm_b, replacement, self.ns])
+        self.assertIs(view[1], replacement)
+
+        self.index.clear()
+        self.assertEqual(len(view), 0)
+        self.index[self.cm_a.key] = self.cm_a
+        self.assertIs(view[-1], self.cm_a)
+
+    def test_view_is_live_and_read_only(self):
+        view = self.index.view
+        self.assertEqual(len(view), 4)
+        self.assertIs(view[0], self.cm_a)
+        self.assertIs(view[-1], self.ns)
+        self.assertEqual(view[1:3], [self.cm_b, self.dep])
+        self.assertIn(self.dep, view)
+        self.assertNotIn(_resource("ConfigMap", "a", "ns1"), view)
+        with self.assertRaises(IndexError):
+            view[4]
+
+        extra = _resource("Secret", "s", "ns1")
+        self.index[extra.key] = extra
+        self.assertEqual(len(view), 5)
+        self.assertIs(view[4], extra)
+        self.assertEqual(view.find(kind="Secret"), [extra])
+        self.assertFalse(hasattr(view, "append"))
+
+
+class _Plugin(K8SResourcePluginMixin):
+    logger = SimpleNamespace(info=lambda *args: None, trace=lambda *args: None, error=lambda *args, **kwargs: None)
+
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+
+    def _create_resource(self, manifest, source=None):
+        return K8SResource(manifest, SimpleNamespace(version="v1"), source)
+
+    def _validate_resource(self, manifest, source=None):
+        return iter(())
+
+    def _transform_resource(self, resources, resource):
+        self.seen.append(resources)
+        return resource
+
+
+class K8SResourcePluginMixinIndexTest(unittest.TestCase):
+    def test_transformers_receive_live_view(self):
+        plugin = _Plugin()
+        plugin.add_resource(_resource("ConfigMap", "a", "ns1").manifest, "test")
+        plugin.add_resource(_resource("ConfigMap", "b", "ns1", {"app": "web"}).manifest, "test")
+
+        self.assertIs(plugin.seen[0], plugin.seen[1])
+        self.assertIs(plugin.seen[0], plugin.resources.view)
+        self.assertEqual(len(plugin.seen[0]), 2)
+        self.assertEqual([r.name for r in plugin.find_resources(labels={"app": "web"})], ["b"])
+
+    def test_merge_directives_recorded_on_add(self):
+        plugin = _Plugin()
+        plain = plugin.add_resource(_resource("ConfigMap", "a", "ns1").manifest, "test")
+        manifest = _resource("ConfigMap", "b", "ns1").manifest
+        manifest["data"] = {"$patch": "replace", "k": "v"}
+        directive = plugin.add_resource(manifest, "test")
+
+        self.assertFalse(plain.has_merge_directives)
+        self.assertTrue(directive.has_merge_directives)
+
+
+def _validation_plugin(*resources):
+    plugin = KubernetesPlugin.__new__(KubernetesPlugin)
+    plugin._validators = []
+    plugin._validator_kinds = {}
+    plugin.resources = _index(*resources)
+    return plugin
+
+
+def _missing_config_map_validator(resources, resource, error):
+    for volume in resource.manifest.get("spec", {}).get("volumes", ()):
+        name = volume["configMap"]["name"]
+        if K8SResourceKey("", "ConfigMap", name, resource.namespace) not in resources:
+            yield error("%s references missing ConfigMap %s", resource, name)
+
+
+class ValidateResourcesTest(unittest.TestCase):
+    def test_kinds_restrict_validator(self):
+        cm = _resource("ConfigMap", "cfg", "ns1")
+        pod = _resource("Pod", "p", "ns1")
+        pod.manifest["spec"] = {"volumes": [{"configMap": {"name": "cfg"}}, {"configMap": {"name": "gone"}}]}
+        plugin = _validation_plugin(cm, pod)
+
+        seen = []
+
+        def recorder(resources, resource, error):
+            seen.append(resource)
+            return ()
+
+        plugin.api_add_validator(recorder, kinds=["Pod"])
+        plugin.api_add_validator(_missing_config_map_validator, kinds="Pod")
+        with self.assertRaisesRegex(ValueError, "missing ConfigMap gone"):
+            plugin._validate_resources()
+        self.assertEqual(seen, [pod])
+
+        plugin.api_add_validator(recorder)
+        seen.clear()
+        with self.assertRaises(ValueError):
+            plugin._validate_resources()
+        self.assertEqual(seen, [cm, pod])
+
+        plugin.api_remove_validator(recorder)
+        self.assertNotIn(recorder, plugin._validator_kinds)
+
+    def test_validators_run_concurrently_and_report_in_resource_order(self):
+        first = _resource("ConfigMap", "a", "ns1")
+        second = _resource("ConfigMap", "b", "ns1")
+        plugin = _validation_plugin(first, second)
+        events = []
+
+        def slow(resources, resource, error):
+            events.append(("slow", resource.name))
+            gevent.sleep(0.01)
+            if resource is second:
+                yield error("slow %s", resource.name)
+
+        def fast(resources, resource, error):
+            events.append(("fast", resource.name))
+            yield error("fast %s", resource.name)
+
+        plugin.api_add_validator(fast)
+        plugin.api_add_validator(slow)
+        with self.assertRaisesRegex(ValueError, "^fast a$"):
+            plugin._validate_resources()
+        self.assertLess(events.index(("fast", "b")), events.index(("slow", "b")))
+
+    def test_validator_exception_propagates(self):
+        plugin = _validation_plugin(_resource("ConfigMap", "a", "ns1"))
+
+        def broken(resources, resource, error):
+            raise RuntimeError("broken validator")
+
+        plugin.api_add_validator(broken)
+        with self.assertRaisesRegex(RuntimeError, "broken validator"):
+            plugin._validate_resources()
+
+
+class AddResourcesAsOfTest(unittest.TestCase):
+    def test_snapshot_transformers_used(self):
+        plugin = KubernetesPlugin.__new__(KubernetesPlugin)
+        plugin._transformers = []
+        plugin._manifest_patchers = []
+        seen = []
+        plugin.add_resources = lambda manifests, source: seen.append((list(plugin._transformers),
+                                                                      list(plugin._manifest_patchers)))
+
+        def transformer(resources, resource):
+            pass
+
+        def patcher(manifest, resource_description):
+            pass
+
+        plugin.api_add_transformer(transformer)
+        plugin.api_add_manifest_patcher(patcher)
+        snapshot = plugin.api_transformers_snapshot()
+        plugin.api_remove_transformer(transformer)
+
+        plugin.api_add_resources_as_of(snapshot, [], "test")
+        self.assertEqual(seen, [([transformer], [patcher])])
+        self.assertEqual(plugin._transformers, [])
+        self.assertEqual(plugin._manifest_patchers, [patcher])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import logging
+import tracemalloc
+import unittest
+from pathlib import Path
+
+from kubernator.plugins.k8s_api import K8SResource, K8SResourceDef, K8SResourceDefKey, K8SResourcePluginMixin
+
+logger = logging.getLogger("kubernator.test")
+
+RDEF = K8SResourceDef(K8SResourceDefKey("apps", "v1", "Deployment"), "deployment", "deployments", True, False, None)
+
+
+def _manifest(i, namespace="default"):
+    # Build strings at runtime so that they are not interned as code constants
+    return {"apiVersion": "/".join(("apps", "v1")),
+            "kind": "".join(("Deploy", "ment")),
+            "metadata": {"name": f"deployment-{i}", "namespace": "".join((namespace, ""))}}
+
+
+class K8SResourceMemoryTest(unittest.TestCase):
+    def test_slots_hold_attributes(self):
+        resource = K8SResource(_manifest(0), RDEF, "source")
+        self.assertEqual(resource.__dict__, {})
+        self.assertEqual(RDEF.__dict__, {})
+
+    def test_identifiers_are_interned(self):
+        first = K8SResource(_manifest(0, "team-a"), RDEF)
+        second = K8SResource(_manifest(1, "team-a"), RDEF)
+        self.assertIs(first.group, second.group)
+        self.assertIs(first.kind, second.kind)
+        self.assertIs(first.namespace, second.namespace)
+
+        first.namespace = "".join(("team-", "b"))
+        second.namespace = "".join(("team-", "b"))
+        self.assertIs(first.namespace, second.namespace)
+
+    def test_sources_are_shared_per_plugin(self):
+        plugin = K8SResourcePluginMixin()
+        shared_source = plugin._shared_source
+        self.assertIs(shared_source(Path("/tmp", "a.yaml")), shared_source(Path("/tmp", "a.yaml")))
+        self.assertIs(shared_source("".join(("file x, ", "line 1"))), shared_source("file x, line 1"))
+        self.assertIsNone(shared_source(None))
+
+        source = "".join(("file y, ", "line 1"))
+        self.assertIsNot(K8SResourcePluginMixin()._shared_source(source), shared_source("file y, line 1"))
+
+    def test_memory_benchmark(self):
+        """Reports the bytes retained per resource on top of its manifest"""
+        count = 10000
+        manifests = [_manifest(i) for i in range(count)]
+        shared_source = K8SResourcePluginMixin()._shared_source
+        sources = [shared_source(f"file /src/chart-{i % 10}.yaml") for i in range(count)]
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            resources = [K8SResource(m, RDEF, s) for m, s in zip(manifests, sources)]
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        per_resource = (after - before) / count
+        logger.info("%d resources retain %.1f bytes per resource excluding manifests", count, per_resource)
+
+        self.assertEqual(len(resources), count)
+        self.assertEqual(len({id(r.source) for r in resources}), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -245,3 +245,28 @@ class MixinDelegationTest(unittest.TestCase):
         mixin.validator.api_versions.return_value = ["v1", "apps/v1"]
         self.assertEqual(mixin.get_api_versions(), ["v1", "apps/v1"])
         mixin.validator.api_versions.assert_called_once()
+
+    def test_get_api_versions_memoized_until_crd_added(self):
+        from kubernator.plugins.k8s_api import K8SResourcePluginMixin
+        mixin = K8SResourcePluginMixin()
+        mixin.logger = MagicMock()
+        mixin.validator = MagicMock()
+        mixin.validator.resource_definitions = {}
+        mixin.validator.api_versions.return_value = ["v1"]
+
+        api_versions = mixin.get_api_versions()
+        api_versions.append("corrupted")
+        self.assertEqual(mixin.get_api_versions(), ["v1"])
+        mixin.validator.api_versions.assert_called_once()
+
+        crd = MagicMock(key=K8SResourceDefKey("example.com", "v1", "Widget"))
+        mixin.validator.api_versions.return_value = ["example.com/v1", "v1"]
+        with patch("kubernator.plugins.k8s_api.K8SResourceDef.from_resource", return_value=[crd]):
+            mixin._add_crd(MagicMock())
+        self.assertEqual(mixin.get_api_versions(), ["example.com/v1", "v1"])
+        self.assertEqual(mixin.validator.api_versions.call_count, 2)
+
+        # A new validator lists its own
+        mixin.validator = MagicMock()
+        mixin.validator.api_versions.return_value = ["apps/v1"]
+        self.assertEqual(mixin.get_api_versions(), ["apps/v1"])
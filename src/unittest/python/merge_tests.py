@@ -23,7 +23,7 @@ if not is_anything_patched():
 
 import logging
 import unittest
-from kubernator.merge import extract_merge_instructions, apply_merge_instructions
+from kubernator.merge import extract_merge_instructions, apply_merge_instructions, has_merge_directives
 
 TRACE = 5
 
@@ -104,6 +104,23 @@ class MergeTestsTestcase(unittest.TestCase):
 
         self.assertDictEqual(target, {"container1": {"container2": {"finalizers": ["c"]}}})
 
+    def test_normalized_manifest_is_a_copy(self):
+        source = {"spec": {"containers": [{"name": "a", "$patch": "delete"}, {"name": "b", "ports": [1]}],
+                           "volumes": {"$patch": "replace", "v": {"x": 1}}}}
+
+        merge_instrs, normalized = extract_merge_instructions(source, RESOURCE)
+
+        self.assertEqual([str(instr[2]) for instr in merge_instrs], ["$.spec.containers", "$.spec.volumes"])
+        self.assertDictEqual(normalized, {"spec": {"containers": [{"name": "b", "ports": [1]}],
+                                                   "volumes": {"v": {"x": 1}}}})
+        self.assertIsNot(normalized["spec"]["containers"][0]["ports"], source["spec"]["containers"][1]["ports"])
+        self.assertEqual(source["spec"]["volumes"]["$patch"], "replace")
+
+    def test_has_merge_directives(self):
+        self.assertFalse(has_merge_directives({"a": [{"b": {"c": 1}}, 2], "d": "$patch"}))
+        self.assertTrue(has_merge_directives({"a": [{"b": {"$patch": "delete"}}]}))
+        self.assertTrue(has_merge_directives({"a": {"$deleteFromPrimitiveList/finalizers": ["x"]}}))
+
     def debug(self, msg, *args):
         self._log("DEBUG", msg, *args)
 
@@ -91,3 +91,58 @@ class PropertyDictTestcase(unittest.TestCase):
         self.assertEqual(len(p1.value), 2)
         self.assertEqual(p1.value[0], 1)
         self.assertEqual(p1.value[1], 2)
+
+    def test_cached_lookup_honors_shadowing(self):
+        root = PropertyDict()
+        root.value = 1
+        middle = PropertyDict(_parent=root)
+        leaf = PropertyDict(_parent=middle)
+
+        self.assertEqual(leaf.value, 1)
+        self.assertEqual(leaf.value, 1)
+
+        middle.value = 2
+        self.assertEqual(leaf.value, 2)
+        self.assertEqual(root.value, 1)
+
+        middle["value"] = 3
+        self.assertEqual(leaf.value, 3)
+
+        del middle.value
+        self.assertEqual(leaf.value, 1)
+
+        root.other = [1]
+        self.assertEqual(list(leaf.other), [1])
+        del root["other"]
+        with self.assertRaises(AttributeError):
+            leaf.other
+
+    def test_cached_contains_and_dir(self):
+        root = PropertyDict()
+        leaf = PropertyDict(_parent=PropertyDict(_parent=root))
+
+        self.assertNotIn("value", leaf)
+        self.assertEqual(len(leaf), 0)
+
+        root.value = 1
+        self.assertIn("value", leaf)
+        self.assertEqual(dir(leaf), ["value"])
+        self.assertEqual(len(leaf), 1)
+
+        names = leaf.__dir__()
+        names.add("bogus")
+        self.assertEqual(leaf.__dir__(), {"value"})
+
+        del root.value
+        self.assertNotIn("value", leaf)
+        self.assertEqual(len(leaf), 0)
+
+    def test_cached_list_written_to_reading_layer(self):
+        root = PropertyDict()
+        root.value = [1]
+        leaf = PropertyDict(_parent=PropertyDict(_parent=root))
+
+        self.assertEqual(list(leaf.value), [1])
+        leaf.value.append(2)
+        self.assertEqual(list(leaf.value), [1, 2])
+        self.assertEqual(list(root.value), [1])
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import logging
+import os
+import shutil
+import textwrap
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import gevent
+
+from kubernator import proc
+from kubernator.app import App
+from kubernator.api import Repository, _sparse_paths
+
+_GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+                GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git"] + list(args), cwd=cwd, env=_GIT_ENV, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+class SparsePathsTest(unittest.TestCase):
+    def test_normalized(self):
+        self.assertIsNone(_sparse_paths(None))
+        self.assertIsNone(_sparse_paths([]))
+        self.assertIsNone(_sparse_paths(["a", "."]))
+        self.assertIsNone(_sparse_paths(["../a"]))
+        self.assertEqual(_sparse_paths(["b/", "./a/x", "a", "c/d"]), ["a", "b", "c/d"])
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class RepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.origin = self.tmp / "origin"
+        self.origin.mkdir()
+        _git(self.origin, "init", "-q", "-b", "main")
+        _git(self.origin, "config", "uploadpack.allowFilter", "true")
+        _git(self.origin, "config", "uploadpack.allowAnySHA1InWant", "true")
+        for name in ("a/x/f", "b/f", "c/f", "top"):
+            (self.origin / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.origin / name).write_text(name)
+        self.commit()
+
+        cache_dir = self.tmp / "cache"
+        cache_dir.mkdir()
+        patcher = mock.patch("kubernator.api.get_cache_dir", return_value=cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.git_commands = []
+        self.context = SimpleNamespace(app=SimpleNamespace(run=self.run_git,
+                                                           run_capturing_out=self.run_git_capturing_out))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def commit(self, **files):
+        for name, content in files.items():
+            (self.origin / name).write_text(content)
+        _git(self.origin, "add", ".")
+        _git(self.origin, "commit", "-q", "-m", "commit")
+        return _git(self.origin, "rev-parse", "HEAD")
+
+    def run_git(self, args, *a, **kw):
+        self.git_commands.append(args[1])
+        return proc.run(args, *a, env=_GIT_ENV, **kw)
+
+    def run_git_capturing_out(self, args, *a, **kw):
+        self.git_commands.append(args[1])
+        return proc.run_capturing_out(args, *a, env=_GIT_ENV, **kw)
+
+    def init(self, query="", path_prefixes=None):
+        repository = Repository(f"file://{self.origin}{query}")
+        repository.init(logging.getLogger("test"), self.context, path_prefixes)
+        return repository
+
+    def test_sparse_clone_and_fetch_skipped(self):
+        repository = self.init(path_prefixes=["a/x", "b"])
+        local_dir = repository.local_dir
+        self.assertEqual(self.git_commands, ["clone", "update-ref", "worktree", "sparse-checkout", "checkout"])
+        self.assertEqual(sorted(p.name for p in local_dir.iterdir() if p.name != ".git"), ["a", "b", "top"])
+        self.assertTrue((local_dir / "a" / "x" / "f").exists())
+        self.assertEqual(repository.sparse_paths, ["a/x", "b"])
+        self.assertEqual(_git(local_dir, "rev-parse", "HEAD"), _git(self.origin, "rev-parse", "HEAD"))
+
+        # Nothing has changed, so nothing is fetched
+        self.git_commands.clear()
+        repository = self.init(path_prefixes=["b", "a/x"])
+        self.assertEqual(self.git_commands, ["ls-remote"])
+
+        sha = self.commit(**{"b/f": "changed"})
+        self.git_commands.clear()
+        repository = self.init(path_prefixes=["a/x", "b"])
+        self.assertEqual(self.git_commands, ["ls-remote", "fetch", "checkout"])
+        self.assertEqual((local_dir / "b" / "f").read_text(), "changed")
+        self.assertEqual(_git(local_dir, "rev-parse", "HEAD"), sha)
+
+    def test_checkout_paths(self):
+        repository = self.init(path_prefixes=["a"])
+        local_dir = repository.local_dir
+        self.assertFalse((local_dir / "c").exists())
+
+        self.git_commands.clear()
+        repository.checkout_paths(["a/x"])
+        self.assertEqual(self.git_commands, [])
+
+        repository.checkout_paths(["c"])
+        self.assertEqual(repository.sparse_paths, ["a", "c"])
+        self.assertTrue((local_dir / "c" / "f").exists())
+        self.assertFalse((local_dir / "b").exists())
+
+        repository.checkout_paths()
+        self.assertIsNone(repository.sparse_paths)
+        self.assertTrue((local_dir / "b" / "f").exists())
+
+        # The next run narrows the checkout to what it needs
+        repository = self.init(path_prefixes=["b"])
+        self.assertEqual(repository.sparse_paths, ["b"])
+        self.assertFalse((local_dir / "c").exists())
+
+    def test_tag_and_sha_refs(self):
+        first = _git(self.origin, "rev-parse", "HEAD")
+        _git(self.origin, "tag", "-a", "v1", "-m", "v1")
+        self.commit(top="changed")
+
+        repository = self.init("?ref=v1")
+        self.assertEqual(_git(repository.local_dir, "rev-parse", "HEAD"), first)
+        self.git_commands.clear()
+        self.init("?ref=v1")
+        self.assertEqual(self.git_commands, ["ls-remote"])
+
+        repository = self.init(f"?ref={first}")
+        self.assertEqual((repository.local_dir / "top").read_text(), "top")
+        self.git_commands.clear()
+        self.init(f"?ref={first}")
+        self.assertEqual(self.git_commands, [])
+
+    def test_unknown_ref(self):
+        self.init("?ref=main")
+        with self.assertRaisesRegex(RuntimeError, "no branch or tag missing"):
+            self.init("?ref=missing")
+
+    def test_unusable_cache_recreated(self):
+        local_dir = self.init().local_dir
+        (local_dir / ".git").unlink()
+
+        self.git_commands.clear()
+        self.init()
+        self.assertEqual(self.git_commands, ["ls-remote", "fetch", "worktree", "checkout"])
+        self.assertTrue((local_dir / "b" / "f").exists())
+
+    def test_unshared_cache_replaced(self):
+        remote_dir = self.init().local_dir.parent
+        shutil.rmtree(remote_dir)
+        (remote_dir / ".git").mkdir(parents=True)
+
+        local_dir = self.init().local_dir
+        self.assertFalse((remote_dir / ".git").exists())
+        self.assertTrue((local_dir / "b" / "f").exists())
+
+    def test_refs_share_object_store(self):
+        _git(self.origin, "branch", "dev")
+        self.commit(top="changed")
+
+        jobs = [gevent.spawn(self.init), gevent.spawn(self.init, "?ref=dev")]
+        gevent.joinall(jobs, raise_error=True)
+        main, dev = (job.value for job in jobs)
+
+        self.assertNotEqual(main.local_dir, dev.local_dir)
+        self.assertEqual(main.local_dir.parent, dev.local_dir.parent)
+        self.assertEqual((main.local_dir / "top").read_text(), "changed")
+        self.assertEqual((dev.local_dir / "top").read_text(), "top")
+        self.assertEqual(self.git_commands.count("clone"), 1)
+
+        worktrees = _git(main.local_dir.parent / "repo.git", "worktree", "list")
+        self.assertIn(str(main.local_dir), worktrees)
+        self.assertIn(str(dev.local_dir), worktrees)
+
+
+class AppRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / "root"
+        self.root.mkdir()
+        self.marker = self.tmp / "marker"
+
+        cache_dir = self.tmp / "cache"
+        cache_dir.mkdir()
+        for target in ("kubernator.api.get_cache_dir", "kubernator.app.get_cache_dir"):
+            patcher = mock.patch(target, return_value=cache_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def run_app(self, script):
+        (self.root / ".kubernator.py").write_text(textwrap.dedent(script))
+        args = SimpleNamespace(path=self.root, include_project=[], exclude_project=[],
+                               timing_report=None, trace_file=None)
+        with App(args) as app:
+            app.run()
+        return app
+
+    def marker_script(self, name):
+        return f"open({str(self.marker)!r}, 'a').write({name!r} + '\\n')\n"
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_prefetched_and_walked(self):
+        origin = self.tmp / "origin"
+        for name, content in (("b/.kubernator.py", self.marker_script("b")), ("c/f", "c")):
+            (origin / name).parent.mkdir(parents=True, exist_ok=True)
+            (origin / name).write_text(content)
+        _git(origin, "init", "-q", "-b", "main")
+        _git(origin, "add", ".")
+        _git(origin, "commit", "-q", "-m", "commit")
+
+        app = self.run_app(f"""
+            ktor.app.prefetch_repositories([({f"file://{origin}"!r}, "/b")])
+            ktor.app.walk_remote({f"file://{origin}"!r}, "/b")
+            """)
+
+        self.assertEqual(self.marker.read_text(), "b\n")
+        repository, = app.repos
+        self.assertEqual(repository.sparse_paths, ["b"])
+        self.assertFalse((repository.local_dir / "c").exists())
+
+    def test_synced_concurrently(self):
+        active = []
+        max_active = []
+
+        def sync(repository, logger, path_prefixes=None):
+            active.append(repository)
+            max_active.append(len(active))
+            gevent.sleep(0.01)
+            repository.local_dir.mkdir(parents=True)
+            (repository.local_dir / ".kubernator.py").write_text(self.marker_script(repository.url.path))
+            active.remove(repository)
+
+        with mock.patch.object(Repository, "sync", autospec=True, side_effect=sync):
+            self.run_app("""
+                for name in ("one", "two", "three"):
+                    ktor.app.walk_remote(f"file:///{name}")
+                """)
+
+        self.assertEqual(max(max_active), 3)
+        self.assertEqual(sorted(self.marker.read_text().split()), ["/one", "/three", "/two"])
+
+    def test_failure_raised(self):
+        with mock.patch.object(Repository, "sync", autospec=True, side_effect=RuntimeError("unreachable")):
+            with self.assertRaisesRegex(RuntimeError, "unreachable"):
+                self.run_app("""
+                    ktor.app.prefetch_repositories(["file:///unused"])
+                    """)
+
+
+if __name__ == "__main__":
+    unittest.main()
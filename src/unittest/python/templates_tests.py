@@ -120,3 +120,24 @@ class TemplateTestcase(unittest.TestCase):
         rendered = t.render({"values": {"file_contents": "{${ ktor.file_contents | to_json_yaml_str }$}"},
                              "ktor": {"file_contents": {"a": "x", "b": "y"}}})
         self.assertEqual(rendered, '\na: \'{"a": "x", "b": "y"}\'\n')
+
+    def test_scalar_values_render(self):
+        te = TemplateEngine(Mock())
+        t = te.from_string("{${ values.i }$} {${ values.f }$} {${ values.b }$} {${ values.n }$}")
+        self.assertEqual(t.render({"values": {"i": 1, "f": 1.5, "b": True, "n": None}}), "1 1.5 True None")
+        self.assertEqual(te.cache_info().currsize, 0)
+
+    def test_nested_template_cache_bounded(self):
+        te = TemplateEngine(Mock(), nested_template_cache_size=2)
+        t = te.from_string("{${ values.foo }$}")
+        for i in range(5):
+            self.assertEqual(t.render({"values": {"foo": "{${ values.bar%d }$}" % (i % 3),
+                                                  "bar0": "a", "bar1": "b", "bar2": "c"}}),
+                             "abcab"[i])
+        info = te.cache_info()
+        self.assertEqual(info.maxsize, 2)
+        self.assertEqual(info.currsize, 2)
+        self.assertEqual(info.misses, 5)
+
+        t.render({"values": {"foo": "{${ values.bar1 }$}", "bar1": "b"}})
+        self.assertEqual(te.cache_info().hits, 1)
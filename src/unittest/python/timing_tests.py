@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from kubernator.app import App
+from kubernator.plugins.k8s_api import K8SResource, K8SResourceDef, K8SResourceDefKey
+from kubernator.timing import Timings, timings, PHASE, HANDLER, SCRIPT, K8S_API
+
+
+def _entry(report, category, name):
+    for e in report["timings"]:
+        if e["category"] == category and e["name"] == name:
+            return e
+    return None
+
+
+class TimingsTest(unittest.TestCase):
+    def test_accumulates_by_category_and_name(self):
+        t = Timings()
+        t.add("cat", "a", 1_000_000_000)
+        t.add("cat", "a", 3_000_000_000)
+        t.add("cat", "b", 2_000_000_000)
+        t.add("other", "a", 500_000_000)
+
+        self.assertEqual(t.entries("cat"), [
+            {"category": "cat", "name": "a", "count": 2, "total": 4.0, "max": 3.0},
+            {"category": "cat", "name": "b", "count": 1, "total": 2.0, "max": 2.0},
+        ])
+        self.assertEqual([(e["category"], e["name"]) for e in t.entries()],
+                         [("cat", "a"), ("cat", "b"), ("other", "a")])
+
+        t.reset()
+        self.assertEqual(t.entries(), [])
+
+    def test_measure_and_timed_record_on_error(self):
+        t = Timings()
+
+        @t.timed("cat")
+        def failing():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            with t.measure("cat", "block"):
+                raise ValueError()
+        with self.assertRaises(ValueError):
+            failing()
+
+        self.assertEqual([(e["name"], e["count"]) for e in t.entries()], [("block", 1), ("failing", 1)])
+
+    def test_log_summary_lists_phases_in_order(self):
+        t = Timings()
+        t.add(PHASE, "walk", 1_000_000)
+        t.add(PHASE, "apply", 5_000_000)
+        t.add(HANDLER, "k8s.handle_apply", 4_000_000)
+        logger = mock.Mock()
+
+        t.log_summary(logger)
+
+        self.assertIn("walk 0.001s, apply 0.005s", logger.info.call_args_list[0][0][0] %
+                      logger.info.call_args_list[0][0][1:])
+        self.assertEqual(logger.info.call_args_list[1][0][1:3], (HANDLER, "k8s.handle_apply"))
+
+
+class K8SApiTimingTest(unittest.TestCase):
+    def setUp(self):
+        timings.reset()
+        self.rdef = K8SResourceDef(K8SResourceDefKey("", "v1", "ConfigMap"), "configmap", "configmaps",
+                                   True, False, None)
+        response = SimpleNamespace(data="{}")
+        self.rdef._api_get = mock.Mock(return_value=response)
+        self.rdef._api_delete = mock.Mock(return_value=response)
+        self.resource = K8SResource({"apiVersion": "v1", "kind": "ConfigMap",
+                                     "metadata": {"name": "cm", "namespace": "default"}}, self.rdef)
+
+    def test_dry_runs_are_told_apart(self):
+        self.resource.get()
+        self.resource.delete()
+        self.resource.delete(dry_run=False, wait=False)
+
+        self.assertEqual({(e["name"], e["count"]) for e in timings.entries(K8S_API)},
+                         {("get", 1), ("delete (dry-run)", 1), ("delete", 1)})
+
+
+class AppTimingReportTest(unittest.TestCase):
+    def test_report_written(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp, "root")
+            root.mkdir()
+            (root / ".kubernator.py").write_text("pass\n")
+            report_path = Path(tmp, "timing.json")
+
+            args = SimpleNamespace(path=root, include_project=[], exclude_project=[],
+                                   timing_report=str(report_path), trace_file=None)
+            with (mock.patch("kubernator.app.get_cache_dir", return_value=Path(tmp)),
+                  App(args) as app):
+                app.run()
+
+            with open(report_path) as f:
+                report = json.load(f)
+
+        self.assertGreaterEqual(report["elapsed"], 0)
+        for phase in ("walk", "apply", "verify", "cleanup", "shutdown"):
+            self.assertIsNotNone(_entry(report, PHASE, phase), phase)
+        self.assertEqual(_entry(report, HANDLER, "app.handle_before_dir")["count"], 1)
+        self.assertEqual(_entry(report, SCRIPT, str(root / ".kubernator.py"))["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
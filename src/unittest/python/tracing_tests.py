@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2020 Express Systems USA, Inc
+#   Copyright 2026 Karellen, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+from gevent.monkey import patch_all, is_anything_patched
+
+if not is_anything_patched():
+    patch_all()
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import gevent
+
+from kubernator.app import App
+from kubernator.plugins.k8s_api import K8SResource, K8SResourceDef, K8SResourceDefKey
+from kubernator.tracing import Tracer, tracer, STATUS_ERROR, STATUS_UNSET, SPAN_KIND_CLIENT
+
+
+def _spans(export):
+    return export["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+
+def _attributes(span):
+    return {a["key"]: a["value"] for a in span["attributes"]}
+
+
+class TracerTest(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        t = Tracer()
+        with t.span("a", {"k": "v"}) as span:
+            span.set_attribute("x", 1)
+        self.assertEqual(_spans(t.export()), [])
+
+    def test_parents_and_export(self):
+        t = Tracer()
+        t.start()
+        with t.span("root"):
+            with t.span("child", {"s": "v", "i": 1, "b": True, "f": 0.5, "n": None}, kind=SPAN_KIND_CLIENT):
+                pass
+            gevent.spawn(self._in_greenlet, t).get()
+        t.stop()
+
+        spans = {s["name"]: s for s in _spans(t.export({"service.version": "1.0"}))}
+        root = spans["root"]
+        self.assertNotIn("parentSpanId", root)
+        self.assertEqual(spans["child"]["parentSpanId"], root["spanId"])
+        self.assertEqual(spans["greenlet"]["parentSpanId"], root["spanId"])
+        self.assertEqual({s["traceId"] for s in spans.values()}, {t.trace_id})
+        self.assertEqual(len(t.trace_id), 32)
+        self.assertEqual(len(root["spanId"]), 16)
+
+        child = spans["child"]
+        self.assertEqual(child["kind"], SPAN_KIND_CLIENT)
+        self.assertEqual(_attributes(child), {"s": {"stringValue": "v"},
+                                              "i": {"intValue": "1"},
+                                              "b": {"boolValue": True},
+                                              "f": {"doubleValue": 0.5}})
+        self.assertLessEqual(int(root["startTimeUnixNano"]), int(child["startTimeUnixNano"]))
+        self.assertLessEqual(int(child["endTimeUnixNano"]), int(root["endTimeUnixNano"]))
+        self.assertEqual(child["status"], {"code": STATUS_UNSET})
+
+        resource = _attributes(t.export({"service.version": "1.0"})["resourceSpans"][0]["resource"])
+        self.assertEqual(resource, {"service.name": {"stringValue": "kubernator"},
+                                    "service.version": {"stringValue": "1.0"}})
+
+    @staticmethod
+    def _in_greenlet(t):
+        with t.span("greenlet"):
+            pass
+
+    def test_error_status(self):
+        t = Tracer()
+        t.start()
+        with self.assertRaises(ValueError):
+            with t.span("failing"):
+                raise ValueError("boom")
+        self.assertEqual(_spans(t.export())[0]["status"], {"code": STATUS_ERROR, "message": "boom"})
+
+
+class K8SApiTracingTest(unittest.TestCase):
+    def tearDown(self):
+        tracer.stop()
+
+    def test_api_call_spans(self):
+        rdef = K8SResourceDef(K8SResourceDefKey("", "v1", "ConfigMap"), "configmap", "configmaps", True, False, None)
+        rdef._api_get = mock.Mock(return_value=SimpleNamespace(data="{}"))
+        rdef._api_delete = mock.Mock(return_value=SimpleNamespace(data="{}"))
+        resource = K8SResource({"apiVersion": "v1", "kind": "ConfigMap",
+                                "metadata": {"name": "cm", "namespace": "default"}}, rdef, "file cm.yaml")
+
+        tracer.start()
+        resource.get()
+        resource.delete(dry_run=False, wait=False)
+        tracer.stop()
+
+        spans = {s["name"]: s for s in _spans(tracer.export())}
+        self.assertEqual(_attributes(spans["k8s get"]),
+                         {"kubernator.resource.key": {"stringValue": "v1/ConfigMap/cm.default"},
+                          "kubernator.resource.source": {"stringValue": "file cm.yaml"}})
+        self.assertEqual(spans["k8s get"]["kind"], SPAN_KIND_CLIENT)
+        self.assertEqual(_attributes(spans["k8s delete"])["kubernator.dry_run"], {"boolValue": False})
+
+
+class AppTraceFileTest(unittest.TestCase):
+    def test_trace_written(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp, "root")
+            (root / "sub").mkdir(parents=True)
+            (root / ".kubernator.py").write_text("pass\n")
+            trace_path = Path(tmp, "trace.json")
+
+            args = SimpleNamespace(path=root, include_project=[], exclude_project=[],
+                                   timing_report=None, trace_file=str(trace_path))
+            with (mock.patch("kubernator.app.get_cache_dir", return_value=Path(tmp)),
+                  App(args) as app):
+                app.run()
+
+            with open(trace_path) as f:
+                spans = _spans(json.load(f))
+
+        by_id = {s["spanId"]: s for s in spans}
+        names = [s["name"] for s in spans]
+        self.assertEqual(names.count("directory"), 2)
+        for phase in ("walk", "apply", "verify", "cleanup", "shutdown"):
+            self.assertEqual(by_id[spans[names.index(phase)]["parentSpanId"]]["name"], "kubernator")
+
+        script = spans[names.index("script")]
+        self.assertEqual(by_id[script["parentSpanId"]]["name"], "directory")
+        self.assertEqual(_attributes(script)["code.filepath"], {"stringValue": str(root / ".kubernator.py")})
+
+        before_dir = spans[names.index("app.handle_before_dir")]
+        self.assertEqual(_attributes(before_dir), {"kubernator.plugin": {"stringValue": "app"},
+                                                   "kubernator.handler": {"stringValue": "handle_before_dir"}})
+        self.assertEqual(by_id[before_dir["parentSpanId"]]["name"], "directory")
+
+
+if __name__ == "__main__":
+    unittest.main()